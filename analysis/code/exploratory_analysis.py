@@ -8,6 +8,8 @@ import matplotlib.pyplot as plt
 
 from matplotlib.lines import Line2D
 
+from load_data import load_complaints
+
 cPATH = os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "analysis")
 
 
@@ -18,15 +20,20 @@ def save_plot(fig, filename, path=os.path.join(cPATH, 'temp'), tight=True):
     fig.savefig(out_path)
     plt.close(fig)
 
-def plot_quarterly_trend_zombie_data():
-    gp1 = df[df['Zombie data'] == 1].groupby(['Quarter received', 'With narrative'], observed=False).size().unstack(fill_value=0)
-    gp2 = df[df['Zombie data'] == 0].groupby(['Quarter received', 'With narrative'], observed=False).size().unstack(fill_value=0)
-    gp3 = df.groupby(['Quarter received', 'With narrative'], observed=False).size().unstack(fill_value=0)
+def quarter_labels(keys): # integer quarter ordinal (year*4 + quarter - 1) -> 'YYYYQn' display label
+    return [f"{int(k) // 4}Q{int(k) % 4 + 1}" for k in keys]
 
-    # reindex so all plots share the same x-axis
-    gp1 = gp1.reindex(quarter_index, fill_value=0)
-    gp2 = gp2.reindex(quarter_index, fill_value=0)
-    gp3 = gp3.reindex(quarter_index, fill_value=0)
+def count_by_quarter(frame, col, index=True): # complaint counts per quarter received x col - grouped on the integer quarter key, labelled only for display
+    counts = frame.groupby(['Quarter received key', col], observed=False).size().unstack(fill_value=0)
+    if index:
+        counts = counts.reindex(quarter_index, fill_value=0) # all plots share the same x-axis
+    counts.index = quarter_labels(counts.index)
+    return counts
+
+def plot_quarterly_trend_zombie_data():
+    gp1 = count_by_quarter(df[df['Zombie data'] == 1], 'With narrative')
+    gp2 = count_by_quarter(df[df['Zombie data'] == 0], 'With narrative')
+    gp3 = count_by_quarter(df, 'With narrative')
 
     fig, axes = plt.subplots(3, 1, figsize=(14, 12), sharex=True)
 
@@ -53,14 +60,11 @@ def plot_quarterly_trend_zombie_data():
     save_plot(fig, 'quarterly_trend_zombie_data.png')
 
 def plot_quarterly_trend_zombie_data_CA():
-    gp1z = df[(df['State'] == 'CA') & (df['Zombie data'] == 1)].groupby(['Quarter received', 'With narrative'], observed=False).size().unstack(fill_value=0) # California zombie data
-    gp2z = df[(df['State'] != 'CA') & (df['Zombie data'] == 1)].groupby(['Quarter received', 'With narrative'], observed=False).size().unstack(fill_value=0) # other states zombie data
-    gp1o = df[(df['State'] == 'CA') & (df['Zombie data'] == 0)].groupby(['Quarter received', 'With narrative'], observed=False).size().unstack(fill_value=0) # California other complaints
-    gp2o = df[(df['State'] != 'CA') & (df['Zombie data'] == 0)].groupby(['Quarter received', 'With narrative'], observed=False).size().unstack(fill_value=0) # other states other complaints
-
-    # reindex so all plots share the same x-axis and complaints on zombie data is stacked below other complaints
-    gp1z = gp1z.reindex(quarter_index, fill_value=0)
-    gp2z = gp2z.reindex(quarter_index, fill_value=0)
+    # zombie data complaints are reindexed so all plots share the same x-axis and complaints on zombie data is stacked below other complaints
+    gp1z = count_by_quarter(df[(df['State'] == 'CA') & (df['Zombie data'] == 1)], 'With narrative') # California zombie data
+    gp2z = count_by_quarter(df[(df['State'] != 'CA') & (df['Zombie data'] == 1)], 'With narrative') # other states zombie data
+    gp1o = count_by_quarter(df[(df['State'] == 'CA') & (df['Zombie data'] == 0)], 'With narrative', index=False) # California other complaints
+    gp2o = count_by_quarter(df[(df['State'] != 'CA') & (df['Zombie data'] == 0)], 'With narrative', index=False) # other states other complaints
 
     def plot_stacked(ax, grouped, title):
         grouped.plot(kind='bar', stacked=True, ax=ax, color={1: '#1f77b4', 0: '#ff7f0e'}, width=0.8)
@@ -94,8 +98,8 @@ def plot_quarterly_trend_zombie_data_most_complaints_states(): # top 3 states wi
 
     ncomplaints = {}
     for state in states:
-        ncomplaints[f'z{state}'] = df[(df['State'] == state) & (df['Zombie data'] == 1)].groupby(['Quarter received', 'With narrative'], observed=False).size().unstack(fill_value=0).reindex(quarter_index)
-        ncomplaints[f'o{state}'] = df[(df['State'] == state) & (df['Zombie data'] == 0)].groupby(['Quarter received', 'With narrative'], observed=False).size().unstack(fill_value=0).reindex(quarter_index)
+        ncomplaints[f'z{state}'] = count_by_quarter(df[(df['State'] == state) & (df['Zombie data'] == 1)], 'With narrative')
+        ncomplaints[f'o{state}'] = count_by_quarter(df[(df['State'] == state) & (df['Zombie data'] == 0)], 'With narrative')
 
     def plot_stacked(ax, grouped, title):
         grouped.plot(kind='bar', stacked=True, ax=ax, color={1: '#1f77b4', 0: '#ff7f0e'}, width=0.8)
@@ -156,8 +160,8 @@ def plot_quarterly_companies_in_top_states(n):
 
     for state in states: 
         fig, axes = plt.subplots(2, 1, figsize=(14, 12), sharex=True)
-        ztab = df[(df['State'] == state) & (df['Zombie data'] == 1)].groupby(['Quarter received', 'Top company'], observed=False).size().unstack(fill_value=0).reindex(quarter_index)
-        otab = df[(df['State'] == state) & (df['Zombie data'] == 0)].groupby(['Quarter received', 'Top company'], observed=False).size().unstack(fill_value=0).reindex(quarter_index)
+        ztab = count_by_quarter(df[(df['State'] == state) & (df['Zombie data'] == 1)], 'Top company')
+        otab = count_by_quarter(df[(df['State'] == state) & (df['Zombie data'] == 0)], 'Top company')
 
         plot_line(axes[0], ztab, state, f'zombie data complaints / {state}')
         plot_line(axes[1], otab, state, f'other complaints / {state}')
@@ -167,8 +171,8 @@ def plot_quarterly_companies_in_top_states(n):
     df.drop(columns='Top company', inplace=True)
 
 def _plot_complaint_trend(df, quarter_index, ax1, title_suffix="", policy_date=[]):
-    obs = df.groupby(['Quarter received', 'Company type'], observed=False).size().unstack(fill_value=0).reindex(quarter_index).fillna(0)
-    obs.index = obs.index.astype(str)
+    obs = df.groupby(['Quarter received key', 'Company type'], observed=False).size().unstack(fill_value=0).reindex(quarter_index).fillna(0)
+    obs.index = quarter_labels(obs.index)
     left_df = obs[['bank', 'credit union', 'bank holding company', 'data broker']]
     right_df = obs[['major credit bureaus']]
 
@@ -254,7 +258,7 @@ def plot_company_type(n):
 def plot_complaints_and_response_per_size_company_quarter_level(company_type):
     subset = df[df['Company type']==company_type]
 
-    grouped = (subset.groupby(['Company', 'Quarter sent']).agg(complaints=('Company', 'count'),reliefs=('Is relief', 'sum'), total_assets=('Log real total assets', 'mean')).reset_index())
+    grouped = (subset.groupby(['Company', 'Quarter sent'], observed=True).agg(complaints=('Company', 'count'),reliefs=('Is relief', 'sum'), total_assets=('Log real total assets', 'mean')).reset_index())
     grouped['relief_rate'] = grouped['reliefs'] / grouped['complaints']
     grouped['log_complaints'] = np.log1p(grouped['complaints'])
     print(f"total assets for {company_type} ranges between {grouped['total_assets'].min()} and {grouped['total_assets'].max()}")
@@ -280,7 +284,7 @@ def plot_complaints_and_response_per_size_company_quarter_level(company_type):
     for i in range(2):
         subset = df[(df['Company type'] == company_type) & (df['Zombie data'] == i)]
 
-        grouped = (subset.groupby(['Company', 'Quarter sent']).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum'), total_assets=('Log real total assets', 'mean')).reset_index())
+        grouped = (subset.groupby(['Company', 'Quarter sent'], observed=True).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum'), total_assets=('Log real total assets', 'mean')).reset_index())
         grouped['relief_rate'] = grouped['reliefs']/grouped['complaints']
         grouped['log_complaints'] = np.log1p(grouped['complaints'])
 
@@ -304,7 +308,7 @@ def plot_complaints_and_response_per_size_company_level():
     for company_type in ['bank', 'credit union', 'bank holding company']:
         subset = df[df['Company type']==company_type]
     
-        grouped = subset.groupby(['Company']).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum'), assets=('Log real total assets', 'mean')).reset_index()
+        grouped = subset.groupby(['Company'], observed=True).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum'), assets=('Log real total assets', 'mean')).reset_index()
         grouped['relief_rate'] = grouped['reliefs']/grouped['complaints']
         grouped['log_complaints'] = np.log1p(grouped['complaints'])
 
@@ -326,7 +330,7 @@ def plot_complaints_and_response_per_size_company_level():
         for company_type in ['bank', 'credit union', 'bank holding company']:
             subset = df[(df['Company type']==company_type) &  (df['Zombie data']==i)]
 
-            grouped = subset.groupby(['Company']).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum'), assets=('Log real total assets', 'mean')).reset_index()
+            grouped = subset.groupby(['Company'], observed=True).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum'), assets=('Log real total assets', 'mean')).reset_index()
             grouped['relief_rate'] = grouped['reliefs']/grouped['complaints']
             grouped['log_complaints'] = np.log1p(grouped['complaints'])
 
@@ -346,7 +350,7 @@ def plot_response_per_complaint_count_company_quarterly_level():
     for i, company_type in enumerate(['bank', 'credit union', 'bank holding company']):
         subset = df[df['Company type']==company_type]
 
-        grouped = (subset.groupby(['Company', 'Quarter sent']).agg(complaints=('Company', 'count'),reliefs=('Is relief', 'sum')).reset_index())
+        grouped = (subset.groupby(['Company', 'Quarter sent'], observed=True).agg(complaints=('Company', 'count'),reliefs=('Is relief', 'sum')).reset_index())
         grouped['relief_rate'] = grouped['reliefs'] / grouped['complaints']
         grouped['log_complaints'] = np.log1p(grouped['complaints'])
 
@@ -366,7 +370,7 @@ def plot_response_per_complaint_count_company_quarterly_level():
         for j, company_type in enumerate(['bank', 'credit union', 'bank holding company']):
             subset = df[(df['Company type'] == company_type) & (df['Zombie data'] == i)]
 
-            grouped = (subset.groupby(['Company', 'Quarter sent']).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum')).reset_index())
+            grouped = (subset.groupby(['Company', 'Quarter sent'], observed=True).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum')).reset_index())
             grouped['relief_rate'] = grouped['reliefs']/grouped['complaints']
             grouped['log_complaints'] = np.log1p(grouped['complaints'])
 
@@ -381,7 +385,7 @@ def plot_response_per_complaint_count():
     fig, ax = plt.subplots(1, 1, figsize=(14, 8), sharex=True)
 
     subset = df[df['Company type'].isin(['bank', 'credit union', 'bank holding company', 'data broker', 'major credit bureaus'])]
-    grouped = subset.groupby(['Company', 'Company type']).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum')).reset_index()
+    grouped = subset.groupby(['Company', 'Company type'], observed=True).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum')).reset_index()
     grouped['relief_rate'] = grouped['reliefs']/grouped['complaints']
     grouped['log_complaints'] = np.log1p(grouped['complaints'])
 
@@ -398,7 +402,7 @@ def plot_response_per_complaint_count():
     for i in range(2):
         subset = df[(df['Company type'].isin(['bank', 'credit union', 'bank holding company', 'data broker', 'major credit bureaus', 'scra'])) &  (df['Zombie data']==i)]
 
-        grouped = subset.groupby(['Company', 'Company type']).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum')).reset_index()
+        grouped = subset.groupby(['Company', 'Company type'], observed=True).agg(complaints=('Company', 'count'), reliefs=('Is relief', 'sum')).reset_index()
         grouped['relief_rate'] = grouped['reliefs']/grouped['complaints']
         grouped['log_complaints'] = np.log1p(grouped['complaints'])
 
@@ -415,10 +419,10 @@ def quarterly_plot_assets_vs_relief():
     df['Quarter sent'] = pd.PeriodIndex(df['Quarter sent'], freq='Q').to_timestamp()
 
     # Grouping for plots
-    df_cq = df.groupby(['Quarter sent', 'Company', 'Company type']).agg(TotalAssets=('Log real total assets', 'mean'), ReliefRate=('Is relief', 'mean')).reset_index()
-    df_q = df.groupby(['Quarter sent', 'Company type']).agg(TotalAssets=('Log real total assets', 'mean'), ReliefRate=('Is relief', 'mean')).reset_index()
-    df_cq_z = df.groupby(['Quarter sent', 'Company', 'Zombie data', 'Company type']).agg(TotalAssets=('Log real total assets', 'mean'), ReliefRate=('Is relief', 'mean')).reset_index()
-    df_q_z = df.groupby(['Quarter sent', 'Company type', 'Zombie data']).agg(TotalAssets=('Log real total assets', 'mean'), ReliefRate=('Is relief', 'mean')).reset_index()
+    df_cq = df.groupby(['Quarter sent', 'Company', 'Company type'], observed=True).agg(TotalAssets=('Log real total assets', 'mean'), ReliefRate=('Is relief', 'mean')).reset_index()
+    df_q = df.groupby(['Quarter sent', 'Company type'], observed=True).agg(TotalAssets=('Log real total assets', 'mean'), ReliefRate=('Is relief', 'mean')).reset_index()
+    df_cq_z = df.groupby(['Quarter sent', 'Company', 'Zombie data', 'Company type'], observed=True).agg(TotalAssets=('Log real total assets', 'mean'), ReliefRate=('Is relief', 'mean')).reset_index()
+    df_q_z = df.groupby(['Quarter sent', 'Company type', 'Zombie data'], observed=True).agg(TotalAssets=('Log real total assets', 'mean'), ReliefRate=('Is relief', 'mean')).reset_index()
     df_cq['ReliefRate'] = df_cq['ReliefRate'] + 0.1
     df_q['ReliefRate'] = df_q['ReliefRate'] + 0.1
     df_cq_z['ReliefRate'] = df_cq_z['ReliefRate'] + 0.1
@@ -545,7 +549,7 @@ def quarterly_plot_assets_vs_relief():
     save_plot(fig, f'quarterly_assets_relief_rate_zombie.png')
 
     # P9 - P8 in yearly level
-    df_y_z = df.groupby(['Year sent', 'Company type', 'Zombie data']).agg(TotalAssets=('Log real total assets', 'mean'), ReliefRate=('Is relief', 'mean')).reset_index()
+    df_y_z = df.groupby(['Year sent', 'Company type', 'Zombie data'], observed=True).agg(TotalAssets=('Log real total assets', 'mean'), ReliefRate=('Is relief', 'mean')).reset_index()
     fig, axes = plt.subplots(1, 2, figsize=(20, 8), sharey=True)
     ax2 = [axes[0].twinx(), axes[1].twinx()]
 
@@ -578,13 +582,13 @@ def quarterly_plot_assets_vs_relief():
 def time_trend_in_relief_per_asset_quantile():
     # quarterly trend in relief rate by total assets quantile 
     tmp_bank = df[df['Company type'].isin(['bank', 'bank holding company'])].copy()
-    bank_assets = (tmp_bank.groupby(['Quarter sent', 'Company'])['Log total assets'].mean().reset_index())
+    bank_assets = (tmp_bank.groupby(['Quarter sent', 'Company'], observed=True)['Log total assets'].mean().reset_index())
     bank_assets['AssetsQuantile'] = bank_assets.groupby('Quarter sent')['Log total assets'].transform(lambda x: pd.qcut(x, 5, labels=False, duplicates='drop') + 1)
     tmp_bank = tmp_bank.merge(bank_assets[['Quarter sent', 'Company', 'AssetsQuantile']], on=['Quarter sent', 'Company'], how='left')
     print(pd.crosstab(bank_assets['Quarter sent'], bank_assets['AssetsQuantile']))
 
     tmp_cu = df[df['Company type']=='credit union'].copy()
-    cu_assets = (tmp_cu.groupby(['Quarter sent', 'Company'])['Log total assets'].mean().reset_index())
+    cu_assets = (tmp_cu.groupby(['Quarter sent', 'Company'], observed=True)['Log total assets'].mean().reset_index())
     cu_assets['AssetsQuantile'] = cu_assets.groupby('Quarter sent')['Log total assets'].transform(lambda x: pd.qcut(x, 5, labels=False, duplicates='drop') + 1)
     tmp_cu = tmp_cu.merge(cu_assets[['Quarter sent', 'Company', 'AssetsQuantile']], on=['Quarter sent', 'Company'], how='left')
     print(pd.crosstab(cu_assets['Quarter sent'], cu_assets['AssetsQuantile']))
@@ -757,13 +761,13 @@ def get_nrow_ncol(n_panels):
 def get_asset_quantiles(data, bins=5, by_company_type=True):
     if by_company_type:
         tmp_bank = data[data['Company type'].isin(['bank', 'bank holding company'])].copy()
-        bank_assets = (tmp_bank.groupby(['Quarter sent', 'Company'])['Log total assets'].mean().reset_index())
+        bank_assets = (tmp_bank.groupby(['Quarter sent', 'Company'], observed=True)['Log total assets'].mean().reset_index())
         bank_assets['AssetsQuantile'] = bank_assets.groupby('Quarter sent')['Log total assets'].transform(lambda x: pd.qcut(x, bins, labels=False, duplicates='drop') + 1)
         tmp_bank = tmp_bank.merge(bank_assets[['Quarter sent', 'Company', 'AssetsQuantile']], on=['Quarter sent', 'Company'], how='left')
         print(pd.crosstab(bank_assets['Quarter sent'], bank_assets['AssetsQuantile']))
 
         tmp_cu = data[data['Company type']=='credit union'].copy()
-        cu_assets = (tmp_cu.groupby(['Quarter sent', 'Company'])['Log total assets'].mean().reset_index())
+        cu_assets = (tmp_cu.groupby(['Quarter sent', 'Company'], observed=True)['Log total assets'].mean().reset_index())
         cu_assets['AssetsQuantile'] = cu_assets.groupby('Quarter sent')['Log total assets'].transform(lambda x: pd.qcut(x, bins, labels=False, duplicates='drop') + 1)
         tmp_cu = tmp_cu.merge(cu_assets[['Quarter sent', 'Company', 'AssetsQuantile']], on=['Quarter sent', 'Company'], how='left')
         print(pd.crosstab(cu_assets['Quarter sent'], cu_assets['AssetsQuantile']))
@@ -772,7 +776,7 @@ def get_asset_quantiles(data, bins=5, by_company_type=True):
         tmp['AssetsQuantile'] = tmp['AssetsQuantile'].astype('Int64')
     else:
         tmp = data.copy()
-        assets = (tmp.groupby(['Quarter sent', 'Company'])['Log total assets'].mean().reset_index())
+        assets = (tmp.groupby(['Quarter sent', 'Company'], observed=True)['Log total assets'].mean().reset_index())
         assets['AssetsQuantile'] = assets.groupby('Quarter sent')['Log total assets'].transform(lambda x: pd.qcut(x, bins, labels=False, duplicates='drop') + 1)
         tmp = tmp.merge(assets[['Quarter sent', 'Company', 'AssetsQuantile']], on=['Quarter sent', 'Company'], how='left')
         print(pd.crosstab(assets['Quarter sent'], assets['AssetsQuantile']))
@@ -815,8 +819,9 @@ def time_trend_in_relief_rate():
     save_plot(fig, 'quarterly_trend_relief_rate.png')
 
     # (2) line plot of quarterly trend in relief rate: quarterly-zombie-company type level - to observe company type-level heterogeneity 
-    relief = df.groupby(['Quarter sent', 'Zombie data', 'Company type'])['Is relief'].mean().reset_index(name='ReliefRate')
+    relief = df.groupby(['Quarter sent', 'Zombie data', 'Company type'], observed=True)['Is relief'].mean().reset_index(name='ReliefRate')
     tmp = df[df['Company type']!='others'].copy()
+    tmp['Company type'] = tmp['Company type'].cat.add_categories(['bank / bank holding company'])
     tmp.loc[tmp['Company type'].isin(['bank', 'bank holding company']), 'Company type'] = 'bank / bank holding company'
 
     fig, axes = plt.subplots(2, 3, figsize=(20, 12))
@@ -858,6 +863,7 @@ def time_trend_in_relief_rate():
 
     # heterogeneous company type
     fig, axes = plt.subplots(2, 3, figsize=(20, 12))
+    tmp['Company type'] = tmp['Company type'].cat.add_categories(['bank / bank holding company'])
     tmp.loc[tmp['Company type'].isin(['bank', 'bank holding company']), 'Company type'] = 'bank / bank holding company'
     tmp = tmp[tmp['Company type']!='others'].copy()
 
@@ -913,7 +919,7 @@ def plot_DV_per_size(DV_agg, data, titles, savepath): # DV_agg should be a list
 
     for company_type in data['Company type'].unique():
         subset = data[data['Company type']==company_type]
-        grouped = subset.groupby(['Company', 'Quarter sent']).agg(**agg_dict).reset_index()
+        grouped = subset.groupby(['Company', 'Quarter sent'], observed=True).agg(**agg_dict).reset_index()
 
         ## x: total assets, y: DVs, color: company (to approximately observe company effect)
         fig, axes = plt.subplots(len(DV_agg), 1, figsize=(10, 2 + 4*len(DV_agg)), sharex=True)
@@ -936,7 +942,7 @@ def plot_DV_per_size(DV_agg, data, titles, savepath): # DV_agg should be a list
 
     for company_type in data['Company type'].unique():
         subset = data[data['Company type']==company_type]
-        grouped = subset.groupby(['Company', 'Company type']).agg(**agg_dict).reset_index()
+        grouped = subset.groupby(['Company', 'Company type'], observed=True).agg(**agg_dict).reset_index()
         for i, (dv, method) in enumerate(DV_agg):
             sns.scatterplot(data=grouped, x='total_assets', y=f'{dv}_{method}', hue='Company type', palette=color_map, legend=True, ax=axes[i], alpha=0.6)
             axes[i].set_ylabel(f'{titles[i]}')
@@ -973,7 +979,7 @@ def time_heatmap_DV_per_asset_quantile(DV_agg, data, titles, savepath):
     # heatmap of quarterly trend in relief rate by total assets quantile - each company type separately
     fig, axes = plt.subplots(len(DV_agg), data['Company type'].nunique(), figsize=(14 + 4*len(DV_agg), 2 + 4*data['Company type'].nunique()), sharex=True)
     axes = np.atleast_2d(axes)
-    grouped = data.groupby(['AssetsQuantile', 'Quarter sent', 'Company type']).agg(**agg_dict).reset_index()
+    grouped = data.groupby(['AssetsQuantile', 'Quarter sent', 'Company type'], observed=True).agg(**agg_dict).reset_index()
 
     for i, (dv, method) in enumerate(DV_agg):
         for j, company_type in enumerate(grouped['Company type'].unique()):
@@ -988,7 +994,7 @@ def time_heatmap_DV_per_asset_quantile(DV_agg, data, titles, savepath):
     # heatmap of quarterly trend in relief rate by total assets quantile for bank/bhc - each regulatory type separately
     fig, axes = plt.subplots(data['Regulation'].nunique(), len(DV_agg), figsize=(10 + 4*len(DV_agg), 6 + 4*data['Regulation'].nunique()), sharex=True)
     axes = np.atleast_1d(axes).flatten()
-    grouped = data[data['Company type']=='bank_bhc'].groupby(['AssetsQuantile', 'Quarter sent', 'Regulation']).agg(**agg_dict).reset_index()
+    grouped = data[data['Company type']=='bank_bhc'].groupby(['AssetsQuantile', 'Quarter sent', 'Regulation'], observed=True).agg(**agg_dict).reset_index()
 
     for i, (dv, method) in enumerate(DV_agg):
         for j, reg in enumerate(grouped['Regulation'].unique()):
@@ -1013,7 +1019,7 @@ def time_trend_in_DV(DV_agg, data, titles, savepath):
     title = '_'.join([dv_agg[0] for dv_agg in DV_agg]).replace(' ', '_')
 
     # (1) line plot of time trend in DV: quarterly-company type level 
-    grouped = data.groupby(['Quarter sent', 'Company type']).agg(**agg_dict).reset_index()
+    grouped = data.groupby(['Quarter sent', 'Company type'], observed=True).agg(**agg_dict).reset_index()
     nrows, ncols = get_nrow_ncol(len(DV_agg) * data['Company type'].nunique())
     fig, axes = plt.subplots(nrows, ncols, figsize=(6 + 4*ncols, 2 + 4*nrows), sharex=True)
     axes = np.atleast_1d(axes).flatten()
@@ -1052,7 +1058,7 @@ def time_trend_in_DV(DV_agg, data, titles, savepath):
     save_plot(fig, f'quarterly_trend_{title}_CA.png', savepath)
 
     # heterogeneous company type
-    grouped = data.groupby(['Quarter sent', 'Company type', 'Is CA']).agg(**agg_dict).reset_index()
+    grouped = data.groupby(['Quarter sent', 'Company type', 'Is CA'], observed=True).agg(**agg_dict).reset_index()
     nrows, ncols = get_nrow_ncol(len(DV_agg) * data['Company type'].nunique())
     fig, axes = plt.subplots(nrows, ncols, figsize=(6 + 4*ncols, 2 + 4*nrows), sharex=True)
     axes = np.atleast_1d(axes).flatten()
@@ -1074,7 +1080,7 @@ def time_trend_in_DV(DV_agg, data, titles, savepath):
     # (4) line plot of quarterly trend in relief rate (Zombie vs Non-Zombie) in top 5 complaint counts states
     top_states = data['State'].value_counts().head(5).index.tolist()
     tmp = data[data['State'].isin(top_states)]
-    grouped = tmp.groupby(['Quarter sent', 'State']).agg(**agg_dict).reset_index()
+    grouped = tmp.groupby(['Quarter sent', 'State'], observed=True).agg(**agg_dict).reset_index()
     color_map, color_handles, color_labels = get_color_map(grouped, 'State')
 
     fig, axes = plt.subplots(len(DV_agg), 1, figsize=(10, 2 + 4*len(DV_agg)), sharex=True)
@@ -1093,7 +1099,7 @@ def time_trend_in_DV(DV_agg, data, titles, savepath):
 
 def plot_prop_zombie_per_complaint_counts(data, savepath):
     # scatter plot - x: total complaints y: proportion of zombie complaints
-    grouped = data.groupby(['Company', 'Company type']).agg(count=('Zombie data', 'count'), zombie=('Zombie data', 'mean')).reset_index()
+    grouped = data.groupby(['Company', 'Company type'], observed=True).agg(count=('Zombie data', 'count'), zombie=('Zombie data', 'mean')).reset_index()
     grouped['count'] = np.log1p(grouped['count'])
     fig, ax = plt.subplots(1, 1, figsize=(10, 6))
     sns.scatterplot(data=grouped, x='count', y='zombie', hue='Company type', palette='colorblind', legend=True, ax=ax, alpha=0.6)
@@ -1104,7 +1110,7 @@ def plot_prop_zombie_per_complaint_counts(data, savepath):
     save_plot(fig, f'proportion_zombie_per_total_complaint_counts.png', savepath)
 
     # scatter plot - x: total complaints y: number of zombie complaints
-    grouped = data.groupby(['Company', 'Company type']).agg(count=('Zombie data', 'count'), zombie=('Zombie data', 'sum')).reset_index()
+    grouped = data.groupby(['Company', 'Company type'], observed=True).agg(count=('Zombie data', 'count'), zombie=('Zombie data', 'sum')).reset_index()
     grouped['count'] = np.log1p(grouped['count'])
     grouped['zombie'] = np.log1p(grouped['zombie'])
     fig, ax = plt.subplots(1, 1, figsize=(10, 6))
@@ -1117,8 +1123,8 @@ def plot_prop_zombie_per_complaint_counts(data, savepath):
     save_plot(fig, 'zombie_count_per_total_complaint_counts.png', savepath)
 
     # bar plot - y: proportion of zombie complaints | company type (company-quarterly level)
-    grouped = data.groupby(['Company', 'Quarter sent', 'Company type']).agg(zombie=('Zombie data', 'mean')).reset_index()
-    type_avg = grouped.groupby('Company type')['zombie'].mean().reset_index()
+    grouped = data.groupby(['Company', 'Quarter sent', 'Company type'], observed=True).agg(zombie=('Zombie data', 'mean')).reset_index()
+    type_avg = grouped.groupby('Company type', observed=True)['zombie'].mean().reset_index()
     fig, ax = plt.subplots(1, 1, figsize=(10, 6))
     sns.barplot(data=grouped, x='Company type', y='zombie', ax=ax)
     ax.set_ylabel('Proportion of zombie complaint')
@@ -1157,8 +1163,8 @@ def regulation_effect_analysis():
             &(df['Total assets'].notna())].copy()
 
     # (1) histogram of total counts and zombie counts in company-quarterly level
-    total = tmp.groupby(['Quarter sent', 'Company']).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'), regulation=('Regulation', 'first'),  zprop=('Zombie data', 'mean')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Quarter sent', 'Company']).agg(zcount=('Total assets', 'size')).reset_index()
+    total = tmp.groupby(['Quarter sent', 'Company'], observed=True).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'), regulation=('Regulation', 'first'),  zprop=('Zombie data', 'mean')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Quarter sent', 'Company'], observed=True).agg(zcount=('Total assets', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Quarter sent', 'Company'], how='left')
     data['zcount'] = data['zcount'].fillna(0).astype(int)
 
@@ -1210,8 +1216,8 @@ def regulation_effect_analysis():
     save_plot(fig, 'complaint_count_total_assets_company_quarterly_level.png')
 
     #(3) histogram of complaint counts (company-yearly level)
-    total = tmp.groupby(['Year sent', 'Company']).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'), regulation=('Regulation', lambda x: x.mode().iloc[0]), zprop=('Zombie data', 'mean')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year sent', 'Company']).agg(zcount=('Total assets', 'size')).reset_index()
+    total = tmp.groupby(['Year sent', 'Company'], observed=True).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'), regulation=('Regulation', lambda x: x.mode().iloc[0]), zprop=('Zombie data', 'mean')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year sent', 'Company'], observed=True).agg(zcount=('Total assets', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Year sent', 'Company'], how='left')
     data['zcount'] = data['zcount'].fillna(0).astype(int)
 
@@ -1288,8 +1294,8 @@ def regulation_effect_analysis():
 
     #(6) x: total assets, y1: proportion of zombie complaints, y2: zombie complaints count, y3: total complaints count, hue: regulation (company level)
     for year in [2020, 2021, 2022, 2023, 2024]:
-        total = tmp[tmp['Year sent']==year].groupby(['Company']).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'), regulation=('Regulation', lambda x: x.mode().iloc[0]), zprop=('Zombie data', 'mean')).reset_index()
-        zombie = tmp[(tmp['Year sent']==year)&(tmp['Zombie data'] == 1)].groupby(['Company']).agg(zcount=('Total assets', 'size')).reset_index()
+        total = tmp[tmp['Year sent']==year].groupby(['Company'], observed=True).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'), regulation=('Regulation', lambda x: x.mode().iloc[0]), zprop=('Zombie data', 'mean')).reset_index()
+        zombie = tmp[(tmp['Year sent']==year)&(tmp['Zombie data'] == 1)].groupby(['Company'], observed=True).agg(zcount=('Total assets', 'size')).reset_index()
         data = pd.merge(total, zombie, on=['Company'], how='left')
         data['zcount'] = data['zcount'].fillna(0).astype(int)
 
@@ -1318,7 +1324,7 @@ def regulation_effect_analysis():
         save_plot(fig, f'complaint_count_total_assets_year{year}.png')
 
     # (7) distrubution of total assets - focusing around 10B
-    total = tmp.groupby(['Year sent', 'Company']).agg(assets=('Total assets', 'mean')).reset_index()
+    total = tmp.groupby(['Year sent', 'Company'], observed=True).agg(assets=('Total assets', 'mean')).reset_index()
     fig, ax = plt.subplots(1, 1, figsize=(10, 10))
     sns.histplot(data=total, x='assets', binrange=(5_000_000_000, 15_000_000_000), ax=ax, element='bars')
     ax.set_xlabel('Total assets')
@@ -1327,8 +1333,8 @@ def regulation_effect_analysis():
     save_plot(fig, 'dist_total_assets_company_yearly_level.png')
 
     # (8) scatter plot - focusing around 10B
-    total = tmp.groupby(['Year sent', 'Company']).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'), regulation=('Regulation', lambda x: x.mode().iloc[0]), zprop=('Zombie data', 'mean')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year sent', 'Company']).agg(zcount=('Total assets', 'size')).reset_index()
+    total = tmp.groupby(['Year sent', 'Company'], observed=True).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'), regulation=('Regulation', lambda x: x.mode().iloc[0]), zprop=('Zombie data', 'mean')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year sent', 'Company'], observed=True).agg(zcount=('Total assets', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Year sent', 'Company'], how='left')
     data['zcount'] = data['zcount'].fillna(0).astype(int)
     data = data[(data['assets']>5000000000)&(data['assets']<15000000000)] 
@@ -1362,8 +1368,8 @@ def CFPB_depository_analysis():
     tmp['Is CA'] = (tmp['State']=='CA')
 
     # (1) histogram of total counts and zombie counts in company-quarterly level
-    total = tmp.groupby(['Quarter sent', 'Company']).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'),  zprop=('Zombie data', 'mean')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Quarter sent', 'Company']).agg(zcount=('Total assets', 'size')).reset_index()
+    total = tmp.groupby(['Quarter sent', 'Company'], observed=True).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'),  zprop=('Zombie data', 'mean')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Quarter sent', 'Company'], observed=True).agg(zcount=('Total assets', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Quarter sent', 'Company'], how='left')
     data['zcount'] = data['zcount'].fillna(0).astype(int)
 
@@ -1388,8 +1394,8 @@ def CFPB_depository_analysis():
     print(summary_df.to_string(index=False))
 
     # (2) histogram of total counts and zombie counts in company-yearly level
-    total = tmp.groupby(['Year sent', 'Company']).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'), zprop=('Zombie data', 'mean')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year sent', 'Company']).agg(zcount=('Total assets', 'size')).reset_index()
+    total = tmp.groupby(['Year sent', 'Company'], observed=True).agg(count=('Total assets', 'size'), assets=('Total assets', 'mean'), zprop=('Zombie data', 'mean')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year sent', 'Company'], observed=True).agg(zcount=('Total assets', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Year sent', 'Company'], how='left')
     data['zcount'] = data['zcount'].fillna(0).astype(int)
 
@@ -1414,8 +1420,8 @@ def CFPB_depository_analysis():
     print(summary_df.to_string(index=False))
 
     # (3) x: Quarter sent, y: zprop, zcount, count
-    total = tmp.groupby(['Quarter sent', 'State']).agg(count=('Total assets', 'size'), zprop=('Zombie data', 'mean'), isca=('Is CA', 'first')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Quarter sent', 'State']).agg(zcount=('Total assets', 'size')).reset_index()
+    total = tmp.groupby(['Quarter sent', 'State'], observed=True).agg(count=('Total assets', 'size'), zprop=('Zombie data', 'mean'), isca=('Is CA', 'first')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Quarter sent', 'State'], observed=True).agg(zcount=('Total assets', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Quarter sent', 'State'], how='left')
     data['zcount'] = data['zcount'].fillna(0).astype(int)
     data = data.groupby(['Quarter sent', 'isca']).agg(count=('count', 'mean'), zprop=('zprop', 'mean'), zcount=('zcount', 'mean')).reset_index()
@@ -1445,8 +1451,8 @@ def CFPB_depository_analysis():
 
     # (4) x: Quarter sent, y: zprop, zcount, count - top states
     top_states = df['State'].value_counts().nlargest(5).index.tolist()
-    total = tmp.groupby(['Quarter sent', 'State']).agg(count=('Total assets', 'size'), zprop=('Zombie data', 'mean'), isca=('Is CA', 'first')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Quarter sent', 'State']).agg(zcount=('Total assets', 'size')).reset_index()
+    total = tmp.groupby(['Quarter sent', 'State'], observed=True).agg(count=('Total assets', 'size'), zprop=('Zombie data', 'mean'), isca=('Is CA', 'first')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Quarter sent', 'State'], observed=True).agg(zcount=('Total assets', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Quarter sent', 'State'], how='left')
     data = data[data['State'].isin(top_states)]
     data['zcount'] = data['zcount'].fillna(0).astype(int)
@@ -1510,7 +1516,7 @@ def regulation_effect_in_binary_zombie_counts(savepath):
             &(df['Total assets'].notna())].copy()
 
     #(1) x: total assets, y1: DV_agg, hue: regulation (company-yearly level)
-    data = tmp.groupby(['Quarter sent', 'Company']).agg(assets=('Total assets', 'mean'),  zbin=('Zombie data', 'any'), regulation=('Regulation', 'first')).reset_index()
+    data = tmp.groupby(['Quarter sent', 'Company'], observed=True).agg(assets=('Total assets', 'mean'),  zbin=('Zombie data', 'any'), regulation=('Regulation', 'first')).reset_index()
 
     fig, ax = plt.subplots(1, 1, figsize=(10, 10), sharex=True)
     sns.scatterplot(data=data, x='assets', y='zbin', hue='regulation', palette='colorblind', legend=True, ax=ax, alpha=0.6)
@@ -1524,7 +1530,7 @@ def regulation_effect_in_binary_zombie_counts(savepath):
 
     #(2) heatmap - proportion of companies with atleast one zombie data in asset quantile X year sent level
     tmp = get_asset_quantiles(tmp, bins=10, by_company_type=False)
-    data = tmp.groupby(['Quarter sent', 'Company']).agg(assets=('Total assets', 'mean'),  zbin=('Zombie data', 'any'), AssetsQuantile=('AssetsQuantile', 'mean')).reset_index()
+    data = tmp.groupby(['Quarter sent', 'Company'], observed=True).agg(assets=('Total assets', 'mean'),  zbin=('Zombie data', 'any'), AssetsQuantile=('AssetsQuantile', 'mean')).reset_index()
     heatmap_data = data.groupby(['Quarter sent', 'AssetsQuantile']).agg(zrate=('zbin', 'mean')).reset_index()
     pivot = heatmap_data.pivot(index='Quarter sent', columns='AssetsQuantile', values='zrate')
 
@@ -1538,7 +1544,7 @@ def regulation_effect_in_binary_zombie_counts(savepath):
 
     #(3) x: total assets, y1: proportion of zombie complaints, y2: zombie complaints count, y3: total complaints count, hue: regulation (company level)
     for year in [2020, 2021, 2022, 2023, 2024]:
-        data = tmp[tmp['Year sent']==year].groupby(['Company']).agg(assets=('Total assets', 'mean'),  zbin=('Zombie data', 'any'), regulation=('Regulation', lambda x: x.mode().iloc[0])).reset_index()
+        data = tmp[tmp['Year sent']==year].groupby(['Company'], observed=True).agg(assets=('Total assets', 'mean'),  zbin=('Zombie data', 'any'), regulation=('Regulation', lambda x: x.mode().iloc[0])).reset_index()
 
         fig, ax = plt.subplots(1, 1, figsize=(10, 10), sharex=True)
         sns.scatterplot(data=data, x='assets', y='zbin', hue='regulation', palette='colorblind', legend=True, ax=ax, alpha=0.6)
@@ -1553,8 +1559,8 @@ def regulation_effect_in_binary_zombie_counts(savepath):
     #(4) lineplot - proportion of companies with atleast one zombie data in asset quantile X year sent level
     bins = np.linspace(tmp['Log total assets'].min(), tmp['Log total assets'].max(), 20)
     tmp['asset_bin'] = pd.cut(tmp['Log total assets'], bins)
-    data = tmp.groupby(['Quarter sent', 'Company']).agg(asset_bin=('asset_bin', 'first'),  zbin=('Zombie data', 'any')).reset_index()
-    zrate_by_bin = data.groupby('asset_bin').agg(zrate=('zbin', 'mean')).reset_index()
+    data = tmp.groupby(['Quarter sent', 'Company'], observed=True).agg(asset_bin=('asset_bin', 'first'),  zbin=('Zombie data', 'any')).reset_index()
+    zrate_by_bin = data.groupby('asset_bin', observed=True).agg(zrate=('zbin', 'mean')).reset_index()
     zrate_by_bin['asset_bin_center'] = zrate_by_bin['asset_bin'].apply(lambda x: np.exp((x.left + x.right) / 2))
     zrate_by_bin = zrate_by_bin.sort_values('asset_bin_center')
 
@@ -1606,8 +1612,8 @@ def explore_income_effect_zctalvl(savepath):
     print(f"{tmp['Zombie data'].sum()} complaints are about zombie data")
     #import pdb; pdb.set_trace()
     #(1) x: median income, y: zprop, zcount, count (year-zip level)
-    total = tmp.groupby(['Year received', 'ZIP code']).agg(income=('RealMedIncome', 'mean'),  count=('Zombie data', 'size'), zprop=('Zombie data', 'mean')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year received', 'ZIP code']).agg(zcount=('Zombie data', 'size')).reset_index()
+    total = tmp.groupby(['Year received', 'ZIP code'], observed=True).agg(income=('RealMedIncome', 'mean'),  count=('Zombie data', 'size'), zprop=('Zombie data', 'mean')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year received', 'ZIP code'], observed=True).agg(zcount=('Zombie data', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Year received', 'ZIP code'], how='left')
     data['zcount'] = data['zcount'].fillna(0).astype(int)
 
@@ -1634,8 +1640,8 @@ def explore_income_effect_zctalvl(savepath):
     save_plot(fig, 'zprop_zip_yearly_level.png', savepath)
 
     #(2) x: median income, y: zprop, zcount, count, hue: company (year-zip level) - heterogeneity between companies
-    total = tmp.groupby(['Year received', 'ZIP code', 'Company']).agg(income=('RealMedIncome', 'mean'),  count=('Zombie data', 'size'), zprop=('Zombie data', 'mean')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year received', 'ZIP code', 'Company']).agg(zcount=('Zombie data', 'size')).reset_index()
+    total = tmp.groupby(['Year received', 'ZIP code', 'Company'], observed=True).agg(income=('RealMedIncome', 'mean'),  count=('Zombie data', 'size'), zprop=('Zombie data', 'mean')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year received', 'ZIP code', 'Company'], observed=True).agg(zcount=('Zombie data', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Year received', 'ZIP code', 'Company'], how='left')
     data['zcount'] = data['zcount'].fillna(0).astype(int)
 
@@ -1664,8 +1670,8 @@ def explore_income_effect_zctalvl(savepath):
 
     #(3) plot each year separately - x: median income, y: zprop, zcount, count (year-zip level)
     for year in [2020, 2021, 2022, 2023, 2024]:
-        total = tmp[tmp['Year received']==year].groupby(['ZIP code']).agg(income=('RealMedIncome', 'mean'),  count=('Zombie data', 'size'), zprop=('Zombie data', 'mean')).reset_index()
-        zombie = tmp[(tmp['Zombie data'] == 1)&(tmp['Year received']==year)].groupby(['ZIP code']).agg(zcount=('Zombie data', 'size')).reset_index()
+        total = tmp[tmp['Year received']==year].groupby(['ZIP code'], observed=True).agg(income=('RealMedIncome', 'mean'),  count=('Zombie data', 'size'), zprop=('Zombie data', 'mean')).reset_index()
+        zombie = tmp[(tmp['Zombie data'] == 1)&(tmp['Year received']==year)].groupby(['ZIP code'], observed=True).agg(zcount=('Zombie data', 'size')).reset_index()
         data = pd.merge(total, zombie, on=['ZIP code'], how='left')
         data['zcount'] = data['zcount'].fillna(0).astype(int)
 
@@ -1802,8 +1808,8 @@ def explore_income_effect_countylvl(savepath):
     save_plot(fig, 'zprop_county_yearly_level.png', savepath)
 
     #(2) x: median income, y: zprop, zcount, count, hue: company (year-zip level) - heterogeneity between companies
-    total = tmp.groupby(['Year received', 'fips', 'Company']).agg(income=('RealMedIncome', 'mean'),  count=('Zombie data', 'size'), zprop=('Zombie data', 'mean')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year received', 'fips', 'Company']).agg(zcount=('Zombie data', 'size')).reset_index()
+    total = tmp.groupby(['Year received', 'fips', 'Company'], observed=True).agg(income=('RealMedIncome', 'mean'),  count=('Zombie data', 'size'), zprop=('Zombie data', 'mean')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year received', 'fips', 'Company'], observed=True).agg(zcount=('Zombie data', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Year received', 'fips', 'Company'], how='left')
     data['zcount'] = data['zcount'].fillna(0).astype(int)
 
@@ -1921,8 +1927,8 @@ def explore_income_effect_countylvl_with_cutoff(cutoff, savepath, bins=5): # onl
     save_plot(fig, f'zprop_county_yearly_level_cutoff{cutoff}.png', savepath)
 
     #(2) x: median income, y: zprop, zcount, count, hue: company (year-zip level) - heterogeneity between companies
-    total = tmp.groupby(['Year received', 'fips', 'Company']).agg(income=('RealMedIncome', 'mean'),  count=('Zombie data', 'size'), zprop=('Zombie data', 'mean')).reset_index()
-    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year received', 'fips', 'Company']).agg(zcount=('Zombie data', 'size')).reset_index()
+    total = tmp.groupby(['Year received', 'fips', 'Company'], observed=True).agg(income=('RealMedIncome', 'mean'),  count=('Zombie data', 'size'), zprop=('Zombie data', 'mean')).reset_index()
+    zombie = tmp[tmp['Zombie data'] == 1].groupby(['Year received', 'fips', 'Company'], observed=True).agg(zcount=('Zombie data', 'size')).reset_index()
     data = pd.merge(total, zombie, on=['Year received', 'fips', 'Company'], how='left')
     data = data[data['count']>cutoff]
     data['zcount'] = data['zcount'].fillna(0).astype(int)
@@ -2005,29 +2011,9 @@ def explore_income_effect_countylvl_with_cutoff(cutoff, savepath, bins=5): # onl
     
 
 if __name__ == "__main__":
-    ### load dataset
-    df = pd.read_csv(os.path.join(cPATH, 'input', 'complaints_processed.csv'), low_memory=False)
-
-    ### set dtypes
-    df['Date received'] = pd.to_datetime(df['Date received'])
-    df['Date sent to company'] = pd.to_datetime(df['Date sent to company'])
-    df['Consumer complaint narrative'] = df['Consumer complaint narrative'].astype('string')
-    df['Month received'] = pd.to_datetime(df['Month received'])
-    df['Quarter received'] = pd.PeriodIndex(df['Quarter received'], freq='Q')
-    df['Year received'] = df['Year received'].astype('Int64') 
-    df['Quarter sent'] = pd.PeriodIndex(df['Quarter sent'], freq='Q')
-    df['Year sent'] = df['Year sent'].astype('Int64')
-    df['State privacy law'] = pd.to_datetime(df['State privacy law'])
-
-    ### set orders of categorical variables with order 
-    duration_order = ['< 1 day', '1 day', '2 days', '3 days', '4 days', '5 days', '6 days', '7 days', 'within two weeks', 
-                      'within a month', 'within 90 days', 'within 180 days', 'within a year', 'more than a year']
-    df['Duration categorized'] = pd.Categorical(df['Duration categorized'], categories=duration_order, ordered=True)
-    group_order = ['< 1 day', 'within a week', 'within a month', 'more than a month']
-    df['Duration grouped'] = pd.Categorical(df['Duration grouped'], categories=group_order, ordered=True)
-    ccpa_order = ['Pre-CCPA', 'CCPA enacted, pre-implement', 'CCPA implemented, pre-CPRA', 'CPRA amended, pre-implementation', 'CPRA implemented']
-    df['CCPA phase at receipt'] = pd.Categorical(df['CCPA phase at receipt'], categories=ccpa_order, ordered=False)
-    df['CCPA phase at sent'] = pd.Categorical(df['CCPA phase at sent'], categories=ccpa_order, ordered=False)
+    ### load dataset - categoricals (incl. the ordered duration/CCPA scales), dates and quarters are restored by the loader
+    df = load_complaints()
+    df['Quarter received key'] = (df['Quarter received'].dt.year * 4 + df['Quarter received'].dt.quarter - 1).astype('Int64') # integer quarter used for quarterly grouping
 
     ### split data into complaints with/without narratives for exploratory analysis
     subdf = df[df['With narrative']] # with narrative
@@ -2038,7 +2024,7 @@ if __name__ == "__main__":
     CCPA_quarters = {label: pd.to_datetime(date).to_period('Q').strftime('%YQ%q') for label, date in CCPA_timeline.items()}
     '''
     ### state-quarterly level zombie data plots
-    quarter_index = sorted(df['Quarter received'].unique())
+    quarter_index = sorted(df['Quarter received key'].dropna().unique())
     plot_quarterly_trend_zombie_data()
     plot_quarterly_trend_zombie_data_CA()
     plot_quarterly_trend_zombie_data_most_complaints_states()
@@ -2062,12 +2048,14 @@ if __name__ == "__main__":
 
     tmp = df[df['Company type'].isin(['bank', 'bank holding company', 'credit union'])].copy()
     tmp = get_asset_quantiles(tmp)
+    tmp['Company type'] = tmp['Company type'].cat.add_categories(['bank_bhc'])
     tmp.loc[tmp['Company type'].isin(['bank', 'bank holding company']), 'Company type'] = 'bank_bhc'
 
     plot_DV_per_size([('Zombie data', 'mean')], tmp, ['Proportion of zombie data complaints'], savepath)
     time_heatmap_DV_per_asset_quantile([('Zombie data', 'mean')], tmp, ['Proportion of zombie data complaints'], savepath)
 
     tmp = df[df['Company type']!='others'].copy()
+    tmp['Company type'] = tmp['Company type'].cat.add_categories(['bank_bhc'])
     tmp.loc[tmp['Company type'].isin(['bank', 'bank holding company']), 'Company type'] = 'bank_bhc'
     time_trend_in_DV([('Zombie data', 'mean')], tmp, ['Proportion of zombie data complaints'], savepath)
     plot_prop_zombie_per_complaint_counts(tmp, savepath)
@@ -0,0 +1,87 @@
+import json
+import operator
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+
+cPATH = os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "analysis")
+
+PERIOD_COLUMNS = ['Quarter received', 'Quarter sent'] # stored as 'YYYYQn' strings
+
+def csv_dtypes(schema): # dtype/parse_dates arguments of read_csv from the schema written by the build
+    dtypes, dates = {}, []
+    for col, spec in schema.items():
+        if spec['dtype'] == 'category':
+            dtypes[col] = pd.CategoricalDtype(spec['categories'], ordered=spec['ordered'])
+        elif spec['dtype'].startswith('datetime64'):
+            dates.append(col)
+        elif spec['dtype'] == 'bool':
+            dtypes[col] = 'boolean'
+        else:
+            dtypes[col] = spec['dtype']
+    return dtypes, dates
+
+# arrow style row filters [(column, op, value), ...] - pushed down to the parquet reader, applied as a mask when only the csv is available
+FILTER_OPS = {'==': operator.eq, '=': operator.eq, '!=': operator.ne, '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+              'in': lambda ser, values: ser.isin(values), 'not in': lambda ser, values: ~ser.isin(values)}
+
+def matches(value, cond): # cond is a list of kept values or a predicate on the value
+    if callable(cond):
+        return value is not None and pd.notna(value) and bool(cond(value))
+    return value in cond
+
+def select_partitions(manifest, where=None):
+    # partitions of the manifest whose values satisfy every condition of where ({partition column: values or predicate})
+    where = where or {}
+    unknown = set(where) - set(manifest['partition_by'])
+    if unknown:
+        raise ValueError(f"{sorted(unknown)} are not partition columns {manifest['partition_by']}")
+    return [part for part in manifest['partitions'] if all(matches(part[col], cond) for col, cond in where.items())]
+
+def row_mask(df, where=None, filters=None): # the same selection on a frame that was read whole
+    mask = pd.Series(True, index=df.index)
+    for col, cond in (where or {}).items():
+        mask &= df[col].map(lambda value: matches(value, cond)).astype(bool)
+    for col, op, value in (filters or []):
+        mask &= FILTER_OPS[op](df[col], value).fillna(False).astype(bool)
+    return mask
+
+def read_partitions(path, columns=None, where=None, filters=None):
+    # only the partitions selected from the manifest are opened, and only the requested columns and rows of them are decoded
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    parts = select_partitions(manifest, where)
+    print(f"reading {len(parts)} of {len(manifest['partitions'])} partitions ({sum(p['rows'] for p in parts)} of {manifest['rows']} rows before row filters)")
+    tables = [pq.read_table(os.path.join(path, part['file']), columns=columns, filters=filters) for part in parts]
+    if not tables:
+        return pd.DataFrame(columns=columns or list(manifest['columns']))
+    return pa.concat_tables(tables, promote_options='default').to_pandas() # a column that is all missing in one partition is typed null there
+
+def load_complaints(columns=None, where=None, filters=None, periods=True, path=os.path.join(cPATH, 'input')):
+    # processed complaints with the compact dtypes of the build (categoricals, nullable/small integers, float32)
+    # where selects partitions, e.g. {'Company type': ['major credit bureaus'], 'Quarter sent': lambda q: q < '2023Q1'}, filters selects rows within them
+    # the partitioned copy is used when it was shipped, then the typed parquet copy, otherwise the csv is read with the dtypes declared in the schema file
+    partitioned_path = os.path.join(path, 'complaints_processed')
+    parquet_path = os.path.join(path, 'complaints_processed.parquet')
+    if os.path.exists(os.path.join(partitioned_path, 'manifest.json')):
+        df = read_partitions(partitioned_path, columns=columns, where=where, filters=filters)
+    else:
+        if os.path.exists(parquet_path):
+            df = pd.read_parquet(parquet_path, columns=columns, filters=filters)
+            filters = None
+        else:
+            with open(os.path.join(path, 'complaints_processed_schema.json')) as f:
+                schema = json.load(f)
+            if columns is not None:
+                schema = {col: spec for col, spec in schema.items() if col in columns}
+            dtypes, dates = csv_dtypes(schema)
+            df = pd.read_csv(os.path.join(path, 'complaints_processed.csv'), usecols=columns, dtype=dtypes, parse_dates=dates, low_memory=False)
+        if where or filters:
+            df = df[row_mask(df, where, filters)].reset_index(drop=True)
+
+    for col in PERIOD_COLUMNS:
+        if col in df.columns:
+            df[col] = pd.PeriodIndex(df[col], freq='Q') if periods else df[col].astype(object) # periods=False keeps the 'YYYYQn' strings of the csv
+    return df
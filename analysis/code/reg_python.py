@@ -5,10 +5,14 @@ import statsmodels.formula.api as smf
 from itertools import combinations, permutations
 from linearmodels.panel import PanelOLS
 
+from load_data import load_complaints
+
 
 
 cPATH = os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "analysis")
 
+STUDY_PARTITIONS = {'Company type': ['major credit bureaus'], 'Quarter sent': lambda q: q < '2023Q1'}
+
 def quarter_str_to_date(qstr):
     year = qstr[:4]
     month = (int(qstr[-1])-1)*3 + 1
@@ -103,7 +107,8 @@ def format_latex(df, label="tab:table", caption="Insert caption here", remark =
 
 if __name__ == "__main__":
     ### load dataset
-    df = pd.read_csv(os.path.join(cPATH, 'input', 'complaints_processed.csv'), low_memory=False)
+    # every study below is restricted to complaints sent to major credit bureaus before 2023 (see exclusion_criteria) - only those partitions are read
+    df = load_complaints(periods=False, where=STUDY_PARTITIONS) # quarters stay 'YYYYQn' strings, as the exclusion criteria compare them as text
 
     ########################### STUDY Preliminary CCPA effect ############################
     ### DV: relief rate, unit of observation: state X quarterly level, treatment: CCPA ###
@@ -113,7 +118,7 @@ if __name__ == "__main__":
     df_val.columns = df_val.columns.str.strip()             
     df_val.columns = df_val.columns.str.replace(' ', '_') 
 
-    df_grouped = df_val.groupby(['State', 'Quarter_sent', 'Is_CA', 'CCPA'], as_index=False).agg(relief_rate=('Is_relief', 'mean'))
+    df_grouped = df_val.groupby(['State', 'Quarter_sent', 'Is_CA', 'CCPA'], as_index=False, observed=True).agg(relief_rate=('Is_relief', 'mean'))
     df_grouped['Is_CA'] = pd.Categorical(df_grouped['Is_CA'], categories=['CA', 'Other'], ordered=False)
 
     model1 = smf.ols("relief_rate ~ C(CCPA, Treatment(reference=False)) + C(Is_CA, Treatment(reference='Other'))", data=df_grouped).fit(cov_type='HC1')
@@ -149,7 +154,7 @@ if __name__ == "__main__":
     df_val.columns = df_val.columns.str.strip()             
     df_val.columns = df_val.columns.str.replace(' ', '_') 
 
-    df_grouped = df_val.groupby(['State', 'Quarter_sent', 'Is_CA', 'CCPA', 'Persistent_data', 'Year_sent'], as_index=False).agg(relief_rate=('Is_relief', 'mean'))
+    df_grouped = df_val.groupby(['State', 'Quarter_sent', 'Is_CA', 'CCPA', 'Persistent_data', 'Year_sent'], as_index=False, observed=True).agg(relief_rate=('Is_relief', 'mean'))
     df_grouped['Is_CA'] = pd.Categorical(df_grouped['Is_CA'], categories=['CA', 'Other'], ordered=False)
 
     model1 = smf.ols("relief_rate ~ C(CCPA, Treatment(reference=False)) + C(Is_CA, Treatment(reference='Other')) + C(Persistent_data, Treatment(reference=False))", data=df_grouped).fit(cov_type='HC1')
@@ -222,7 +227,7 @@ if __name__ == "__main__":
     df_val.columns = df_val.columns.str.strip()             
     df_val.columns = df_val.columns.str.replace(' ', '_') 
 
-    df_grouped = df_val.groupby(['State', 'Quarter_received', 'Is_CA', 'CCPA'], as_index=False).agg(count=('Is relief', 'size'), pop=('Population_state', 'first')) # unit of observation
+    df_grouped = df_val.groupby(['State', 'Quarter_received', 'Is_CA', 'CCPA'], as_index=False, observed=True).agg(count=('Is relief', 'size'), pop=('Population_state', 'first')) # unit of observation
     df_grouped['Is_CA'] = pd.Categorical(df_grouped['Is_CA'], categories=['CA', 'Other'], ordered=False)
     df_grouped['count_per_pop'] = df_grouped['count']/df_grouped['pop']
 
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+
+def asset_panel(sources):
+    # institution x quarter array of total assets, complete over every quarter between the first and the last reported one
+    # sources: [(frame, rssd column, quarter key column, value column), ...] in priority order - the first source reporting an institution-quarter wins
+    parts = [pd.DataFrame({'RSSD': pd.to_numeric(frame[rssd], errors='coerce'), 'Quarter key': pd.to_numeric(frame[quarter], errors='coerce'),
+                           'value': pd.to_numeric(frame[value], errors='coerce')}) for frame, rssd, quarter, value in sources]
+    long = pd.concat(parts, ignore_index=True).dropna().drop_duplicates(['RSSD', 'Quarter key'])
+    rssd = np.sort(long['RSSD'].unique()).astype(np.int64)
+    first = int(long['Quarter key'].min())
+    values = np.full((len(rssd), int(long['Quarter key'].max()) - first + 1), np.nan)
+    values[np.searchsorted(rssd, long['RSSD'].to_numpy(dtype=np.int64)), long['Quarter key'].to_numpy(dtype=np.int64) - first] = long['value'].to_numpy()
+    return {'rssd': rssd, 'first': first, 'values': values}
+
+def shift_panel(panel, k): # value k quarters earlier (k > 0, lag) or later (k < 0, lead) of every cell - missing beyond the panel edges
+    values = panel['values']
+    shifted = np.full_like(values, np.nan)
+    if k > 0:
+        shifted[:, k:] = values[:, :-k]
+    elif k < 0:
+        shifted[:, :k] = values[:, -k:]
+    else:
+        shifted[:] = values
+    return shifted
+
+def panel_lookup(panel, values, rssd, quarter_keys):
+    # cell of values (the panel or an array derived from it) for every (rssd, quarter key) pair - missing where either is outside the panel
+    r = pd.to_numeric(pd.Series(rssd), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    q = pd.to_numeric(pd.Series(quarter_keys), errors='coerce').to_numpy(dtype=float, na_value=np.nan) - panel['first']
+    out = np.full(len(r), np.nan)
+    if len(panel['rssd']) == 0:
+        return out
+    row = np.minimum(np.searchsorted(panel['rssd'], np.nan_to_num(r, nan=-1).astype(np.int64)), len(panel['rssd']) - 1)
+    valid = (panel['rssd'][row] == r) & (q >= 0) & (q < values.shape[1]) # False for missing keys
+    out[valid] = values[row[valid], q[valid].astype(np.int64)]
+    return out
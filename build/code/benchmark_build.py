@@ -0,0 +1,108 @@
+import argparse
+import glob
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+import pandas as pd
+
+from synthetic_data import SCALES, generate
+
+
+cPATH = os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "build")
+
+BUILD_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'build_data.py')
+
+def benchmark_dir():
+    return os.path.join(cPATH, 'temp', 'benchmarks')
+
+def clear_build_state(root):
+    # cold build: drop the caches, stage manifests, reports and outputs of earlier runs - temp/ACSdataset_countylvl is an input and stays
+    temp = os.path.join(root, 'temp')
+    for entry in os.listdir(temp):
+        if entry != 'ACSdataset_countylvl':
+            path = os.path.join(temp, entry)
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+    shutil.rmtree(os.path.join(root, 'output'), ignore_errors=True)
+    os.makedirs(os.path.join(root, 'output'))
+
+def run_build(root, build_args=()):
+    # build_data.py in its own process on the synthetic tree, so its peak memory is not mixed with the generator's - returns its run report
+    start = time.perf_counter()
+    subprocess.run([sys.executable, BUILD_SCRIPT, *build_args], env=dict(os.environ, CC_BUILD_DIR=root), cwd=os.path.dirname(BUILD_SCRIPT), check=True)
+    wall = time.perf_counter() - start
+    reports = sorted(glob.glob(os.path.join(root, 'temp', 'run_reports', 'build_data_*.json')), key=os.path.getmtime)
+    with open(reports[-1]) as f:
+        report = json.load(f)
+    report['wall_seconds'] = round(wall, 3)
+    return report
+
+def step_table(report): # one row per measured step - repeated step names are told apart by their occurrence
+    steps = pd.DataFrame(report['steps'])
+    steps['occurrence'] = steps.groupby('step').cumcount()
+    return steps.set_index(['step', 'occurrence'])[['seconds', 'peak_rss_mb', 'rows_in', 'rows_out', 'mb_out']]
+
+def previous_benchmark(scale, mode): # latest saved benchmark of the same scale and mode
+    paths = sorted(glob.glob(os.path.join(benchmark_dir(), f'benchmark_{scale}_{mode}_*.json')))
+    paths = [p for p in paths if re.fullmatch(rf'benchmark_{re.escape(scale)}_{mode}_\d{{8}}-\d{{6}}\.json', os.path.basename(p))] # cold_* also matches cold_incremental_*
+    if not paths:
+        return None
+    with open(paths[-1]) as f:
+        return json.load(f)
+
+def compare(report, baseline, tolerance=0.25, min_seconds=1.0):
+    # steps slower than the baseline by more than tolerance (and by at least min_seconds, so that tiny steps do not flap) + peak memory
+    table = step_table(report).join(step_table(baseline)[['seconds', 'peak_rss_mb']], rsuffix=' baseline', how='outer')
+    table['time ratio'] = (table['seconds'] / table['seconds baseline']).round(2)
+    table['regression'] = (table['time ratio'] > 1 + tolerance) & (table['seconds'] - table['seconds baseline'] > min_seconds)
+    print(table[['seconds', 'seconds baseline', 'time ratio', 'regression']].to_string())
+
+    regressions = table.index[table['regression']].get_level_values('step').tolist()
+    if report['total_seconds'] > baseline['total_seconds'] * (1 + tolerance):
+        regressions.append(f"total time {baseline['total_seconds']}s -> {report['total_seconds']}s")
+    if report['peak_rss_mb'] > baseline['peak_rss_mb'] * (1 + tolerance):
+        regressions.append(f"peak memory {baseline['peak_rss_mb']}MB -> {report['peak_rss_mb']}MB")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='time every step of build_data.py on synthetic inputs')
+    parser.add_argument('--scale', nargs='+', default=['1M'], help=f"numbers of complaints, each one of {list(SCALES)} or an integer")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--root', default=os.path.join(cPATH, 'temp', 'synthetic'), help='directory holding one synthetic tree per scale')
+    parser.add_argument('--warm', action='store_true', help='keep the caches of the previous run (times the cached path instead of a cold build)')
+    parser.add_argument('--incremental', action='store_true', help='run the build with --incremental')
+    parser.add_argument('--compare', action='store_true', help='compare with the previous benchmark of the same scale and mode, exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+
+    mode = ('warm' if args.warm else 'cold') + ('_incremental' if args.incremental else '')
+    os.makedirs(benchmark_dir(), exist_ok=True)
+    regressions = {}
+    for scale in args.scale:
+        n = SCALES.get(scale.upper()) or int(scale)
+        root = os.path.join(args.root, scale)
+        synthetic = generate(root, n, seed=args.seed)
+        baseline = previous_benchmark(scale, mode) if args.compare else None
+        if not args.warm:
+            clear_build_state(root)
+
+        report = run_build(root, ['--incremental'] if args.incremental else [])
+        print(f"\n### {scale} complaints ({mode}): {report['total_seconds']}s, peak {report['peak_rss_mb']}MB")
+        print(step_table(report).to_string())
+        result = {'scale': scale, 'complaints': n, 'seed': args.seed, 'mode': mode, 'synthetic': synthetic, 'report': report}
+        path = os.path.join(benchmark_dir(), f"benchmark_{scale}_{mode}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+        with open(path, 'w') as f:
+            json.dump(result, f, indent=2)
+        print(f"benchmark saved to {path}")
+
+        if baseline is not None:
+            found = compare(report, baseline['report'], tolerance=args.tolerance)
+            if found:
+                regressions[scale] = found
+
+    if regressions:
+        print(f"performance regressions: {regressions}")
+        sys.exit(1)
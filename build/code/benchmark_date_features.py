@@ -0,0 +1,53 @@
+import time
+import numpy as np
+import pandas as pd
+
+from build_data import categorize_duration, group_duration, quarter_to_period_end, get_lag_quarter
+from date_features import cpi_at_quarter_end, duration_categories, duration_groups, quarter_end_date, quarter_ordinal
+
+
+def timed(label, func, results):
+    start = time.perf_counter()
+    out = func()
+    results.append((label, time.perf_counter() - start))
+    return out
+
+def run_benchmark(n=1000000, seed=1234):
+    rng = np.random.default_rng(seed)
+    days = pd.Series(rng.integers(-2, 500, n)).astype(float)
+    days[rng.random(n) < 0.01] = np.nan # a few complaints without sent date
+    quarters = pd.Series(pd.period_range('2010Q1', '2025Q1', freq='Q')).sample(n, replace=True, random_state=seed).reset_index(drop=True)
+    months = pd.date_range('2009-01-01', '2025-12-01', freq='MS')
+    cpi_df = pd.DataFrame({'observation_date': months.strftime('%Y-%m-%d'), 'CPIAUCSL': np.linspace(210, 320, len(months))})
+    cpi_dict = cpi_df.set_index(cpi_df['observation_date'].str[:-3])['CPIAUCSL'].to_dict()
+    results = []
+
+    # row-wise helpers as used in build_data before the vectorized kernel
+    cat_row = timed('duration categorized (apply)', lambda: days.apply(categorize_duration), results)
+    grp_row = timed('duration grouped (apply)', lambda: cat_row.apply(group_duration), results)
+    end_row = timed('quarter end date (apply)', lambda: quarters.astype(str).apply(quarter_to_period_end), results)
+    lag_row = timed('lag quarter (apply)', lambda: end_row.apply(get_lag_quarter), results)
+    cpi_row = timed('cpi lookup (apply)', lambda: end_row.apply(lambda x: cpi_dict[x[:-3]]), results)
+
+    # vectorized kernel
+    cat_vec = timed('duration categorized (vectorized)', lambda: duration_categories(days), results)
+    grp_vec = timed('duration grouped (vectorized)', lambda: duration_groups(cat_vec), results)
+    ordinals = timed('quarter ordinal (vectorized)', lambda: quarter_ordinal(quarters), results)
+    end_vec = timed('quarter end date (vectorized)', lambda: quarter_end_date(ordinals), results)
+    lag_vec = timed('lag quarter (vectorized)', lambda: quarter_end_date(ordinals - 1), results)
+    cpi_vec = timed('cpi lookup (vectorized)', lambda: cpi_at_quarter_end(cpi_df, ordinals), results)
+
+    # outputs have to be identical to the row-wise helpers
+    assert (cat_vec.astype(str) == cat_row).all()
+    assert (grp_vec.astype(str) == grp_row).all()
+    assert (end_vec == end_row).all()
+    assert (lag_vec == lag_row).all()
+    assert np.allclose(cpi_vec, cpi_row.to_numpy())
+
+    report = pd.DataFrame(results, columns=['step', 'seconds'])
+    print(f"benchmark on {n} complaints")
+    print(report.to_string(index=False))
+    return report
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -1,13 +1,34 @@
+import argparse
 import glob
+import hashlib
 import itertools
+import json
 import os
 import re
+import shutil
+import sys
+import time
+import warnings
 import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from concurrent.futures import ThreadPoolExecutor
 from datetime import date
+from pandas.api.types import union_categoricals
+from asset_panel import asset_panel, panel_lookup, shift_panel
+from date_features import cpi_at_quarter_end, duration_categories, duration_groups, quarter_end_date, quarter_key, quarter_ordinal
+from enrichment import attach, dense_grid, grid_lookup, lookup, narrow_keys
+from hierarchy import node_ids, node_vector, ownership_closure
+from instrumentation import measure, write_report
+from intervals import as_of, expand_intervals, interval_index, quarter_ends
+from name_index import build_name_index, lookup_by_key, normalize_name, normalize_names
+from pipeline import code_closure, load_json, process_pool, run_stages, save_json, stage_dir
+from table_cache import SCHEMAS, apply_schema, cache_path, has_cache, read_cache, write_cache, write_partitions, write_schema
 
 
-cPATH = os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "build")
+cPATH = os.environ.get("CC_BUILD_DIR", os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "build")) # CC_BUILD_DIR points the build at another tree, e.g. the synthetic inputs of benchmark_build.py
 
 def categorize_duration(days):
     if days < 1:
@@ -72,57 +93,91 @@ def extract_date_parts(text):
         raise ValueError(f"Cannot parse date from digits: {digits} (text: {text})")
     return '-'.join([year, month, day]) # YYYY-MM-DD format
 
-def read_cfpd_depository_institutions_list_excels(override=False):
-    if not override and os.path.exists(os.path.join(cPATH, 'temp', 'cfpb_all_depository_institutions_combined.csv')):
-        deduped_renamed = pd.read_csv(os.path.join(cPATH, 'temp', 'cfpb_all_depository_institutions_combined.csv'))
-        return deduped_renamed 
-
-    files = list(itertools.chain.from_iterable(glob.glob(os.path.join(cPATH, 'input', 'CFPD', 'depository_institutions', ext)) for ext in ('*.xlsx', '*.xls')))
-    dfs = []
-    valid_dates = {(3, 31), (6, 30), (9, 30), (12, 31)}
-    for file in files:
-        filename = os.path.basename(file)
-        ext = filename.split('.')[-1]
-
-        if filename == '201209_CFPB_depository-institutions-list.xls':
-            header_depo, header_aff, date_idx, engine = 2, 1, 1, 'xlrd' # header rows, row index with date information, engine to use when reading excel file
-        elif filename == '201409_cfpb_depository-institutions-list.xls':
-            header_depo, header_aff, date_idx, engine = 1, 2, 0, 'xlrd'
-        elif ext == '.xls':
-            header_depo, header_aff, date_idx, engine = 1, 1, 0, 'xlrd'
+def frame_with_header(raw, header): # same frame as pd.read_excel(header=header) from a sheet already parsed with header=None
+    columns, seen = [], {}
+    for i, col in enumerate(raw.iloc[header]):
+        col = f'Unnamed: {i}' if pd.isna(col) else str(col)
+        if col in seen: # mangle duplicated names like read_excel does
+            seen[col] += 1
+            col = f'{col}.{seen[col]}'
         else:
-            header_depo, header_aff, date_idx, engine = 1, 1, 0, None
-        
-        if filename == 'bcfp_depository-institutions_20180331.xlsx':
-            prefix = 'Bureau'
-        elif filename in ['bcfp_depository-insitutions-list_2018-09.xlsx', 'bcfp_depository-institutions_list_2018-06.xlsx']:
-            prefix = 'BCFP'
-        else:
-            prefix = 'CFPB'
-
-        df_raw = pd.read_excel(file, sheet_name=f'{prefix} Depository Institutions', header=None, engine=engine)
-        df_depo = pd.read_excel(file, sheet_name=f'{prefix} Depository Institutions', header=header_depo, engine=engine)
-        df_aff = pd.read_excel(file, sheet_name=f'{prefix} Depository Affilliates', header=header_aff, engine=engine)
-        df_depo.columns = df_depo.columns.str.replace(r'\s+', ' ', regex=True).str.strip()
-        df_aff.columns = df_aff.columns.str.replace(r'\s+', ' ', regex=True).str.strip()
-        
-        df_depo['Regulation'] = 'Depository'
-        df_aff['Regulation'] = 'Affiliates'
-
-        if 'ID' not in df_depo.columns:
-            df_depo['ID'] = -1 # filler ID to indicate that RSSD ID information is not available
-            df_aff['ID'] = -1 # filler ID to indicate that RSSD ID information is not available
-
-        df_depo = df_depo[['ID', 'Institution', 'City', 'State', 'Regulation']]
-        df_aff = df_aff[['ID', 'Institution', 'City', 'State', 'Regulation']]
-        df = pd.concat([df_depo, df_aff], ignore_index=True)
-
-        # getting date information
-        date = extract_date_parts(df_raw.iloc[date_idx, 0])
-        df['Reporting date'] = date
-        df['Institution'] = df['Institution'].str.upper().str.strip() 
-        dfs.append(df)
+            seen[col] = 0
+        columns.append(col)
+    df = raw.iloc[header + 1:].reset_index(drop=True)
+    df.columns = columns
+    return df.infer_objects()
+
+def read_cfpd_depository_institutions_list_excel(file):
+    filename = os.path.basename(file)
+    ext = filename.split('.')[-1]
+
+    if filename == '201209_CFPB_depository-institutions-list.xls':
+        header_depo, header_aff, date_idx, engine = 2, 1, 1, 'xlrd' # header rows, row index with date information, engine to use when reading excel file
+    elif filename == '201409_cfpb_depository-institutions-list.xls':
+        header_depo, header_aff, date_idx, engine = 1, 2, 0, 'xlrd'
+    elif ext == '.xls':
+        header_depo, header_aff, date_idx, engine = 1, 1, 0, 'xlrd'
+    else:
+        header_depo, header_aff, date_idx, engine = 1, 1, 0, None
+    
+    if filename == 'bcfp_depository-institutions_20180331.xlsx':
+        prefix = 'Bureau'
+    elif filename in ['bcfp_depository-insitutions-list_2018-09.xlsx', 'bcfp_depository-institutions_list_2018-06.xlsx']:
+        prefix = 'BCFP'
+    else:
+        prefix = 'CFPB'
+
+    # open the workbook once and parse each sheet once - the header of the institutions sheet is taken from the raw rows that also hold the date
+    with pd.ExcelFile(file, engine=engine) as xls:
+        df_raw = xls.parse(f'{prefix} Depository Institutions', header=None)
+        df_aff = xls.parse(f'{prefix} Depository Affilliates', header=header_aff)
+    df_depo = frame_with_header(df_raw, header_depo)
+    df_depo.columns = df_depo.columns.str.replace(r'\s+', ' ', regex=True).str.strip()
+    df_aff.columns = df_aff.columns.str.replace(r'\s+', ' ', regex=True).str.strip()
+    
+    df_depo['Regulation'] = 'Depository'
+    df_aff['Regulation'] = 'Affiliates'
+
+    if 'ID' not in df_depo.columns:
+        df_depo['ID'] = -1 # filler ID to indicate that RSSD ID information is not available
+        df_aff['ID'] = -1 # filler ID to indicate that RSSD ID information is not available
+
+    df_depo = df_depo[['ID', 'Institution', 'City', 'State', 'Regulation']]
+    df_aff = df_aff[['ID', 'Institution', 'City', 'State', 'Regulation']]
+    df = pd.concat([df_depo, df_aff], ignore_index=True)
+
+    # getting date information
+    date = extract_date_parts(df_raw.iloc[date_idx, 0])
+    df['Reporting date'] = date
+    df['Institution'] = df['Institution'].str.upper().str.strip() 
+    return df
+
+def depository_list_parser_version(): # code of the workbook parser and the schema of its output - a change invalidates every parsed workbook
+    parts = code_closure([read_cfpd_depository_institutions_list_excel]) + [repr(SCHEMAS['cfpb_depository_list'])]
+    return hashlib.md5('\n'.join(parts).encode()).hexdigest()
+
+def depository_list_cache_name(file, version): # per-workbook cache keyed by path, size, mtime and parser version
+    stat = os.stat(file)
+    key = hashlib.md5(f"{os.path.abspath(file)}|{stat.st_size}|{stat.st_mtime}|{version}".encode()).hexdigest()[:12]
+    return f"{os.path.splitext(os.path.basename(file))[0]}_{key}"
+
+def cached_depository_institutions_list_excel(file, version): # only new or modified lists are parsed, and all of them after a parser change
+    name, cache_dir = depository_list_cache_name(file, version), os.path.join(cPATH, 'temp', 'cfpb_depository_lists')
+    if has_cache(name, cache_dir):
+        return read_cache(name, cache_dir=cache_dir)
+    return write_cache(read_cfpd_depository_institutions_list_excel(file), name, cache_dir=cache_dir, schema=SCHEMAS['cfpb_depository_list'])
+
+def read_cfpd_depository_institutions_list_excels(override=False, max_workers=None):
+    if not override and has_cache('cfpb_all_depository_institutions_combined'):
+        return read_cache('cfpb_all_depository_institutions_combined')
 
+    files = list(itertools.chain.from_iterable(glob.glob(os.path.join(cPATH, 'input', 'CFPD', 'depository_institutions', ext)) for ext in ('*.xlsx', '*.xls')))
+    version = depository_list_parser_version()
+    with process_pool(max_workers) as executor:
+        dfs = list(executor.map(cached_depository_institutions_list_excel, files, itertools.repeat(version)))
+    current = {cache_path(depository_list_cache_name(file, version), os.path.join(cPATH, 'temp', 'cfpb_depository_lists')) for file in files}
+    for path in set(glob.glob(os.path.join(cPATH, 'temp', 'cfpb_depository_lists', '*.parquet'))) - current: # lists parsed by an older parser or since modified
+        os.remove(path)
 
     combined = pd.concat(dfs, ignore_index=True)
     combined_renamed = combined.rename(columns={'Institution': 'Company', 'City': 'City company', 'State': 'State company'})
@@ -150,17 +205,9 @@ def read_cfpd_depository_institutions_list_excels(override=False):
     id_check = final_cfpb.groupby(['Company', 'City company', 'State company']).agg(**{'#ID_RSSD': ('ID', get_real_id)}).reset_index()    
     final_cfpb = final_cfpb.merge(id_check, on=['Company', 'City company', 'State company'], how='left')
     final_cfpb.drop('ID', axis=1, inplace=True)
-    final_cfpb.to_csv(os.path.join(cPATH, 'temp', 'cfpb_all_depository_institutions_combined.csv'))
-    return final_cfpb
-
-def get_nic_data(override=False):
-    nic_path, nic_raw_path = os.path.join(cPATH, 'temp', 'nic_combined.csv'), os.path.join(cPATH, 'temp', 'nic_combined_raw.csv')
-    if not override and os.path.exists(nic_path) and os.path.exists(nic_raw_path):
-        nic = pd.read_csv(os.path.join(cPATH, 'temp', 'nic_combined.csv'))
-        nic_raw = pd.read_csv(os.path.join(cPATH, 'temp', 'nic_combined_raw.csv'))
-        return nic, nic_raw
-
+    return write_cache(final_cfpb, 'cfpb_all_depository_institutions_combined')
 
+def read_nic_attributes():
     nic_actv = pd.read_csv(os.path.join(cPATH, 'input', 'NIC', 'CSV_ATTRIBUTES_ACTIVE.CSV'), low_memory=False) # NIC dataset to obtain institution types
     nic_clsd = pd.read_csv(os.path.join(cPATH, 'input', 'NIC', 'CSV_ATTRIBUTES_CLOSED.CSV'), low_memory=False)
     nic_brnch = pd.read_csv(os.path.join(cPATH, 'input', 'NIC', 'CSV_ATTRIBUTES_BRANCHES.CSV'), low_memory=False)
@@ -168,71 +215,100 @@ def get_nic_data(override=False):
     nic_clsd = nic_clsd[['#ID_RSSD', 'CHTR_TYPE_CD', 'ENTITY_TYPE', 'NM_LGL', 'D_DT_START', 'D_DT_END', 'CITY', 'STATE_CD']]
     # nic_brnch = nic_brnch[['#ID_RSSD', 'CHTR_TYPE_CD', 'ENTITY_TYPE', 'NM_LGL', 'D_DT_START', 'D_DT_END']]
     # nic = pd.concat([nic_actv, nic_clsd, nic_brnch])
-    nic = pd.concat([nic_actv, nic_clsd])
+    nic = pd.concat([nic_actv, nic_clsd], ignore_index=True)
     nic['NM_LGL'] = nic['NM_LGL'].str.upper().str.strip()
-
-    # cross join to track rssd id changes over time
-    quarters_df = pd.DataFrame({'quarter': pd.date_range(start='2010-01-01', end='2025-06-30', freq='QE')})
-    quarters_df['key'] = 1
-    nic['key'] = 1
-    nic_cross = nic.merge(quarters_df, on='key', how='left')
-    nic_cross.drop(columns='key', inplace=True)
-
-    rssd_counts = nic[['NM_LGL', '#ID_RSSD']].drop_duplicates().groupby('NM_LGL').size().reset_index(name='rssd_count')
-    nic_cross = nic_cross.merge(rssd_counts, on='NM_LGL', how='left')
+    nic['D_DT_START'] = pd.to_datetime(nic['D_DT_START']) 
+    nic['D_DT_END'] = pd.to_datetime(nic['D_DT_END'], errors='coerce') # 12/13/9999, which indicates on-going relationships causes error -> fill with nan in that case
+    nic['D_DT_END'] = nic['D_DT_END'].fillna(pd.Timestamp('2262-04-11'))  # change nans into upper bound of datetime64[ns] (2262-04-11)
+    return apply_schema(nic, SCHEMAS['nic_attributes'])
+
+def nic_company_type(nic): # company type of every NIC attribute record, based on CHTR_TYPE_CD and ENTITY_TYPE
+    company_type = pd.Series('others', index=nic.index)
+    bank_ind = (nic['CHTR_TYPE_CD'].isin([200, 300, 320, 340]) |nic['ENTITY_TYPE'].isin(['SMB', 'DBR', 'NAT', 'NMB', 'ISB']))
+    cu_ind =  (nic['CHTR_TYPE_CD']==330) |nic['ENTITY_TYPE'].isin(['FCU', 'SCU']) # credit union
+    bhc_ind = (nic['ENTITY_TYPE'].isin(['BHC', 'FBH', 'BHC', 'FHD', 'SLHC'])) # bank/saving/loan holding companies
+    insur_ind = (nic['CHTR_TYPE_CD']==550) # insurance broker or agent and/or insurance company
+    sec_ind = (nic['CHTR_TYPE_CD']==700) # Securities Broker and/or Dealer
+    #company_type[sec_ind] = 'security related'
+    #company_type[insur_ind] = 'insurance related'
+    company_type[bhc_ind.fillna(False)] = 'bank holding company'
+    company_type[cu_ind.fillna(False)] = 'credit union'
+    company_type[bank_ind.fillna(False)] = 'bank'
+    return company_type
+
+def nic_history(nic): # attribute records with their validity interval and company type, for point-in-time lookups by rssd id
+    return nic.assign(**{'Company type': nic_company_type(nic)})
+
+def build_nic_panels(nic, rssd_counts, quarters, names): # name-quarter panel for the given names (nic has to hold all their attribute records)
+    nic = nic.merge(rssd_counts, on='NM_LGL', how='left')
+    nic = nic[nic['rssd_count'].notna()]
 
     # if multiple RSSD ID exist for same name, get rssd id valid for each period
     # if only one RSSD ID exists for same name, get that rssd id for all periods
-    nic_cross['D_DT_START'] = pd.to_datetime(nic_cross['D_DT_START']) 
-    nic_cross['D_DT_END'] = pd.to_datetime(nic_cross['D_DT_END'], errors='coerce') # 12/13/9999, which indicates on-going relationships causes error -> fill with nan in that case
-    nic_cross['D_DT_END'].fillna(pd.Timestamp('2262-04-11'), inplace=True)  # change nans into upper bound of datetime64[ns] (2262-04-11)
-    
-    nic_valid = nic_cross[
-        ((nic_cross['rssd_count'] > 1) & (nic_cross['quarter'] >= nic_cross['D_DT_START']) & (nic_cross['quarter'] <= nic_cross['D_DT_END'])) |
-        (nic_cross['rssd_count'] == 1)
-    ].copy()
+    single = nic['rssd_count'] == 1
+    nic = nic.assign(valid_from=nic['D_DT_START'].where(~single, quarters[0]), valid_to=nic['D_DT_END'].where(~single, quarters[-1]))
+    nic_valid = expand_intervals(nic, 'valid_from', 'valid_to', quarters).drop(columns=['valid_from', 'valid_to'])
 
     # create company type variable based on CHTR_TYPE_CD and ENTITY_TYPE
-    nic_valid['Company type'] = 'others'
-    bank_ind = (nic_valid['CHTR_TYPE_CD'].isin([200, 300, 320, 340]) |nic_valid['ENTITY_TYPE'].isin(['SMB', 'DBR', 'NAT', 'NMB', 'ISB']))
-    cu_ind =  (nic_valid['CHTR_TYPE_CD']==330) |nic_valid['ENTITY_TYPE'].isin(['FCU', 'SCU']) # credit union
-    bhc_ind = (nic_valid['ENTITY_TYPE'].isin(['BHC', 'FBH', 'BHC', 'FHD', 'SLHC'])) # bank/saving/loan holding companies
-    insur_ind = (nic_valid['CHTR_TYPE_CD']==550) # insurance broker or agent and/or insurance company
-    sec_ind = (nic_valid['CHTR_TYPE_CD']==700) # Securities Broker and/or Dealer
-    #nic.loc[sec_ind, 'Company type'] = 'security related'
-    #nic.loc[insur_ind, 'Company type'] = 'insurance related'
-    nic_valid.loc[bhc_ind, 'Company type'] = 'bank holding company'
-    nic_valid.loc[cu_ind, 'Company type'] = 'credit union'
-    nic_valid.loc[bank_ind, 'Company type'] = 'bank'
+    nic_valid['Company type'] = nic_company_type(nic_valid)
 
     # if the same name X qurter falls into two or more category, apply the follwing priority
     priority = {'bank': 1, 'credit union': 2, 'bank holding company':3, 'insurance related':4, 'security related': 5, 'others':6}
     nic_valid['type_priority'] = nic_valid['Company type'].map(priority)
-    priority_combos = (nic_valid.groupby('NM_LGL')['type_priority'].apply(lambda x: tuple(sorted(x.unique()))).reset_index(name='priority_combo'))
-    print(priority_combos['priority_combo'].value_counts().reset_index(name='count').rename(columns={'index': 'priority_combo'}))
+    combo_bits = nic_valid[['NM_LGL', 'type_priority']].drop_duplicates() # each name's set of priorities as a bit mask
+    combo_bits = (2 ** combo_bits['type_priority']).groupby(combo_bits['NM_LGL']).sum()
+    priority_combos = combo_bits.value_counts().reset_index(name='count')
+    priority_combos.columns = ['priority_combo', 'count']
+    priority_combos['priority_combo'] = priority_combos['priority_combo'].map(lambda bits: tuple(p for p in sorted(priority.values()) if bits >> p & 1))
+    print(priority_combos)
 
     nic_dedup = nic_valid.sort_values('type_priority', ascending=True).drop_duplicates(subset=['NM_LGL', 'quarter'], keep='first')
     nic_dedup = nic_dedup.drop(['CHTR_TYPE_CD', 'ENTITY_TYPE', 'type_priority', 'D_DT_START', 'D_DT_END', 'CITY', 'STATE_CD'], axis=1)
-    nic_dedup = nic_dedup.drop_duplicates()
+    nic_dedup = nic_dedup[nic_dedup['NM_LGL'].isin(names)].drop_duplicates()
 
     # name-quarter level to match with institution name impute missing quarters with the nearest quarter info
-    complete = nic_cross[['NM_LGL', 'quarter']].copy().drop_duplicates()
+    complete = pd.MultiIndex.from_product([names, quarters], names=['NM_LGL', 'quarter']).to_frame(index=False)
     nic_complete = complete.merge(nic_dedup, on=['NM_LGL', 'quarter'], how='left')
     nic_complete.sort_values(['NM_LGL', 'quarter'], inplace=True)
 
-    # rssd id-quarter level to match with rssd id 
-    complete_id = nic_cross[['#ID_RSSD', 'quarter']].copy()
-    nic_id_complete = complete_id.merge(nic_valid, on=['#ID_RSSD', 'quarter'], how='left')
-    
     # impute missing quarters with the nearest quarter info
     nic_complete.update(nic_complete.groupby('NM_LGL').ffill())
     nic_complete.update(nic_complete.groupby('NM_LGL').bfill())
-    nic_id_complete.update(nic_id_complete.groupby('#ID_RSSD').ffill())
-    nic_id_complete.update(nic_id_complete.groupby('#ID_RSSD').bfill())
+    return nic_complete
+
+def get_nic_data(override=False, incremental=False, quarters=None):
+    # name-quarter panel to match complaints by company name + attribute history, queried by rssd id and date (no rssd id-quarter panel)
+    if not override and has_cache('nic_combined') and has_cache('nic_attributes'):
+        return read_cache('nic_combined'), nic_history(read_cache('nic_attributes'))
+
+    quarters = quarter_ends() if quarters is None else pd.DatetimeIndex(quarters)
+    nic = read_nic_attributes()
+    rssd_counts = nic[['NM_LGL', '#ID_RSSD']].drop_duplicates().groupby('NM_LGL').size().reset_index(name='rssd_count')
+
+    prev_ready = incremental and all(has_cache(name) for name in ['nic_attributes', 'nic_combined'])
+    if prev_ready:
+        nic_complete = read_cache('nic_combined')
+        prev_ready = nic_complete['quarter'].max() == quarters[-1] and nic_complete['quarter'].min() == quarters[0] # panels of a different quarter range have to be rebuilt
+
+    if prev_ready:
+        # only names touched by added/removed/changed attribute records are re-expanded and spliced into the cached panel
+        prev = read_cache('nic_attributes')
+        nic_hash, prev_hash = pd.util.hash_pandas_object(nic, index=False), pd.util.hash_pandas_object(prev, index=False)
+        changed = pd.concat([nic[~nic_hash.isin(prev_hash)], prev[~prev_hash.isin(nic_hash)]], ignore_index=True)
+        print(f"{len(changed)} NIC attribute records added, removed or changed since the last build")
+        if changed.empty:
+            return nic_complete, nic_history(nic)
+
+        names = changed['NM_LGL'].dropna().unique()
+        subset = nic[nic['NM_LGL'].isin(names)]
+        part = build_nic_panels(subset, rssd_counts, quarters, subset['NM_LGL'].unique())
+        nic_complete = pd.concat([nic_complete[~nic_complete['NM_LGL'].isin(names)], part], ignore_index=True).sort_values(['NM_LGL', 'quarter'])
+    else:
+        nic_complete = build_nic_panels(nic, rssd_counts, quarters, nic['NM_LGL'].unique())
 
-    nic_complete.to_csv(os.path.join(cPATH, 'temp', 'nic_combined.csv'), index=False)
-    nic_id_complete.to_csv(os.path.join(cPATH, 'temp', 'nic_combined_raw.csv'), index=False)
-    return nic_complete, nic_id_complete
+    nic = write_cache(nic, 'nic_attributes')
+    nic_complete = write_cache(nic_complete, 'nic_combined')
+    return nic_complete, nic_history(nic)
 
 def quarter_to_period_end(quarter_str):
     year = int(quarter_str[:4])
@@ -240,22 +316,30 @@ def quarter_to_period_end(quarter_str):
     q_dict = {1: '03-31', 2: '06-30', 3: '09-30', 4: '12-31'}
     return f"{year}-{q_dict[q]}"
 
-def get_ffiec_data(path, override=False):
-    if not override and os.path.exists(os.path.join(cPATH, 'temp', 'ffiec_cdr_combined.csv')):
-        ffiec_all = pd.read_csv(os.path.join(cPATH, 'temp', 'ffiec_cdr_combined.csv'))
-        return ffiec_all 
+FFIEC_COLUMNS = ['Reporting Period End Date', 'IDRSSD', 'Financial Institution Name', 'RCFD2170', 'RCON2170'] # RCFD2170 = Total Assets (consolidated), RCON2170: total assets - if RCFD is missing, use RCON as total assets
+
+def read_ffiec_file(file):
+    # the ffiec txt files are divided in columns - it is normal that some files do not contain RCFD2170 column, check the header before parsing the file
+    try:
+        with open(file, 'r', errors='replace') as f:
+            header = [col.strip().strip('"') for col in f.readline().rstrip('\r\n').split('\t')]
+        if not set(FFIEC_COLUMNS).issubset(header):
+            return None
+        ffiec = pd.read_csv(file, delimiter='\t', usecols=FFIEC_COLUMNS, dtype=str)[FFIEC_COLUMNS]
+        return ffiec.drop(0) # first row holds the variable descriptions
+    except Exception as e:
+        print(f"Error reading {file}: {e}")
+        return None
+
+def get_ffiec_data(path, override=False, max_workers=None):
+    if not override and has_cache('ffiec_cdr_combined'):
+        return read_cache('ffiec_cdr_combined')
 
     all_files = glob.glob(os.path.join(path, '*', '*.txt'))
     all_files = [f for f in all_files if os.path.basename(f) != 'Readme.txt'] # do not read Readme.txt 
 
-    ffiec_all = []
-    for file in all_files:
-        try:
-            ffiec = pd.read_csv(file, delimiter='\t', low_memory=False)
-            ffiec = ffiec[['Reporting Period End Date', 'IDRSSD', 'Financial Institution Name', 'RCFD2170', 'RCON2170']]  # RCFD2170 = Total Assets (consolidated), RCON2170: total assets - if RCFD is missing, use RCON as total assets
-            ffiec_all.append(ffiec.drop(0))
-        except Exception as e:
-            print(f"Error reading {file}: {e}") # the ffiec txt files are divided in columns - it is normal that some files do not contain RCFD2170 column and are excluded from ffiec_all
+    with process_pool(max_workers) as executor:
+        ffiec_all = [ffiec for ffiec in executor.map(read_ffiec_file, all_files) if ffiec is not None]
 
     ffiec_all = pd.concat(ffiec_all, ignore_index=True)
 
@@ -266,13 +350,11 @@ def get_ffiec_data(path, override=False):
     # total assets in ffiec form 031, 041 (call reports) are reported in thousands - multiply by 1,000 to convert it into a dollar unit
     ffiec_all['Total assets'] = pd.to_numeric(ffiec_all['Total assets'], errors='coerce')
     ffiec_all['Total assets'] = ffiec_all['Total assets']*1000 
-    ffiec_all.to_csv(os.path.join(cPATH, 'temp', 'ffiec_cdr_combined.csv'), index=False)
-    return ffiec_all
+    return write_cache(ffiec_all, 'ffiec_cdr_combined')
 
 def get_ncua_data(path, override=False):
-    if not override and os.path.exists(os.path.join(cPATH, 'temp', 'ncua_combined.csv')):
-        ncua_all = pd.read_csv(os.path.join(cPATH, 'temp', 'ncua_combined.csv'))
-        return ncua_all 
+    if not override and has_cache('ncua_combined'):
+        return read_cache('ncua_combined')
 
     callrpt_dirs = glob.glob(os.path.join(path, '*'))
     ncua_all = []
@@ -299,40 +381,80 @@ def get_ncua_data(path, override=False):
     ncua_all.rename(columns={'ACCT_010': 'Total assets'}, inplace=True)
     ncua_all['CYCLE_DATE'] = pd.to_datetime(ncua_all['CYCLE_DATE'])
 
-    # fill missing RSSD ID by matching with (CU_NAME, CU_NUMBER) pair
-    ncua_id = ncua_all[ncua_all['RSSD'].notna()].copy()
-    for idx, row in ncua_all[ncua_all['RSSD'].isna()].iterrows():
-        candidates = ncua_id[(ncua_id['CU_NAME'] == row['CU_NAME']) & (ncua_id['CU_NUMBER'] == row['CU_NUMBER'])]
-        if not candidates.empty:
-            candidates = candidates.copy()
-            candidates['date_diff'] = (candidates['CYCLE_DATE'] - row['CYCLE_DATE']).abs()
-            best_match = candidates.loc[candidates['date_diff'].idxmin()]
-            ncua_all.at[idx, 'RSSD'] = best_match['RSSD']
+    # fill missing RSSD ID by matching with (CU_NAME, CU_NUMBER) pair - take the RSSD ID reported on the nearest cycle date (earlier date wins ties)
+    ncua_all = ncua_all.reset_index(drop=True)
+    has_date = ncua_all['CYCLE_DATE'].notna()
+    missing = ncua_all[ncua_all['RSSD'].isna() & has_date].drop(columns='RSSD').reset_index().sort_values('CYCLE_DATE')
+    ncua_id = ncua_all[ncua_all['RSSD'].notna() & ncua_all['CU_NAME'].notna() & has_date][['CU_NAME', 'CU_NUMBER', 'CYCLE_DATE', 'RSSD']].sort_values('CYCLE_DATE')
+    filled = pd.merge_asof(missing, ncua_id, on='CYCLE_DATE', by=['CU_NAME', 'CU_NUMBER'], direction='nearest')
+    filled = filled[filled['RSSD'].notna()]
+    ncua_all.loc[filled['index'].to_numpy(), 'RSSD'] = filled['RSSD'].to_numpy()
 
     ncua_all['CYCLE_DATE'] = ncua_all['CYCLE_DATE'].astype(str)
-    ncua_all.to_csv(os.path.join(cPATH, 'temp', 'ncua_combined.csv'), index=False)
-    return ncua_all
+    return write_cache(ncua_all, 'ncua_combined')
+
+BHCF_COLUMNS = ['RSSD9001', 'RSSD9999', 'BHCK2170', 'BHCP2170', 'BHSP2170']
+
+def parse_bhcf(file, encoding):
+    # one pass over the file - lines with more fields than the header are skipped with a warning, which usecols would silence, so the columns are selected after
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter('always', pd.errors.ParserWarning)
+        bhcf = pd.read_csv(file, delimiter='^', encoding=encoding, low_memory=False, on_bad_lines='warn')[BHCF_COLUMNS]
+    return bhcf, sum(str(w.message).count('Skipping line') for w in caught)
+
+def read_bhcf_file(file, encoding=None):
+    start = time.perf_counter()
+    report = {'file': os.path.basename(file), 'encoding': encoding, 'rows': 0, 'bad_lines': 0, 'seconds': 0.0}
+    bhcf = None
+    try:
+        with open(file, 'r', encoding=encoding or 'utf-8', errors='replace') as f:
+            header = [col.strip() for col in f.readline().rstrip('\r\n').split('^')]
+        if set(BHCF_COLUMNS).issubset(header):
+            try:
+                bhcf, report['bad_lines'] = parse_bhcf(file, encoding or 'utf-8')
+                report['encoding'] = encoding or 'utf-8'
+            except UnicodeDecodeError:
+                if encoding:
+                    raise
+                bhcf, report['bad_lines'] = parse_bhcf(file, 'cp1252') # the windows code page used by older FFIEC releases
+                report['encoding'] = 'cp1252'
+            report['rows'] = len(bhcf)
+        else:
+            print(f"{file} does not contain total assets columns")
+    except Exception as e:
+        print(f"Error reading {file}: {e}")
+    report['seconds'] = time.perf_counter() - start
+    return bhcf, report
 
-def get_bhc_financial_data(path, override=False):
-    if not override and os.path.exists(os.path.join(cPATH, 'temp', 'ffiec_bhcf_combined.csv')):
-        bhcf_all = pd.read_csv(os.path.join(cPATH, 'temp', 'ffiec_bhcf_combined.csv'))
-        return bhcf_all 
+def get_bhc_financial_data(path, override=False, max_workers=None):
+    if not override and has_cache('ffiec_bhcf_combined'):
+        return read_cache('ffiec_bhcf_combined')
 
     all_files = glob.glob(os.path.join(path, '*.txt'))
-    bhcf_all = []
 
+    # encodings detected in earlier builds are reused as long as the file is unchanged
+    encodings_path = os.path.join(cPATH, 'temp', 'bhcf_encodings.json')
+    encodings = {}
+    if os.path.exists(encodings_path):
+        with open(encodings_path) as f:
+            encodings = json.load(f)
+    known = []
     for file in all_files:
-        try:
-            bhcf = pd.read_csv(file, delimiter='^', low_memory=False, on_bad_lines='warn')
-            bhcf = bhcf[['RSSD9001', 'RSSD9999', 'BHCK2170', 'BHCP2170', 'BHSP2170']]
-            bhcf_all.append(bhcf)
-        except:
-            try:
-                bhcf = pd.read_csv(file, delimiter='^', low_memory=False, encoding='cp1252', on_bad_lines='warn')
-                bhcf = bhcf[['RSSD9001', 'RSSD9999', 'BHCK2170', 'BHCP2170', 'BHSP2170']]
-                bhcf_all.append(bhcf)
-            except Exception as e:
-                print(f"Error reading {file}: {e}") # the ffiec txt files are divided in columns - it is normal that some files do not contain RCFD2170 column and are excluded from ffiec_all
+        entry = encodings.get(os.path.basename(file), {})
+        unchanged = entry.get('size') == os.path.getsize(file) and entry.get('mtime') == os.path.getmtime(file)
+        known.append(entry.get('encoding') if unchanged else None)
+
+    with process_pool(max_workers) as executor:
+        results = list(executor.map(read_bhcf_file, all_files, known))
+
+    bhcf_all = [bhcf for bhcf, _ in results if bhcf is not None]
+    report = pd.DataFrame([r for _, r in results])
+    for file, (_, r) in zip(all_files, results):
+        encodings[os.path.basename(file)] = {'size': os.path.getsize(file), 'mtime': os.path.getmtime(file), 'encoding': r['encoding']}
+    with open(encodings_path, 'w') as f:
+        json.dump(encodings, f, indent=2)
+    report.to_csv(os.path.join(cPATH, 'temp', 'bhcf_load_report.csv'), index=False)
+    print(report)
 
     bhcf_all = pd.concat(bhcf_all, ignore_index=True)
     bhcf_all['Consolidated'] = bhcf_all['BHCK2170'].notna() # indicates whether consolidated total assets is reported
@@ -341,51 +463,66 @@ def get_bhc_financial_data(path, override=False):
 
     bhcf_all.loc[~bhcf_all['Consolidated'], 'Total assets'] = bhcf_all.loc[~bhcf_all['Consolidated'], 'Parent only assets'] # if consolicated total assets info do not exists, get parent only total assets
     bhcf_all['Total assets'] = bhcf_all['Total assets']*1000 # total assets of bhc are reported in 1,000 dollars
-    bhcf_all['bhcf report date'] = pd.to_datetime(bhcf_all['bhcf report date'].astype(str),format='%Y%m%d').dt.strftime('%Y-%m-%d')
+    bhcf_all['bhcf report date'] = pd.to_datetime(bhcf_all['bhcf report date'].astype(str), format='%Y%m%d', errors='coerce').dt.strftime('%Y-%m-%d')
+    invalid = bhcf_all['bhcf report date'].isna()
+    if invalid.any():
+        print(f"dropping {invalid.sum()} bhcf rows without a valid report date (RSSD9999)")
+        bhcf_all = bhcf_all[~invalid].reset_index(drop=True)
     bhcf_all.drop(['BHCP2170', 'BHSP2170'], axis=1, inplace=True)
-    bhcf_all.to_csv(os.path.join(cPATH, 'temp', 'ffiec_bhcf_combined.csv'), index=False)
-    return bhcf_all
+    return write_cache(bhcf_all, 'ffiec_bhcf_combined')
 
-def bank_total_assets_in_bhc(nic, ffiec_crp): # get sum of total assets for child banks in bhc (total assets of bhc held by banks)
-    relationships = pd.read_csv(os.path.join(cPATH, 'input', 'NIC', 'CSV_RELATIONSHIPS.CSV'))
+def relationships_path(): # read by the lookup preparation, not by a stage - part of the snapshot fingerprint instead
+    return os.path.join(cPATH, 'input', 'NIC', 'CSV_RELATIONSHIPS.CSV')
+
+def bank_total_assets_in_bhc(nic_history, ffiec_crp): # get sum of total assets for child banks in bhc (total assets of bhc held by banks)
+    relationships = pd.read_csv(relationships_path())
     relationships = relationships[relationships['RELN_LVL'].isin([1, 2])] # include direct and indirect relationships
     relationships['D_DT_START'] = pd.to_datetime(relationships['D_DT_START']) # change dtypes for comparison later on
     relationships['D_DT_END'] = pd.to_datetime(relationships['D_DT_END'], errors='coerce') # 12/13/9999, which indicates on-going relationships causes error -> fill with nan in that case
     relationships['D_DT_END'].fillna(pd.Timestamp('2262-04-11'), inplace=True)  # change nans into upper bound of datetime64[ns] (2262-04-11)
 
-    # cross-join relationships to get quarterly level relationships
-    quarters = pd.date_range(start='2010-01-01', end='2025-06-30', freq='QE') # create all quarters of our interest
-    relationships['key'] = 1
-    quarters_df = pd.DataFrame({'quarter': quarters})
-    quarters_df['key'] = 1
-    rel_cross = relationships[['#ID_RSSD_PARENT', 'ID_RSSD_OFFSPRING', 'key', 'D_DT_START', 'D_DT_END']].merge(quarters_df, on='key', how='left')
-    rel_cross.drop(columns='key', inplace=True)
-
-    rel_valid = rel_cross[(rel_cross['quarter'] >= rel_cross['D_DT_START']) &(rel_cross['quarter'] <= rel_cross['D_DT_END'])].copy() # filter out invalid dates
-    rel_vallid = rel_valid.drop_duplicates(['#ID_RSSD_PARENT', 'ID_RSSD_OFFSPRING', 'quarter'])
-    rel_valid.drop(['D_DT_START', 'D_DT_END'], axis=1, inplace=True)
-
-    # Merge with NIC dataset and FFIEC call reports to get Company type and Total assets
-    nic.drop(['D_DT_START', 'D_DT_END'], axis=1, inplace=True)
-    rel_valid['quarter'] = rel_valid['quarter'].astype(str)
-    rel_valid = rel_valid.merge(nic[['#ID_RSSD', 'Company type', 'quarter']], left_on=['ID_RSSD_OFFSPRING', 'quarter'], right_on=['#ID_RSSD', 'quarter'], how='left') # get company type of offspring
-    merged = rel_valid.merge(ffiec_crp, left_on=['ID_RSSD_OFFSPRING', 'quarter'], right_on=['IDRSSD', 'Reporting Period End Date'], how='left')
-    print("parent-subsidiary relationships, quarterly level", merged.shape)
-
-    # filter out non-banks & remove duplicates
-    merged = merged[merged['Company type']=='bank']
-    print("After filtering out non-banks", merged.shape)
-    merged = merged.drop_duplicates(subset=['#ID_RSSD_PARENT', 'ID_RSSD_OFFSPRING', 'quarter'])
-    print("After removing dupplicates:", merged.shape)
-
-    # Aggregate total assets of banks under each BHC per quarter
+    # expand each relationship into the quarters (of our interest) in which it is valid
+    rel_valid = expand_intervals(relationships[['#ID_RSSD_PARENT', 'ID_RSSD_OFFSPRING', 'D_DT_START', 'D_DT_END']], 'D_DT_START', 'D_DT_END', quarter_ends())
+    rel_valid['Quarter key'] = quarter_key(rel_valid['quarter'])
+    print("parent-subsidiary relationships, quarterly level", rel_valid.shape)
+
+    # every bhc -> all of its offsprings in each quarter, following chains of relationships below the listed indirect (RELN_LVL 2) ones
+    nodes, closure = ownership_closure(rel_valid['#ID_RSSD_PARENT'], rel_valid['ID_RSSD_OFFSPRING'], rel_valid['Quarter key'])
+
+    # Company type of every offspring at the end of each quarter from the NIC attribute history, and Total assets from the FFIEC call reports
+    node_rssd, node_quarter = node_ids(nodes)
+    company_type = as_of(nic_history, node_rssd, quarter_end_date(node_quarter), ['Company type'])['Company type']
+    is_bank = company_type.eq('bank').fillna(False).to_numpy(dtype=float)
+    # only bank subsidiaries with a call report in the quarter are counted - a bhc-quarter without any gets no row (BankCount -1 downstream)
+    filed = is_bank * node_vector(nodes, ffiec_crp['IDRSSD'], ffiec_crp['Quarter key'])
+    reported = ffiec_crp[ffiec_crp['Total assets'].notna()]
+    bank_assets = is_bank * node_vector(nodes, reported['IDRSSD'], reported['Quarter key'], reported['Total assets'])
+    has_assets = is_bank * node_vector(nodes, reported['IDRSSD'], reported['Quarter key'])
+
+    # Aggregate total assets of banks under each BHC per quarter - one sparse product per rollup (add a column to roll up another bank variable)
     # BankNotnaCount: Number of subsidiaries with non-missing total assets
-    # BankTotal: Sum of total assets across subsidiaries (returns NaN if all values are NaN)
-    # BankCount: Total number of subsidiaries (including those with NaN total assets)
-    grouped = merged.groupby(['#ID_RSSD_PARENT', 'Reporting Period End Date'])
-    bhc_assets = grouped['Total assets'].agg(BankNotnaCount='count', BankAssets=lambda x: x.sum(min_count=1), BankCount='size').reset_index()
-    bhc_assets['Reporting Period End Date'] = bhc_assets['Reporting Period End Date'].astype(str)
-    return bhc_assets, merged
+    # BankAssets: Sum of total assets across subsidiaries (NaN if no subsidiary reports them)
+    # BankCount: Total number of subsidiaries with a call report (including those with NaN total assets)
+    sums = closure @ np.column_stack([has_assets, bank_assets, filed])
+    parents = sums[:, 2] > 0
+    rssd, quarter = node_ids(nodes[parents])
+    bhc_assets = pd.DataFrame({'#ID_RSSD_PARENT': rssd, 'Quarter key': pd.array(quarter, dtype='Int64'), 'BankNotnaCount': sums[parents, 0].astype(np.int64),
+                               'BankAssets': np.where(sums[parents, 0] > 0, sums[parents, 1], np.nan), 'BankCount': sums[parents, 2].astype(np.int64)})
+    print("bhcs with bank subsidiaries, quarterly level", bhc_assets.shape)
+
+    # bank subsidiaries of every bhc, used for the bhc level regulation
+    pairs = closure.tocoo()
+    bank_pairs = is_bank[pairs.col] > 0
+    offspring_rssd, offspring_quarter = node_ids(nodes[pairs.col[bank_pairs]])
+    offsprings = pd.DataFrame({'#ID_RSSD_PARENT': node_ids(nodes[pairs.row[bank_pairs]])[0], 'ID_RSSD_OFFSPRING': offspring_rssd,
+                               'Quarter key': pd.array(offspring_quarter, dtype='Int64')})
+    return bhc_assets, offsprings
+
+def bhc_asset_measure(bhc_assets, bank_assets):
+    # we use BankAssets as our default measure of total assets for bhcs since it better reflects each institution's capability regarding its banking system
+    # when BankAssets / Total assets < 0.3, bank subsidiaries are not properly matched, resulting in big discrepancy between Total assets & BankAssets -> better use Total assets
+    unmatched = (bank_assets / bhc_assets < 0.3) & bank_assets.notna() & bhc_assets.notna()
+    return bank_assets.where(~unmatched, bhc_assets)
 
 def get_lag_quarter(date): # input: date in str 'yyyy-mm-dd' format
     md_dict = {'03-31': '12-31', '06-30': '03-31', '09-30': '06-30', '12-31': '09-30'}
@@ -394,16 +531,23 @@ def get_lag_quarter(date): # input: date in str 'yyyy-mm-dd' format
     lag_year = str(int(year)-1) if md == '03-31' else year  
     return f"{lag_year}-{md_dict[md]}"
 
-def aggregate_regulation(x):
-    uniq = x.unique()
-    if len(uniq) == 1:
-        return uniq[0]
-    return '-'.join(sorted(uniq))
+# regulation labels as bit flags - bits follow the alphabetical order of the labels, so a set of flags reads back as '-'.join(sorted(labels))
+REGULATION_FLAGS = {'Affiliates': 1, 'Depository': 2, 'NoRegulation': 4}
+REGULATION_LABELS = {bits: '-'.join(label for label, bit in REGULATION_FLAGS.items() if bits & bit) for bits in range(1, 2 ** len(REGULATION_FLAGS))}
+
+def regulation_flags(labels): # 0 for missing labels
+    return labels.map(REGULATION_FLAGS).fillna(0).to_numpy(dtype=np.int64)
+
+def aggregate_regulation(df, by, flags): # grouped bitwise OR of the flags of every group of by -> one row per group with its joined label
+    grouped = df.groupby(by)
+    codes = grouped.ngroup().fillna(-1).to_numpy(np.int64) # NaN (a float column) for rows with missing keys
+    bits = np.zeros(grouped.ngroups, dtype=np.int64)
+    np.bitwise_or.at(bits, codes[codes >= 0], flags[codes >= 0]) # rows with missing keys belong to no group
+    return grouped.size().index.to_frame(index=False).assign(flags=bits)
 
 def get_zip_county_crosswalk(path, override=False):
-    if not override and os.path.exists(os.path.join(cPATH, 'temp', 'zip_county_crosswalk.csv')):
-        zipcounty = pd.read_csv(os.path.join(cPATH, 'temp', 'zip_county_crosswalk.csv'))
-        return zipcounty 
+    if not override and has_cache('zip_county_crosswalk'):
+        return read_cache('zip_county_crosswalk')
 
     all_files = glob.glob(os.path.join(path, '*.xlsx'))
     zipcounty = []
@@ -419,20 +563,77 @@ def get_zip_county_crosswalk(path, override=False):
             print(f"Error reading {file}: {e}") 
 
     zipcounty = pd.concat(zipcounty, ignore_index=True)
-    zipcounty.to_csv(os.path.join(cPATH, 'temp', 'zip_county_crosswalk.csv'), index=False)
-    return zipcounty
-    
-if __name__ == "__main__":
-    # basic statistics of the whole dataset
-    df = pd.read_csv(os.path.join(cPATH, "input", "CFPD", "complaints.csv"))
-    print(f"shape of full data: {df.shape}")
-    print(f"number of unique ids: {df['Complaint ID'].nunique()}")
-    print(df.columns)
+    return write_cache(zipcounty, 'zip_county_crosswalk')
+
+def get_acs_zip_year(acs_path, cpi_path, override=False):
+    # zip x ACS year table of the county level ACS variables (MedIncome, EDUC*, LANG*, RealMedIncome), complete over every zip and year
+    # so that complaints are matched by array indexing on the integer zip code - see enrichment.dense_grid
+    if not override and has_cache('acs_zip_year'):
+        return read_cache('acs_zip_year')
+
+    '''
+    ## The following 17 lines of code is for matching in zip code level
+    acs = pd.read_csv(os.path.join(cPATH, 'temp', 'ACSdataset', 'ACS5YR_combined.csv'))
+    acs_val = acs[acs['zip'].notna()].copy()
+    df['ACS year'] = (df['Year received'] + 2).clip(upper=2023)
+    '''
+    ## Use this code for matching in county level
+    zipcounty = read_cache('zip_county_crosswalk')
+    acs = pd.read_csv(acs_path)
+    acs['fips'] = (acs['state'].astype(str).str.zfill(2) + acs['county'].astype(str).str.zfill(3)).astype(int) #county code in zipcounty is fips = ssccc where ss is state code and ccc is county code in acs dataset
+
+    demo = acs.merge(zipcounty, how='left', left_on=['fips', 'Year'], right_on=['county', 'year'])
+    demo = demo[demo['zip'].notna()] # drop counties where zip is not matched
+    demo.drop(['county_x', 'county_y', 'year', 'state'], axis=1, inplace=True)
+    demo = demo[demo['res_ratio']>0].copy() # drop if res_ratio is zero
+
+    # consider a county as representative of a zip code when res_ratio > 0.9 
+    print(f"creating a zip-year level acs dataset")
+    demo = demo.sort_values('res_ratio', ascending=False)
+    demo_zip = demo.groupby(['zip', 'Year']).agg(max_ratio=('res_ratio', 'max')).reset_index()
+    demo_zip_val = demo_zip[demo_zip['max_ratio']>0.9]
+    acs_val = demo_zip_val.merge(demo[demo['res_ratio']>0.9], how='left', on=['zip', 'Year'])
+    print(f"keep only zip-county relationships where res_ratio is greater than 0.9: {len(acs_val)}/{len(demo_zip)}")
+    acs_val['zip'] = pd.to_numeric(acs_val['zip'], errors='coerce').astype('Int64')
+    acs_val = acs_val[acs_val['zip'].notna()].sort_values('res_ratio', ascending=False).drop_duplicates(['zip', 'Year'])
 
+    # get real median income by reflecting CPI - MedIncome is in {ACS year} inflation adjusted dollars & RealMedIncome is in 2013 inflation adjusted dollars
+    cpi_df = pd.read_csv(cpi_path)
+    mean_cpi_by_year = cpi_df.groupby(cpi_df['observation_date'].str[:4].astype(int))['CPIAUCSL'].mean()
+    acs_val['RealMedIncome'] = acs_val['MedIncome']*(mean_cpi_by_year[2013]/acs_val['Year'].map(mean_cpi_by_year))
+
+    # complete zip x year grid - zip-years without a representative county are all missing
+    grid = pd.MultiIndex.from_product([np.sort(acs_val['zip'].unique()), range(acs_val['Year'].min(), acs_val['Year'].max() + 1)], names=['zip', 'Year'])
+    acs_grid = acs_val.set_index(['zip', 'Year']).reindex(grid).reset_index()
+    print(f"acs grid: {acs_grid['zip'].nunique()} zips x {acs_grid['Year'].nunique()} years, {acs_val.shape[0]} filled")
+    return write_cache(acs_grid, 'acs_zip_year')
+
+def get_name_index(override=False):
+    # persistent name -> RSSD ID index shared by every name based fallback, built from the cached nic, ffiec, ncua and cfpb tables
+    if not override and has_cache('name_rssd_index'):
+        return read_cache('name_rssd_index')
+
+    tables = {'nic': (read_cache('nic_combined'), 'NM_LGL', '#ID_RSSD', 'quarter'),
+              'ffiec': (read_cache('ffiec_cdr_combined'), 'Financial Institution Name', 'IDRSSD', 'Reporting Period End Date'),
+              'ncua': (read_cache('ncua_combined'), 'CU_NAME', 'RSSD', 'CYCLE_DATE'),
+              'cfpb': (read_cache('cfpb_all_depository_institutions_combined'), 'Company', '#ID_RSSD', 'Reporting date')}
+    index = build_name_index(tables)
+    print(f"name index: {len(index)} name-quarter entries, {index['Name key'].nunique()} distinct names")
+    return write_cache(index, 'name_rssd_index')
+
+# fixed dtypes of the raw CFPB dump - low cardinality text is read as categoricals, dates are parsed per chunk
+COMPLAINTS_DTYPES = {
+    'Date received': str, 'Product': 'category', 'Sub-product': 'category', 'Issue': 'category', 'Sub-issue': 'category',
+    'Consumer complaint narrative': 'string', 'Company public response': 'category', 'Company': 'category', 'State': 'category',
+    'ZIP code': str, 'Tags': 'category', 'Consumer consent provided?': 'category', 'Submitted via': 'category',
+    'Date sent to company': str, 'Company response to consumer': 'category', 'Timely response?': 'category',
+    'Consumer disputed?': 'category', 'Complaint ID': 'int64'
+}
+
+def add_complaint_features(df):
     # transform date variables 
     df['Date received'] = pd.to_datetime(df['Date received'])
     df['Date sent to company'] = pd.to_datetime(df['Date sent to company'])
-    df['Consumer complaint narrative'] = df["Consumer complaint narrative"].astype('string')
     df['Month received'] = df['Date received'].dt.to_period('M').dt.to_timestamp()
     df['Quarter received'] = df['Date received'].dt.to_period('Q')
     df['Year received'] = df['Date received'].dt.year
@@ -440,16 +641,15 @@ if __name__ == "__main__":
     df['Year sent'] = df['Date sent to company'].dt.year
 
     # remove complaints sent to companies in 2025 Q2 (as the data was downloaded in the middle of 2025 Q2)
-    df = df[df['Quarter sent'] <= pd.Period('2025Q1')]
-    print(f"number of observations after removing complaints sent to companies in 2025 Q2 : {len(df)}")
+    df = df[df['Quarter sent'] <= pd.Period('2025Q1')].copy()
 
     # binary indicator of receiving monetary or non-monetary relief
     df['Is relief'] = df['Company response to consumer'].isin(['Closed with non-monetary relief','Closed with monetary relief'])
 
     # quantifies the time duration between receiving complaints and sending them to companies
     df['Duration sending'] = (df['Date sent to company'] - df['Date received']).dt.days # duration between receiving the complaints to sending the complaints to the company (in days)
-    df['Duration categorized'] = df['Duration sending'].apply(categorize_duration) 
-    df['Duration grouped'] = df['Duration categorized'].apply(group_duration)
+    df['Duration categorized'] = duration_categories(df['Duration sending'])
+    df['Duration grouped'] = duration_groups(df['Duration categorized'])
 
     # CCPA and CPRA
     CCPA_timeline = {'CCPA enactment': '2018-06-28', 'CCPA implementation': '2020-01-01', 'CPRA amendment': '2020-11-03', 'CPRA implementation': '2023-01-01'}
@@ -467,228 +667,438 @@ if __name__ == "__main__":
                                          labels=['Pre-CCPA', 'CCPA enacted, pre-implement', 'CCPA implemented, pre-CPRA', 'CPRA amended, pre-implementation', 'CPRA implemented'])
     
     # implementation of all state privacy law 
-    df['State privacy law'] = df['State'].apply(state_privacy_law_implementation)
+    df['State privacy law'] = df['State'].astype(object).apply(state_privacy_law_implementation)
+    return df
+
+def concat_chunks(chunks):
+    # align categories before concatenating, otherwise pd.concat silently falls back to object columns
+    cat_cols = [col for col in chunks[0].columns if all(col in c.columns and isinstance(c[col].dtype, pd.CategoricalDtype) for c in chunks)]
+    for col in cat_cols:
+        categories = union_categoricals([c[col] for c in chunks], ignore_order=True).categories
+        for c in chunks:
+            c[col] = c[col].cat.set_categories(categories)
+    return pd.concat(chunks, ignore_index=True)
+
+def read_complaints(path, chunksize=500000):
+    # stream the raw dump so that only one chunk of unparsed text is in memory at a time - every featured chunk is spilled to a parquet part
+    # instead of being kept as a frame, and the parts are converted back once, column by column (no list of chunks + concat copy)
+    spill_dir = os.path.join(cPATH, 'temp', 'complaints_chunks')
+    shutil.rmtree(spill_dir, ignore_errors=True)
+    os.makedirs(spill_dir)
+    parts, id_parts, n_raw = [], [], 0
+    for i, chunk in enumerate(pd.read_csv(path, dtype=COMPLAINTS_DTYPES, chunksize=chunksize)):
+        n_raw += len(chunk)
+        id_parts.append(os.path.join(spill_dir, f'ids-{i:05d}.parquet')) # ids of the raw chunk, before the 2025 Q2 complaints are removed
+        pq.write_table(pa.table({'Complaint ID': pa.array(chunk['Complaint ID'].unique())}), id_parts[-1])
+        chunk['Row hash'] = pd.util.hash_pandas_object(chunk[list(COMPLAINTS_DTYPES)], index=False) # content hash of the raw fields, used by the incremental mode
+        parts.append(os.path.join(spill_dir, f'part-{i:05d}.parquet'))
+        pq.write_table(pa.Table.from_pandas(add_complaint_features(chunk), preserve_index=False), parts[-1])
+    n_ids = pc.count_distinct(pa.concat_tables([pq.read_table(part) for part in id_parts])['Complaint ID']).as_py()
+    table = pa.concat_tables([pq.read_table(part) for part in parts], promote_options='permissive') # categories differ between chunks
+    df = table.to_pandas(self_destruct=True, split_blocks=True) # arrow buffers are released as their columns are converted
+    del table
+    shutil.rmtree(spill_dir)
+    print(f"shape of full data: {(n_raw, df.shape[1])}")
+    print(f"number of unique ids: {n_ids}")
+    print(df.columns)
+    print(f"number of observations after removing complaints sent to companies in 2025 Q2 : {len(df)}")
+    return df
 
-    # identification of zombie data
-    df['Zombie data'] = 0
-    cond1 = (df['Issue'] == 'Incorrect information on your report') & (df['Sub-issue'] == 'Old information reappears or never goes away')
-    cond2 = (df['Issue'] == 'Incorrect information on credit report') & (df['Sub-issue'] == 'Reinserted previously deleted info')
-    df.loc[cond1 | cond2, 'Zombie data'] = 1
-    print(f"{df['Zombie data'].sum()}/{len(df)} complaints are about zombie data")
-    print(f"number of companies that zombie data-related compaints were filed to: {df[df['Zombie data']==1]['Company'].nunique()}")
-    print(f"top 20 companies that zombie data complaints were filed to: \n {df[df['Zombie data'] == 1]['Company'].value_counts().head(20)}")
+def read_reference_lists(scra_path, db_path, cpi_path, override=False): # small lists read on every run (nothing to cache)
+    scra_df = pd.read_csv(scra_path, encoding='cp1252') # SCRA (specialized credit reporting agencies)
+    db = pd.read_excel(db_path) # data broker
+    cpi_df = pd.read_csv(cpi_path)
+    return {'scra': scra_df, 'data_broker': db, 'cpi': cpi_df}
 
-    # indicator of complaints with/without narratives 
-    df["With narrative"] = df["Consumer complaint narrative"].notna()
+def build_stages():
+    nic_path = os.path.join(cPATH, 'input', 'NIC')
+    ffiec_path = os.path.join(cPATH, 'input', 'FFIEC', 'CDR Call Reports')
+    ncua_path = os.path.join(cPATH, 'input', 'NCUA')
+    bhcf_path = os.path.join(cPATH, 'input', 'FFIEC', 'Holding Company Financial Data')
+    cfpb_path = os.path.join(cPATH, 'input', 'CFPD', 'depository_institutions')
+    zipcounty_path = os.path.join(cPATH, 'input', 'zip_county_crosswalk')
+    acs_path = os.path.join(cPATH, 'temp', 'ACSdataset_countylvl', 'ACS5YR_combined.csv')
+    cpi_path = os.path.join(cPATH, 'input', 'CPIAUCSL.csv')
+    scra_path = os.path.join(cPATH, 'input', 'CFPD', 'cfpb-consumer-reporting-companies_list_2025.csv')
+    db_path = os.path.join(cPATH, 'input', 'Data_Broker_Full_Registry_2025.xlsx')
+    return [
+        {'name': 'nic', 'func': get_nic_data, 'incremental': True, 'executor': 'process',
+         'inputs': [os.path.join(nic_path, 'CSV_ATTRIBUTES_ACTIVE.CSV'), os.path.join(nic_path, 'CSV_ATTRIBUTES_CLOSED.CSV')],
+         'outputs': ['nic_attributes', 'nic_combined'], 'code': [get_nic_data, read_nic_attributes, build_nic_panels, nic_company_type, expand_intervals]},
+        {'name': 'ffiec', 'func': get_ffiec_data, 'params': {'path': ffiec_path}, 'inputs': [os.path.join(ffiec_path, '*', '*.txt')],
+         'outputs': ['ffiec_cdr_combined'], 'code': [get_ffiec_data, read_ffiec_file]},
+        {'name': 'ncua', 'func': get_ncua_data, 'params': {'path': ncua_path}, 'executor': 'process',
+         'inputs': [os.path.join(ncua_path, '*', 'foicu.txt'), os.path.join(ncua_path, '*', 'fs220.txt')], 'outputs': ['ncua_combined']},
+        {'name': 'bhcf', 'func': get_bhc_financial_data, 'params': {'path': bhcf_path}, 'inputs': [os.path.join(bhcf_path, '*.txt')],
+         'outputs': ['ffiec_bhcf_combined'], 'code': [get_bhc_financial_data, read_bhcf_file, parse_bhcf]},
+        {'name': 'cfpb_lists', 'func': read_cfpd_depository_institutions_list_excels,
+         'inputs': [os.path.join(cfpb_path, '*.xlsx'), os.path.join(cfpb_path, '*.xls')], 'outputs': ['cfpb_all_depository_institutions_combined'],
+         'code': [read_cfpd_depository_institutions_list_excels, read_cfpd_depository_institutions_list_excel, frame_with_header, extract_date_parts]},
+        {'name': 'zip_county', 'func': get_zip_county_crosswalk, 'params': {'path': zipcounty_path}, 'inputs': [os.path.join(zipcounty_path, '*.xlsx')],
+         'outputs': ['zip_county_crosswalk']},
+        {'name': 'acs', 'func': get_acs_zip_year, 'params': {'acs_path': acs_path, 'cpi_path': cpi_path}, 'deps': ['zip_county'], 'executor': 'process',
+         'inputs': [acs_path, cpi_path], 'outputs': ['acs_zip_year']},
+        {'name': 'name_index', 'func': get_name_index, 'deps': ['nic', 'ffiec', 'ncua', 'cfpb_lists'], 'outputs': ['name_rssd_index'], 'executor': 'process',
+         'code': [get_name_index, build_name_index, normalize_name]},
+        {'name': 'reference_lists', 'func': read_reference_lists, 'params': {'scra_path': scra_path, 'db_path': db_path, 'cpi_path': cpi_path},
+         'inputs': [scra_path, db_path, cpi_path]},
+    ]
+
+def prepare_lookups(sources): # source level tables the complaints are matched against - independent of the complaint snapshot
+    lookups = {}
 
     ### Getting RSSD ID & institution type
-    nic, nic_raw = get_nic_data()
-    if nic['quarter'].dtype == 'O' or nic['quarter'].dtype.name == 'string':
-        nic['quarter'] = pd.to_datetime(nic['quarter']).dt.to_period('Q')
-    else:
-        nic['quarter'] = snic['quarter'].dt.to_period('Q')
-
-    df = df.merge(nic, how='left', left_on=['Company', 'Quarter sent'], right_on=['NM_LGL', 'quarter'])
-    print(f"df after merging with nic: {len(df)}")
-
-    # major credit bureaus
-    df['Company'] = df['Company'].str.upper().str.strip() 
-    credit_bureaus = ['EXPERIAN INFORMATION SOLUTIONS INC.', 'TRANSUNION INTERMEDIATE HOLDINGS, INC.', 'EQUIFAX, INC.']
-    cb_ind = df['Company'].isin(credit_bureaus)
-    df.loc[cb_ind, 'Company type'] = 'major credit bureaus'
-
-    # SCRA (specialized credit reporting agencies)
-    scra_df = pd.read_csv(os.path.join(cPATH, 'input', 'CFPD', 'cfpb-consumer-reporting-companies_list_2025.csv'), encoding='cp1252')
-    scra = scra_df['Company'].str.upper().tolist()
-    scra_ind = df['Company'].isin(scra)
-    df.loc[scra_ind, 'Company type'] = 'scra'
-    
-    # data broker
-    db = pd.read_excel(os.path.join(cPATH, 'input', 'Data_Broker_Full_Registry_2025.xlsx'))
-    db['Name'] = db['Name'].str.upper().str.strip() 
-    db_names = db['Name'].unique().tolist()
-    db_ind = df['Company'].isin(db_names)
-    df.loc[db_ind, 'Company type'] = 'data broker'
-
-    df['Company type'] = df['Company type'].fillna('others')
-    print(df['Company type'].unique())
-    print(df.groupby('Company type').count())
-    print(f"df size after financial institution classification: {len(df)}")
-    
+    with measure('nic quarter keys') as m:
+        nic, nic_attributes = sources['nic']
+        # every quarterly table is joined on its integer quarter ordinal, computed once here
+        nic['Quarter key'] = quarter_key(nic['quarter'])
+        lookups['nic'] = nic
+        # attributes of an rssd id on a date are looked up in its attribute history instead of an rssd id x quarter panel
+        nic_history = interval_index(nic_attributes, '#ID_RSSD', 'D_DT_START', 'D_DT_END')
+        m['output'] = [nic, nic_attributes]
+
+    # company lists matched by name -> one name: type table
+    with measure('institution lists') as m:
+        # major credit bureaus
+        credit_bureaus = ['EXPERIAN INFORMATION SOLUTIONS INC.', 'TRANSUNION INTERMEDIATE HOLDINGS, INC.', 'EQUIFAX, INC.']
+
+        # SCRA (specialized credit reporting agencies) and data broker
+        scra_df, db = sources['reference_lists']['scra'], sources['reference_lists']['data_broker']
+        lookups['company_lists'] = company_list_types({'major credit bureaus': credit_bureaus, 'scra': scra_df['Company'].dropna(), 'data broker': db['Name'].dropna()})
+
     ### financial institutions size (total assets in dollars)
-    ## get asset information for banks from ffiec call reports (031/041/051)
-    ffiec_path = os.path.join(cPATH, 'input', 'FFIEC', 'CDR Call Reports')
-    ffiec = get_ffiec_data(ffiec_path)
-    df['Quarter sent end date'] = df['Quarter sent'].astype(str).apply(quarter_to_period_end) # calcuate end date of quarter when the complain was sent to the company for match purpose
+    with measure('quarter keys of asset tables') as m:
+        ffiec = sources['ffiec']
+        ffiec['Quarter key'] = quarter_key(ffiec['Reporting Period End Date'])
+        lookups['ffiec'] = ffiec
+        ncua = sources['ncua']
+        ncua['Quarter key'] = quarter_key(ncua['CYCLE_DATE'])
+        lookups['ncua_id'] = ncua[ncua['RSSD'].notna()]
+        # credit unions without RSSD ID can only be matched by name - keep the names that are unique within a quarter
+        ncua['Name key'] = normalize_names(ncua['CU_NAME'])
+        lookups['ncua_names'] = ncua[ncua['Name key'].notna()].drop_duplicates(['Name key', 'Quarter key'], keep=False)
+        bhcf = sources['bhcf'] # get total assets of bhc
+        bhcf['Quarter key'] = quarter_key(bhcf['bhcf report date'])
+        lookups['bhcf'] = bhcf
+        m['output'] = [ffiec, ncua, bhcf]
+    lookups['name_index'] = sources['name_index'] # normalized name -> RSSD ID per quarter, shared by every name based fallback
+    with measure('bhc bank assets', [nic_attributes, ffiec]) as m:
+        lookups['bhc_bank'], bhc_offsprings = bank_total_assets_in_bhc(nic_history, ffiec) # get sum of total assets held by banks under bhc
+        m['output'] = lookups['bhc_bank']
+
+    # institution x quarter panel of total assets, with the precedence of the complaint level measure (bank > credit union > bhc) - lags, leads and growth rates are shifts of it
+    with measure('asset panel', [ffiec, lookups['ncua_id'], bhcf, lookups['bhc_bank']]) as m:
+        bhc = pd.DataFrame({'RSSD': pd.to_numeric(bhcf['RSSD ID'], errors='coerce'), 'Quarter key': bhcf['Quarter key'], 'BhcAssets': bhcf['Total assets']})
+        bank = lookups['bhc_bank'][['#ID_RSSD_PARENT', 'Quarter key', 'BankAssets']].rename(columns={'#ID_RSSD_PARENT': 'RSSD'})
+        bank['RSSD'] = pd.to_numeric(bank['RSSD'], errors='coerce')
+        bhc = bhc.merge(bank, how='outer', on=['RSSD', 'Quarter key'])
+        bhc['Total assets'] = bhc_asset_measure(bhc['BhcAssets'], bhc['BankAssets'])
+        lookups['asset_panel'] = asset_panel([(ffiec, 'IDRSSD', 'Quarter key', 'Total assets'), (lookups['ncua_id'], 'RSSD', 'Quarter key', 'Total assets'),
+                                              (bhc, 'RSSD', 'Quarter key', 'Total assets')])
+        m['output'] = bhc
+
+    ## Use the Consumer Price Index (CPI) to adjust total assets to real values in 2013 dollars.
+    with measure('cpi') as m:
+        cpi_df = sources['reference_lists']['cpi']
+        cpi_2013 = cpi_df[cpi_df['observation_date'].str.startswith('2013')] # average CPI in 2013
+        lookups['cpi_df'] = cpi_df
+        lookups['mean_cpi_2013'] = cpi_2013['CPIAUCSL'].mean()
+        m['output'] = cpi_df
 
-    df = df.merge(ffiec, how='left', left_on=['#ID_RSSD', 'Quarter sent end date'], right_on=['IDRSSD', 'Reporting Period End Date']) # match with RSSD ID
-    df.rename(columns={'Total assets': 'Total assets bank'}, inplace=True)
+    ### CFPB regulation
+    with measure('cfpb regulation rollup') as m:
+        cfpb = sources['cfpb_lists']
+        cfpb['Quarter key'] = quarter_key(cfpb['Reporting date'])
+        cfpb_noid = cfpb[cfpb['#ID_RSSD'].eq(-1).fillna(False)].copy().drop('#ID_RSSD', axis=1)
+        cfpb_id = cfpb[cfpb['#ID_RSSD'].ne(-1).fillna(True)].copy()
+        cfpb_noid['Name key'] = normalize_names(cfpb_noid['Company'])
+        cfpb_names = cfpb_noid[cfpb_noid['Name key'].notna()].drop_duplicates(['Name key', 'Quarter key'])
+        lookups['cfpb_id'], lookups['cfpb_names'] = cfpb_id, cfpb_names
+
+        # get regulation information in bhc level - every step carries regulation flags, labels are only joined for the final bhc table
+        id_flags = aggregate_regulation(cfpb_id, ['#ID_RSSD', 'Quarter key'], regulation_flags(cfpb_id['Regulation'])) # an rssd id can be on both lists
+        bhc_reg = bhc_offsprings[['#ID_RSSD_PARENT', 'ID_RSSD_OFFSPRING', 'Quarter key']].copy()
+        bhc_reg['flags'] = lookup_by_key(id_flags, ['#ID_RSSD', 'Quarter key'], ['flags'], bhc_reg[['ID_RSSD_OFFSPRING', 'Quarter key']])['flags'].fillna(0).to_numpy(dtype=np.int64)
+
+        no_reg = bhc_reg[bhc_reg['flags'] == 0] # offsprings listed without rssd id are matched by their legal name
+        name_key = normalize_names(as_of(nic_history, no_reg['ID_RSSD_OFFSPRING'], quarter_end_date(no_reg['Quarter key']), ['NM_LGL'])['NM_LGL'])
+        by_name = lookup_by_key(cfpb_names, ['Name key', 'Quarter key'], ['Regulation'], pd.DataFrame({'Name key': name_key, 'Quarter key': no_reg['Quarter key']}))['Regulation']
+        bhc_reg.loc[no_reg.index, 'flags'] = regulation_flags(by_name)
+        bhc_reg.loc[bhc_reg['flags'] == 0, 'flags'] = REGULATION_FLAGS['NoRegulation']
+
+        bhc_reg_agg = aggregate_regulation(bhc_reg, ['#ID_RSSD_PARENT', 'Quarter key'], bhc_reg['flags'].to_numpy())
+        bhc_reg_agg['Regulation'] = bhc_reg_agg.pop('flags').map(REGULATION_LABELS)
+        lookups['bhc_reg_agg'] = bhc_reg_agg
+        m['output'] = lookups['bhc_reg_agg']
+
+    ### socio-demographic variables - dense zip x ACS year table, built by the acs stage
+    lookups['acs'] = dense_grid(sources['acs'], 'zip', 'Year')
+    return lookups
+
+# company lists matched by name, highest precedence first - a name on several lists takes the first type
+LIST_TYPE_PRECEDENCE = ['data broker', 'scra', 'major credit bureaus']
+# types implied by the call reports a complaint is matched to, highest precedence first - they override the NIC and list types
+FILER_TYPE_PRECEDENCE = ['bank holding company', 'credit union', 'bank']
+
+def company_list_types(lists): # {type: names} -> {upper-cased name: type}
+    types = {}
+    for company_type in LIST_TYPE_PRECEDENCE:
+        for name in lists[company_type]:
+            types.setdefault(str(name).upper().strip(), company_type)
+    return types
+
+def classify_companies(companies, types): # each distinct company is looked up once, the result is broadcast through the factorized codes
+    codes, uniques = pd.factorize(companies)
+    classified = np.array([types.get(name) for name in uniques] + [None], dtype=object) # code -1 (missing company) takes the trailing None
+    return pd.Series(classified[codes], index=companies.index)
+
+def resolve_filer_type(company_type, filers): # filers: {type: mask of complaints matched to that type's call reports}
+    resolved = np.select([filers[t].to_numpy(dtype=bool) for t in FILER_TYPE_PRECEDENCE], FILER_TYPE_PRECEDENCE, default=company_type.to_numpy(dtype=object))
+    return pd.Series(resolved, index=company_type.index)
+
+def enrich_complaints(df, lookups): # complaint level matching - every row only depends on its own fields and the lookups
+    # identification of zombie data
+    with measure('zombie data and narrative indicators', df) as m:
+        df['Zombie data'] = 0
+        cond1 = (df['Issue'] == 'Incorrect information on your report') & (df['Sub-issue'] == 'Old information reappears or never goes away')
+        cond2 = (df['Issue'] == 'Incorrect information on credit report') & (df['Sub-issue'] == 'Reinserted previously deleted info')
+        df.loc[cond1 | cond2, 'Zombie data'] = 1
+        print(f"{df['Zombie data'].sum()}/{len(df)} complaints are about zombie data")
+        print(f"number of companies that zombie data-related compaints were filed to: {df[df['Zombie data']==1]['Company'].nunique()}")
+        print(f"top 20 companies that zombie data complaints were filed to: \n {df[df['Zombie data'] == 1]['Company'].value_counts().head(20)}")
+
+        # indicator of complaints with/without narratives 
+        df["With narrative"] = df["Consumer complaint narrative"].notna()
+
+    # every lookup below is resolved on a narrow key frame - the wide frame (narratives included) is only copied once, in attach
+    keys = narrow_keys(df, ['Company', 'Quarter sent', 'ZIP code', 'Year received'])
+    keys['Quarter sent key'] = quarter_ordinal(keys['Quarter sent']) # integer quarter used by every quarterly lookup
 
-    ffiec_dup = ffiec.drop_duplicates(['Financial Institution Name', 'Reporting Period End Date'], keep=False)
-    df.drop(['IDRSSD', 'Reporting Period End Date', 'Financial Institution Name'], axis=1, inplace=True)
-    df = df.merge(ffiec_dup, how='left', left_on=['Company', 'Quarter sent end date'], right_on=['Financial Institution Name', 'Reporting Period End Date']) # match with name
+    ### Getting RSSD ID & institution type
+    with measure('nic lookup', keys) as m:
+        keys = lookup(keys, lookups['nic'], ['Company', 'Quarter sent key'], ['NM_LGL', 'Quarter key'])
+        keys.drop(['Quarter key'], axis=1, inplace=True)
+        print(f"df after merging with nic: {len(keys)}")
+        m['output'] = keys
+
+    # major credit bureaus, SCRA (specialized credit reporting agencies) and data brokers override the NIC type
+    with measure('company type', keys) as m:
+        keys['Company'] = keys['Company'].str.upper().str.strip() 
+        keys['Company type'] = classify_companies(keys['Company'], lookups['company_lists']).fillna(keys['Company type']).fillna('others')
+        print(keys['Company type'].unique())
+        print(keys.groupby('Company type').count())
+        print(f"df size after financial institution classification: {len(keys)}")
+        m['output'] = keys
     
-    # combine information gathered from matching with rssd id and name
-    df['Total assets bank'] = df['Total assets bank'].combine_first(df['Total assets']) 
-    df['#ID_RSSD'] = df['#ID_RSSD'].combine_first(df['IDRSSD'])
-    df.loc[df['Total assets bank'].notna(), 'Company type'] = 'bank' # all the institution that file ffiec call reports 031/041/051 are banks
-    print(f"total assets identified for {df['Total assets bank'].notna().sum()} out of {len(df[df['Company type']=='bank'])} complaints filed to banks")
-    df.drop(['IDRSSD', 'Reporting Period End Date', 'Financial Institution Name', 'Total assets'], axis=1, inplace=True)
+    ## institutions not matched with their exact NIC legal name get their RSSD ID from the shared name index (normalized names, quarter validity)
+    with measure('name index lookup', keys) as m:
+        keys['Name key'] = normalize_names(keys['Company'])
+        resolved = lookup_by_key(lookups['name_index'], ['Name key', 'Quarter key'], ['RSSD'], keys[['Name key', 'Quarter sent key']])['RSSD']
+        print(f"RSSD ID resolved by name for {(keys['#ID_RSSD'].isna() & resolved.notna()).sum()} additional complaints")
+        keys['#ID_RSSD'] = keys['#ID_RSSD'].combine_first(resolved)
+        m['output'] = keys
 
-    ## get asset information for credit unions
-    ncua_path = os.path.join(cPATH, 'input', 'NCUA')
-    ncua = get_ncua_data(ncua_path)
-    ncua_id = ncua[ncua['RSSD'].notna()]
+    ### financial institutions size (total assets in dollars)
+    with measure('ffiec lookup', keys) as m:
+        ## get asset information for banks from ffiec call reports (031/041/051)
+        keys = lookup(keys, lookups['ffiec'], ['#ID_RSSD', 'Quarter sent key'], ['IDRSSD', 'Quarter key'], columns=['Total assets']) # match with RSSD ID
+        keys.rename(columns={'Total assets': 'Total assets bank'}, inplace=True)
+        keys.drop(['IDRSSD', 'Quarter key'], axis=1, inplace=True)
+        print(f"total assets identified for {keys['Total assets bank'].notna().sum()} out of {len(keys[keys['Company type']=='bank'])} complaints filed to banks")
+        m['output'] = keys
 
-    df = df.merge(ncua_id, how='left', left_on=['#ID_RSSD', 'Quarter sent end date'],right_on=['RSSD', 'CYCLE_DATE']) # first match with IDRSSD
-    df.rename(columns={'Total assets': 'Total assets cu'}, inplace=True)
-    df.drop(['RSSD', 'CYCLE_DATE', 'CU_NAME', 'CU_NUMBER'], axis=1, inplace=True)
+    ## get asset information for credit unions
+    with measure('ncua lookup', keys) as m:
+        keys = lookup(keys, lookups['ncua_id'], ['#ID_RSSD', 'Quarter sent key'], ['RSSD', 'Quarter key'], columns=['Total assets']) # first match with IDRSSD
+        keys.rename(columns={'Total assets': 'Total assets cu'}, inplace=True)
+        keys.drop(['RSSD', 'Quarter key'], axis=1, inplace=True)
 
-    ncua_dup = ncua.drop_duplicates(['CU_NAME', 'CYCLE_DATE'], keep=False)
-    df = df.merge(ncua_dup, how='left', left_on=['Company', 'Quarter sent end date'], right_on=['CU_NAME', 'CYCLE_DATE']) # match with name
+        by_name = lookup_by_key(lookups['ncua_names'], ['Name key', 'Quarter key'], ['RSSD', 'Total assets'], keys[['Name key', 'Quarter sent key']]) # match with name
 
-    # combine the matched information 
-    df['Total assets cu'] = df['Total assets cu'].combine_first(df['Total assets'])
-    df['#ID_RSSD'] = df['#ID_RSSD'].combine_first(df['RSSD'])
-    df.loc[df['Total assets cu'].notna(), 'Company type'] = 'credit union' # all the institution that file NCUA call reports are credit union
-    print(f"total assets identified for {df['Total assets cu'].notna().sum()} out of {len(df[df['Company type']=='credit union'])} complaints filed to credit union")
-    df.drop(['RSSD', 'CYCLE_DATE', 'CU_NAME', 'CU_NUMBER', 'Total assets'], axis=1, inplace=True)
+        # combine the matched information 
+        keys['Total assets cu'] = keys['Total assets cu'].combine_first(by_name['Total assets'])
+        keys['#ID_RSSD'] = keys['#ID_RSSD'].combine_first(by_name['RSSD'])
+        print(f"total assets identified for {keys['Total assets cu'].notna().sum()} out of {len(keys[keys['Company type']=='credit union'])} complaints filed to credit union")
+        m['output'] = keys
 
     ## get asset information for bank holding companies
-    bhcf_path = os.path.join(cPATH, 'input', 'FFIEC', 'Holding Company Financial Data')
-    bhcf = get_bhc_financial_data(bhcf_path) # get total assets of bhc
-    bhc_bank, bhc_offsprings = bank_total_assets_in_bhc(nic_raw, ffiec) # get sum of total assets held by banks under bhc
-
-    df = df.merge(bhcf, how='left', left_on=['#ID_RSSD', 'Quarter sent end date'], right_on=['RSSD ID', 'bhcf report date']) # match with rssd id 
-    df = df.merge(bhc_bank, how='left', left_on=['#ID_RSSD', 'Quarter sent end date'], right_on=['#ID_RSSD_PARENT', 'Reporting Period End Date'])
-    df.rename(columns={'Total assets': 'Total assets bhc'}, inplace=True)
-    df.loc[df['Total assets bhc'].notna(), 'Company type'] = 'bank holding company' # all the institution that file NCUA call reports are credit union
-    print(len(df), "after matching with rssd id")
-
-    print(f"bhc total assets identified for {df['Total assets bhc'].notna().sum()} out of {len(df[df['Company type']=='bank holding company'])} complaints filed to bank holding companies")
-    print(f"bhc total assets ranges between: {df['Total assets bhc'].min()} to {df['Total assets bhc'].max()}")
-    print(f"bhc total assets held by banks identified for {df['BankAssets'].notna().sum()} out of {len(df[df['Company type']=='bank holding company'])} complaints filed to bank holding companies")
-    print(f"bhc total assets held by banks ranges between: {df['BankAssets'].min()} to {df['BankAssets'].max()}")
-
-    df[df['Company type']=='Bank holding company'].to_csv(os.path.join(cPATH,  'temp', 'bhc_assets.csv')) # save to compare bhc total assets vs. bhc total assets held by banks
-
-    # adjust total assets based on exploratory analysis of BankAssets and TotalAssets
-    # we use BankAssets as our default measure of total assets for bhcs since it better reflects each institution's capability regarding its banking system
-    # when AssetsRatio < 0.3, bank subsidiaries are not properly matched, resulting in big discrepancy between Total assets & BankAssets -> better use Total assets
-    df['AssetsRatio'] = df['BankAssets'] / df['Total assets bhc']    
-    df.rename(columns={'Total assets bhc' : 'BhcAssets', 'BankAssets': 'Total assets bhc'}, inplace=True)
-    use_bhc_assets = df[(df['AssetsRatio']<0.3)&(df['Total assets bhc'].notna())&(df['BhcAssets'].notna())] 
-    df.loc[use_bhc_assets.index, 'Total assets bhc'] = df.loc[use_bhc_assets.index, 'BhcAssets']
-    df['BankCount'] = df['BankCount'].fillna(-1)
-
-    df.drop(['quarter', 'RSSD ID', 'bhcf report date', 'Consolidated', '#ID_RSSD_PARENT', 'Reporting Period End Date', 'BankNotnaCount', 'BhcAssets'], axis=1, inplace=True)
-    print(f"final bhc total assets identified for {df['Total assets bhc'].notna().sum()} out of {len(df[df['Company type']=='Bank holding company'])} complaints filed to bank holding companies")
-    print(f"final bhc total assets ranges between: {df['Total assets bhc'].min()} to {df['Total assets bhc'].max()}")
+    with measure('bhc lookup', keys) as m:
+        keys = lookup(keys, lookups['bhcf'], ['#ID_RSSD', 'Quarter sent key'], ['RSSD ID', 'Quarter key'], columns=['Total assets']) # match with rssd id 
+        keys.drop(['Quarter key'], axis=1, inplace=True)
+        keys = lookup(keys, lookups['bhc_bank'], ['#ID_RSSD', 'Quarter sent key'], ['#ID_RSSD_PARENT', 'Quarter key'], columns=['BankAssets', 'BankCount'])
+        keys.rename(columns={'Total assets': 'Total assets bhc'}, inplace=True)
+        keys['Files bhcf'] = keys['Total assets bhc'].notna() # the bhc type is resolved with the other filer types in the total assets step
+        print(len(keys), "after matching with rssd id")
+
+        print(f"bhc total assets identified for {keys['Total assets bhc'].notna().sum()} out of {len(keys[keys['Company type']=='bank holding company'])} complaints filed to bank holding companies")
+        print(f"bhc total assets ranges between: {keys['Total assets bhc'].min()} to {keys['Total assets bhc'].max()}")
+        print(f"bhc total assets held by banks identified for {keys['BankAssets'].notna().sum()} out of {len(keys[keys['Company type']=='bank holding company'])} complaints filed to bank holding companies")
+        print(f"bhc total assets held by banks ranges between: {keys['BankAssets'].min()} to {keys['BankAssets'].max()}")
+
+        attach(df, keys[keys['Company type']=='Bank holding company']).to_csv(os.path.join(cPATH,  'temp', 'bhc_assets.csv')) # save to compare bhc total assets vs. bhc total assets held by banks
+
+        # adjust total assets based on exploratory analysis of BankAssets and TotalAssets
+        keys['AssetsRatio'] = keys['BankAssets'] / keys['Total assets bhc']
+        keys['Total assets bhc'] = bhc_asset_measure(keys['Total assets bhc'], keys['BankAssets'])
+        keys['BankCount'] = keys['BankCount'].fillna(-1)
+
+        keys.drop(['quarter', 'RSSD ID', '#ID_RSSD_PARENT', 'Quarter key', 'BankAssets'], axis=1, inplace=True)
+        print(f"final bhc total assets identified for {keys['Total assets bhc'].notna().sum()} out of {len(keys[keys['Company type']=='Bank holding company'])} complaints filed to bank holding companies")
+        print(f"final bhc total assets ranges between: {keys['Total assets bhc'].min()} to {keys['Total assets bhc'].max()}")
+        m['output'] = keys
 
     # combine all total assets info
-    df['Total assets'] = df['Total assets bank'].fillna(df['Total assets cu']).fillna(df['Total assets bhc'])
-    df.drop(columns=['Total assets bank', 'Total assets cu', 'Total assets bhc'], axis=1, inplace=True)
-    print("financial institution classification updated: ", df.groupby('Company type').count())
-
-    ## Use the Consumer Price Index (CPI) to adjust total assets to real values in 2013 dollars.
-    cpi_df = pd.read_csv(os.path.join(cPATH, 'input', 'CPIAUCSL.csv'))
-    cpi_df['observation_month'] = cpi_df['observation_date'].str[:-3] # convert to month to make matching easier
-    cpi_dict = cpi_df.set_index('observation_month')['CPIAUCSL'].to_dict() # convert to dictionary to make matching easier
-
-    cpi_2013 = cpi_df[cpi_df['observation_date'].str.startswith('2013')] # average CPI in 2013
-    mean_cpi_2013 = cpi_2013['CPIAUCSL'].mean()
-
-    df['Total assets'] = pd.to_numeric(df['Total assets'], errors='coerce')
-    df['Real total assets'] = df['Total assets']*mean_cpi_2013/df['Quarter sent end date'].apply(lambda x: cpi_dict[x[:-3]])
-    df['Log total assets'] = np.log(df['Total assets'])
-    df['Log real total assets'] = np.log(df['Real total assets'])
-
-    ## Lagged total assets variable
-    df['LagQuarter'] = df['Quarter sent end date'].apply(get_lag_quarter)
-    lag_df = df[['#ID_RSSD', 'Quarter sent end date', 'Total assets']].drop_duplicates()
-    lag_df = lag_df.rename(columns={'Quarter sent end date': 'LagQuarter', 'Total assets': 'Lagged total assets'})
-    df = df.merge(lag_df, how='left', on=['#ID_RSSD', 'LagQuarter'])
+    with measure('total assets', keys) as m:
+        keys['Total assets'] = keys['Total assets bank'].fillna(keys['Total assets cu']).fillna(keys['Total assets bhc'])
+        # all the institutions that file ffiec call reports 031/041/051 are banks, those that file NCUA call reports are credit unions, bhcf filers are bhcs
+        filers = {'bank': keys['Total assets bank'].notna(), 'credit union': keys['Total assets cu'].notna(), 'bank holding company': keys['Files bhcf']}
+        keys['Company type'] = resolve_filer_type(keys['Company type'], filers)
+        keys.drop(columns=['Total assets bank', 'Total assets cu', 'Total assets bhc', 'Files bhcf'], inplace=True)
+        print("financial institution classification updated: ", keys.groupby('Company type').count())
+
+        ## real values of total assets in 2013 dollars
+        keys['Total assets'] = pd.to_numeric(keys['Total assets'], errors='coerce')
+        keys['Real total assets'] = keys['Total assets']*lookups['mean_cpi_2013']/cpi_at_quarter_end(lookups['cpi_df'], keys['Quarter sent key'])
+        keys['Log total assets'] = np.log(keys['Total assets'])
+        keys['Log real total assets'] = np.log(keys['Real total assets'])
+        m['output'] = keys
 
     ### CFPB regulation
-    cfpb = read_cfpd_depository_institutions_list_excels(override=True)
-    cfpb_noid = cfpb[cfpb['#ID_RSSD']==-1].copy().drop('#ID_RSSD', axis=1)
-    cfpb_id = cfpb[cfpb['#ID_RSSD']!=-1].copy()
-
-    # get regulation information in bhc level
-    bhc_offsprings['quarter'] = bhc_offsprings['quarter'].astype(str)
-    bhc_offsprings = bhc_offsprings[['#ID_RSSD_PARENT', 'ID_RSSD_OFFSPRING', 'quarter']].merge(cfpb_id, how='left', left_on=['ID_RSSD_OFFSPRING', 'quarter'], right_on=['#ID_RSSD', 'Reporting date'])
-    bhc_with_reg = bhc_offsprings[bhc_offsprings['Regulation'].notna()]
-    bhc_no_reg = bhc_offsprings[bhc_offsprings['Regulation'].isna()][['#ID_RSSD_PARENT', 'ID_RSSD_OFFSPRING', 'quarter']]
-
-    nic_raw['quarter'] = nic_raw['quarter'].astype(str)
-    bhc_no_reg = bhc_no_reg.merge(nic_raw[['#ID_RSSD', 'quarter', 'NM_LGL']], how='left', left_on=['ID_RSSD_OFFSPRING', 'quarter'], right_on=['#ID_RSSD', 'quarter'])
-    bhc_no_reg = bhc_no_reg.merge(cfpb_noid, how='left', left_on=['NM_LGL', 'quarter'], right_on=['Company', 'Reporting date'])
-    bhc_reg = pd.concat([bhc_with_reg, bhc_no_reg], ignore_index=True)[['#ID_RSSD_PARENT', 'ID_RSSD_OFFSPRING', 'quarter', 'Regulation']]
-    bhc_reg['Regulation'] = bhc_reg['Regulation'].fillna('NoRegulation')
-
-    bhc_reg_agg = bhc_reg.groupby(['#ID_RSSD_PARENT', 'quarter']).agg({'Regulation': aggregate_regulation}).reset_index()
-    df = df.merge(bhc_reg_agg, how='left', left_on=['#ID_RSSD', 'Quarter sent end date'], right_on=['#ID_RSSD_PARENT', 'quarter'])
-    df = df.rename(columns={'Regulation': 'Regulation_bhc'})
-    print(f"regulation under CFPD identified for {len(df[df['Regulation_bhc'].notna()])} complaints filed to bank holding company")
-    df = df.merge(cfpb_id[cfpb_id['#ID_RSSD'].notna()][['#ID_RSSD', 'Reporting date', 'Regulation']], how='left', left_on=['#ID_RSSD', 'Quarter sent end date'], right_on=['#ID_RSSD', 'Reporting date'])
-    df_with_reg = df[df['Regulation'].notna()].copy()
-    df_no_reg = df[df['Regulation'].isna()].drop(['Regulation', 'Reporting date'], axis=1)
-    print(f"regulation under CFPD identified for {len(df_with_reg)} complaints (matching with ID RSSD)")
-    df_no_reg = df_no_reg.merge(cfpb_noid[['Company', 'Reporting date', 'Regulation']], how='left', left_on=['Company', 'Quarter sent end date'], right_on=['Company', 'Reporting date'])
-    print(f"regulation under CFPD identified for {len(df_no_reg[df_no_reg['Regulation'].notna()])} complaints (additional matching with name)")
-    df = pd.concat([df_with_reg, df_no_reg], ignore_index=True)
-
-    df['Regulation'] = df['Regulation'].combine_first(df['Regulation_bhc'])
-    df['Regulation'] = df['Regulation'].fillna('NoRegulation')
-    print("complaint level statistics for regulation:")
-    print(df.groupby('Regulation')['Regulation'].count())
-    print("company-quarter level statistics for regulation:")
-    print(df.drop_duplicates(subset=['Company', 'Quarter sent', 'Regulation']).groupby('Regulation').size().reset_index(name='n_company_quarters'))
-
-    ### merge ACS dataset to get socio-demographic variables
-    '''
-    ## The following 17 lines of code is for matching in zip code level
-    acs = pd.read_csv(os.path.join(cPATH, 'temp', 'ACSdataset', 'ACS5YR_combined.csv'))
-    acs_val = acs[acs['zip'].notna()].copy()
-    df['ACS year'] = (df['Year received'] + 2).clip(upper=2023)
-    '''
-    ## Use this code for matching in county level
-    df['ACS year'] = (df['Year received'] + 2).clip(upper=2023)
-    zipcounty = get_zip_county_crosswalk(os.path.join(cPATH, 'input', 'zip_county_crosswalk'), override=True)
-    acs = pd.read_csv(os.path.join(cPATH, 'temp', 'ACSdataset_countylvl', 'ACS5YR_combined.csv'))
-    acs['fips'] = (acs['state'].astype(str).str.zfill(2) + acs['county'].astype(str).str.zfill(3)).astype(int) #county code in zipcounty is fips = ssccc where ss is state code and ccc is county code in acs dataset
-    
-    demo = acs.merge(zipcounty, how='left', left_on=['fips', 'Year'], right_on=['county', 'year'])
-    demo = demo[demo['zip'].notna()] # drop counties where zip is not matched
-    demo.drop(['county_x', 'county_y', 'year', 'state'], axis=1, inplace=True)
-    acs_vars = [col for col in acs.columns if col not in ['NAME', 'state', 'county', 'Year', 'fips']]
-    demo = demo[demo['res_ratio']>0].copy() # drop if res_ratio is zero
-
-    # consider a county as representative of a zip code when res_ratio > 0.9 
-    print(f"creating a zip-year level acs dataset")
-    demo = demo.sort_values('res_ratio', ascending=False)
-    demo_zip = demo.groupby(['zip', 'Year']).agg(max_ratio=('res_ratio', 'max')).reset_index()
-    demo_zip_val = demo_zip[demo_zip['max_ratio']>0.9]
-    acs_val = demo_zip_val.merge(demo[demo['res_ratio']>0.9], how='left', on=['zip', 'Year'])
-    print(f"keep only zip-county relationships where res_ratio is greater than 0.9: {len(acs_val)}/{len(demo_zip)}")
-
-    if acs_val['zip'].dtype != 'object':
-        acs_val['zip'] = pd.to_numeric(acs_val['zip'], errors='coerce').astype('Int64').astype(str).str.zfill(5)
-    df = df.merge(acs_val, how='left', left_on=['ZIP code', 'ACS year'], right_on=['zip', 'Year'])
-
-    # get real median income by reflecting CPI - MedIncome is in {ACS year} inflation adjusted dollars & RealMedIncome is in 2013 inflation adjusted dollars
-    cpi_df['year'] = cpi_df['observation_date'].str[:4]
-    mean_cpi_by_year = cpi_df.groupby('year')['CPIAUCSL'].mean().to_dict()
-    df['CPI_by_Year'] = pd.to_numeric(df['Year'], errors='coerce').astype('Int64').astype(str).map(mean_cpi_by_year)
-    df['RealMedIncome'] = df['MedIncome']*(mean_cpi_by_year['2013']/df['CPI_by_Year'])
-    df.drop(['ACS year', 'Year', 'CPI_by_Year'], axis=1, inplace=True)
-
+    with measure('cfpb regulation lookup', keys) as m:
+        cfpb_id = lookups['cfpb_id']
+        keys = lookup(keys, lookups['bhc_reg_agg'], ['#ID_RSSD', 'Quarter sent key'], ['#ID_RSSD_PARENT', 'Quarter key'], columns=['Regulation'])
+        keys = keys.drop(columns=['#ID_RSSD_PARENT', 'Quarter key']).rename(columns={'Regulation': 'Regulation_bhc'})
+        print(f"regulation under CFPD identified for {len(keys[keys['Regulation_bhc'].notna()])} complaints filed to bank holding company")
+        keys = lookup(keys, cfpb_id[cfpb_id['#ID_RSSD'].notna()], ['#ID_RSSD', 'Quarter sent key'], ['#ID_RSSD', 'Quarter key'], columns=['Regulation'])
+        keys = keys.drop(columns=['Quarter key'])
+        keys_with_reg = keys[keys['Regulation'].notna()].copy()
+        keys_no_reg = keys[keys['Regulation'].isna()].drop(['Regulation'], axis=1)
+        print(f"regulation under CFPD identified for {len(keys_with_reg)} complaints (matching with ID RSSD)")
+        keys_no_reg['Regulation'] = lookup_by_key(lookups['cfpb_names'], ['Name key', 'Quarter key'], ['Regulation'], keys_no_reg[['Name key', 'Quarter sent key']])['Regulation']
+        print(f"regulation under CFPD identified for {len(keys_no_reg[keys_no_reg['Regulation'].notna()])} complaints (additional matching with name)")
+        keys = pd.concat([keys_with_reg, keys_no_reg], ignore_index=True)
+
+        keys['Regulation'] = keys['Regulation'].combine_first(keys['Regulation_bhc'])
+        keys['Regulation'] = keys['Regulation'].fillna('NoRegulation')
+        print("complaint level statistics for regulation:")
+        print(keys.groupby('Regulation')['Regulation'].count())
+        print("company-quarter level statistics for regulation:")
+        print(keys.drop_duplicates(subset=['Company', 'Quarter sent', 'Regulation']).groupby('Regulation').size().reset_index(name='n_company_quarters'))
+        m['output'] = keys
+
+    ### merge ACS dataset to get socio-demographic variables (county level matching)
+    with measure('acs lookup', keys) as m:
+        keys['ACS year'] = (keys['Year received'] + 2).clip(upper=2023)
+        zip_codes = keys['ZIP code'].astype('string')
+        keys['zip'] = zip_codes.where(zip_codes.str.fullmatch(r'\d{5}', na=False)) # only complete 5 digit zip codes are matched
+        keys = grid_lookup(keys, lookups['acs'], 'zip', 'ACS year')
+        keys['zip'] = keys['zip'].where(keys['max_ratio'].notna())
+        keys.drop(['ACS year'], axis=1, inplace=True)
+        m['output'] = keys
+    with measure('attach resolved columns', keys) as m:
+        df = attach(df, keys.drop(columns=['Name key']))
+        m['output'] = df
+    return df
+
+def add_lagged_assets(df, panel):
+    # lags and growth rates are shifts of the source level asset panel, attached through the quarter sent - no longer limited to institutions with complaints in the previous quarter
+    df = df.drop(columns=['Lagged total assets', 'Total assets growth yoy'], errors='ignore')
+    quarter = quarter_ordinal(df['Quarter sent'])
+    df['Lagged total assets'] = panel_lookup(panel, shift_panel(panel, 1), df['#ID_RSSD'], quarter)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = panel['values'] / shift_panel(panel, 4) - 1
+    df['Total assets growth yoy'] = panel_lookup(panel, np.where(np.isfinite(growth), growth, np.nan), df['#ID_RSSD'], quarter)
+    return df
+
+def splice_processed(prev, enriched): # previously processed rows (read back from the typed output) + newly enriched rows
+    prev = prev.copy()
+    for col in ['Quarter received', 'Quarter sent']:
+        prev[col] = pd.PeriodIndex(prev[col].astype(str), freq='Q')
+    if enriched.empty:
+        return prev
+    return concat_chunks([prev, enriched.copy()])
+
+def ingest_complaints(path): # basic statistics of the whole dataset
+    with measure('read complaints') as m:
+        df = read_complaints(path)
+        m['output'] = df
+    return df
+
+def snapshot_fingerprint():
+    # complaints processed earlier stay valid only while the source stages, the matching code (with every helper it calls) and the inputs read outside
+    # of the stages are unchanged
+    parts = [load_json(os.path.join(stage_dir(), f"{stage['name']}.json"), {}).get('fingerprint', '') for stage in build_stages()]
+    parts += code_closure([prepare_lookups, enrich_complaints])
+    parts += [f"{path}:{os.path.getsize(path)}:{os.path.getmtime(path)}" for path in [relationships_path()]]
+    return hashlib.sha1('\n'.join(parts).encode()).hexdigest()
+
+def save_outputs(df):
     ### save data with narratives to observe complaint narratives
     narr = df[df['With narrative']==1] # complaints with narrative
     znarr = df[(df['With narrative']==1) & (df['Zombie data'] == 1)] # complaints on zombie data with narrative
     narr.to_csv(os.path.join(cPATH, 'temp', 'complaints_narratives.csv'))
+    write_cache(narr, 'complaints_narratives')
     znarr.to_csv(os.path.join(cPATH, 'temp', 'zombie_complaints_narratives.csv'))
 
     ### delete irrelevant columns & save processed df
-    df.drop(['NM_LGL', 'quarter', 'Quarter sent end date', 'Reporting date', 'LagQuarter', 'Regulation_bhc', '#ID_RSSD_PARENT'], axis=1, inplace=True)
-    df.to_csv(os.path.join(cPATH, 'output', 'complaints_processed.csv'), index=False)
\ No newline at end of file
+    df = df.drop(['NM_LGL', 'quarter', 'Quarter sent key', 'Regulation_bhc', '#ID_RSSD_PARENT'], axis=1, errors='ignore')
+    df.to_csv(os.path.join(cPATH, 'output', 'complaints_processed.csv'), index=False)
+    df = write_cache(df, 'complaints_processed', cache_dir=os.path.join(cPATH, 'output')) # typed copy shipped to analysis/input together with the csv
+    write_schema(df, os.path.join(cPATH, 'output', 'complaints_processed_schema.json')) # lets the analysis restore the compact dtypes when it reads the csv
+    # same rows split by quarter sent x company type, so studies restricted to some institutions or periods only read those files
+    manifest = write_partitions(df, os.path.join(cPATH, 'output', 'complaints_processed'), ['Quarter sent', 'Company type'])
+    print(f"processed complaints written in {len(manifest['partitions'])} partitions")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--dry-run', action='store_true', help='list the source stages that would be rebuilt and why, then exit')
+    parser.add_argument('--force', nargs='*', default=[], help='names of source stages to rebuild regardless of their fingerprint')
+    parser.add_argument('--incremental', action='store_true', help='only enrich complaints that are new or changed since the last processed snapshot')
+    parser.add_argument('--concurrent', action='store_true', help='run independent source stages concurrently instead of one after another')
+    args = parser.parse_args()
+
+    # load source datasets - each stage is only rebuilt when its input files, parameters or code changed
+    if args.dry_run:
+        run_stages(build_stages(), dry_run=True)
+        sys.exit(0)
+    # complaint ingestion overlaps the source stages and the lookup preparation
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        complaints = executor.submit(ingest_complaints, os.path.join(cPATH, "input", "CFPD", "complaints.csv"))
+        # with --concurrent, independent stages load concurrently and prepare_lookups starts on every stage as soon as it is ready
+        sources = run_stages(build_stages(), force=args.force, concurrent=args.concurrent)
+        try:
+            lookups = prepare_lookups(sources)
+        finally:
+            if args.concurrent:
+                sources.close()
+        df = complaints.result()
+    snapshot = df[['Complaint ID', 'Row hash']].copy() # (Complaint ID, row content hash) pairs of this snapshot
+    df = df.drop(columns='Row hash')
+    fingerprint = snapshot_fingerprint() # every stage has finished (and written its manifest) once prepare_lookups returned
+
+    state_path = os.path.join(cPATH, 'temp', 'complaints_snapshot.json')
+    prev_ready = args.incremental and has_cache('complaints_snapshot') and has_cache('complaints_processed', os.path.join(cPATH, 'output'))
+    if prev_ready and load_json(state_path, {}).get('fingerprint') != fingerprint:
+        print("source data or matching code changed since the last build - processing the full snapshot")
+        prev_ready = False
+
+    if prev_ready:
+        prev_snapshot = read_cache('complaints_snapshot')
+        unchanged = pd.MultiIndex.from_frame(snapshot).isin(pd.MultiIndex.from_frame(prev_snapshot))
+        print(f"{(~unchanged).sum()} new or changed complaints, {len(prev_snapshot) - unchanged.sum()} complaints removed or changed since the last snapshot")
+        prev = read_cache('complaints_processed', cache_dir=os.path.join(cPATH, 'output'))
+        prev = prev[prev['Complaint ID'].isin(snapshot.loc[unchanged, 'Complaint ID'])]
+        new = df[~unchanged]
+        df = splice_processed(prev, enrich_complaints(new, lookups) if len(new) else new)
+    else:
+        df = enrich_complaints(df, lookups)
+
+    ## Lagged total assets variable
+    with measure('lagged total assets', df) as m:
+        df = add_lagged_assets(df, lookups['asset_panel'])
+        m['output'] = df
+    with measure('save outputs', df):
+        save_outputs(df)
+    write_cache(snapshot, 'complaints_snapshot')
+    save_json({'fingerprint': fingerprint}, state_path)
+    write_report('build_data')
@@ -0,0 +1,52 @@
+import numpy as np
+import pandas as pd
+
+
+# bins reproduce the if/elif chain of build_data.categorize_duration on integer day counts
+DURATION_BINS = [-np.inf, 0, 1, 2, 3, 4, 5, 6, 7, 14, 30, 90, 180, 366, np.inf]
+DURATION_LABELS = ['< 1 day', '1 day', '2 days', '3 days', '4 days', '5 days', '6 days', '7 days',
+                   'within two weeks', 'within a month', 'within 90 days', 'within 180 days', 'within a year', 'more than a year']
+DURATION_GROUP_LABELS = ['< 1 day', 'within a week', 'within a month', 'more than a month']
+DURATION_GROUPS = {'< 1 day': '< 1 day',
+                   '1 day': 'within a week', '2 days': 'within a week', '3 days': 'within a week', '4 days': 'within a week',
+                   '5 days': 'within a week', '6 days': 'within a week', '7 days': 'within a week',
+                   'within two weeks': 'within a month', 'within a month': 'within a month'}
+QUARTER_END = {0: '03-31', 1: '06-30', 2: '09-30', 3: '12-31'}
+
+def duration_categories(days):
+    cat = pd.cut(days, bins=DURATION_BINS, labels=DURATION_LABELS, right=True)
+    return cat.fillna('more than a year') # missing durations fail every comparison in the row-wise version and end up in the last category
+
+def duration_groups(categorized):
+    group_codes = np.array([DURATION_GROUP_LABELS.index(DURATION_GROUPS.get(label, 'more than a month')) for label in DURATION_LABELS])
+    codes = categorized.cat.codes.to_numpy()
+    return pd.Series(pd.Categorical.from_codes(group_codes[codes], categories=DURATION_GROUP_LABELS), index=categorized.index)
+
+def quarter_ordinal(ser): # Period[Q] or datetime series -> year*4 + quarter - 1
+    return (ser.dt.year * 4 + ser.dt.quarter - 1).astype('Int64')
+
+def quarter_end_date(ordinals): # quarter ordinal -> 'YYYY-MM-DD' end date of the quarter
+    ordinals = pd.Series(ordinals)
+    uniq = ordinals.dropna().unique()
+    labels = {o: f"{int(o) // 4}-{QUARTER_END[int(o) % 4]}" for o in uniq} # only a few dozen distinct quarters - format each once
+    return ordinals.map(labels)
+
+def cpi_at_quarter_end(cpi_df, ordinals): # CPI of the last month of each quarter, looked up in a dense month-indexed array
+    dates = pd.to_datetime(cpi_df['observation_date'])
+    cpi_months = (dates.dt.year * 12 + dates.dt.month - 1).to_numpy()
+    first = cpi_months.min()
+    table = np.full(cpi_months.max() - first + 1, np.nan)
+    table[cpi_months - first] = cpi_df['CPIAUCSL'].to_numpy(dtype=float)
+
+    q = np.asarray(ordinals, dtype=np.int64)
+    idx = (q // 4) * 12 + (q % 4) * 3 + 2 - first
+    if (idx < 0).any() or (idx >= len(table)).any() or np.isnan(table[idx]).any():
+        raise KeyError("CPI is not available for some quarter end months")
+    return table[idx]
+
+def quarter_key(ser): # Period[Q], datetime or date string series -> quarter ordinal, the join key shared by every quarterly table
+    if isinstance(ser.dtype, pd.PeriodDtype) or pd.api.types.is_datetime64_any_dtype(ser):
+        return quarter_ordinal(ser)
+    uniq = pd.Series(ser.dropna().unique())
+    ordinals = quarter_ordinal(pd.to_datetime(uniq, errors='coerce')) # strings are parsed once per distinct date
+    return ser.map(dict(zip(uniq, ordinals))).astype('Int64')
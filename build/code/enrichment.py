@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+
+
+ROW_ID = '_row'
+
+def narrow_keys(df, cols): # join keys of the wide complaint frame + the position of each row in it
+    keys = df[cols].reset_index(drop=True)
+    keys[ROW_ID] = np.arange(len(df))
+    return keys
+
+def lookup(keys, table, left_on, right_on, columns=None):
+    # left join of a dimension table on the narrow key frame - only the join keys and the requested columns of the table are carried
+    if columns is not None:
+        table = table[list(dict.fromkeys(list(right_on) + list(columns)))]
+    return keys.merge(table, how='left', left_on=left_on, right_on=right_on)
+
+def attach(df, keys):
+    # wide frame rows in key frame order (repeated where a lookup matched several rows) + every column resolved on the key frame
+    wide = df.iloc[keys[ROW_ID].to_numpy()].reset_index(drop=True)
+    for col in keys.columns.drop(ROW_ID):
+        wide[col] = keys[col].array
+    return wide
+
+def dense_grid(table, row_col, col_col):
+    # table holding every (row, col) combination once, sorted by row then col - e.g. zip x year
+    # slot array maps an integer row key straight to its block of the table, so lookups are array indexing instead of a merge
+    cols = table[col_col].to_numpy(dtype=np.int64)
+    first, width = cols.min(), cols.max() - cols.min() + 1
+    rows = table[row_col].to_numpy(dtype=np.int64)[::width]
+    slots = np.full(rows.max() + 1, -1, dtype=np.int64)
+    slots[rows] = np.arange(len(rows))
+    return {'table': table.drop(columns=[row_col, col_col]), 'slots': slots, 'first': first, 'width': width}
+
+def grid_lookup(keys, grid, row_key, col_key):
+    # every value column of the grid at (row_key, col_key) of each key row - missing where a key is missing or outside the grid
+    rows = pd.to_numeric(keys[row_key], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    cols = pd.to_numeric(keys[col_key], errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    valid = (rows >= 0) & (rows < len(grid['slots'])) & (cols >= grid['first']) & (cols < grid['first'] + grid['width']) # False for NaN
+    positions = np.full(len(keys), -1, dtype=np.int64)
+    slot = grid['slots'][rows[valid].astype(np.int64)]
+    positions[valid] = np.where(slot >= 0, slot * grid['width'] + cols[valid].astype(np.int64) - grid['first'], -1)
+    for col in grid['table'].columns:
+        keys[col] = grid['table'][col].array.take(positions, allow_fill=True)
+    return keys
@@ -8,6 +8,8 @@ import matplotlib.pyplot as plt
 
 from matplotlib.lines import Line2D
 
+from table_cache import read_cache
+
 
 
 cPATH = os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "build")
@@ -173,7 +175,7 @@ def plot_category_distribution(dfs, col, labels, savepath, top_n=0, suppress=Fal
     tmpdf = pd.concat(dfs)
     if top_n: # filter top n categories in the whole dataset
         tmpdf = pd.concat(dfs)
-        filled = tmpdf[col].fillna('Missing')
+        filled = tmpdf[col].astype(object).fillna('Missing')
         counts = filled.value_counts()
         if filled.nunique() > top_n:
             top_cats = counts.nlargest(top_n).index
@@ -181,7 +183,7 @@ def plot_category_distribution(dfs, col, labels, savepath, top_n=0, suppress=Fal
         top_cats = tmpdf[col].unique()
 
     def summarize(df, label, cats):
-        filled = df[col].fillna('Missing')
+        filled = df[col].astype(object).fillna('Missing')
         filled = filled.apply(lambda x: x if x in cats else 'Other')
         counts = filled.value_counts()
         counts = counts.reindex(cats, fill_value=0)
@@ -307,19 +309,19 @@ def explore_total_assets():
     for company_type in ['bank', 'credit union', 'bank holding company']:
         subset = df[df['Company type']==company_type]
         print(f"total assets of identified for {subset['Total assets'].notna().sum()} out of {len(subset)} complaints filed to {company_type}")
-        grouped = subset.groupby(['Quarter sent', 'Company']).agg(complaints=('Company', 'count'), assets=('Total assets', 'mean')).reset_index()
-        company_grouped = grouped.groupby(['Company']).agg(complaints=('complaints', 'sum')).reset_index()
+        grouped = subset.groupby(['Quarter sent', 'Company'], observed=True).agg(complaints=('Company', 'count'), assets=('Total assets', 'mean')).reset_index()
+        company_grouped = grouped.groupby(['Company'], observed=True).agg(complaints=('complaints', 'sum')).reset_index()
         print(f"{len(subset)} complaints filed to {company_type} were filed to {len(grouped)} unique {company_type}-quarter pairs for {len(company_grouped)} {company_type}")
         print(f"out of {len(grouped)} {company_type}-quarter pairs, total assets info exists for {grouped['assets'].notna().sum()} company-quarter pairs")
 
-        company_nan_info = grouped.groupby('Company')['assets'].agg(total_quarters='size', non_nan_quarters='count').reset_index()
+        company_nan_info = grouped.groupby('Company', observed=True)['assets'].agg(total_quarters='size', non_nan_quarters='count').reset_index()
         all_nan_companies = company_nan_info[company_nan_info['non_nan_quarters'] == 0]
         print(f"Number of companies with all quarters having missing total assets: {len(all_nan_companies)}")
         all_present_companies = company_nan_info[company_nan_info['non_nan_quarters'] == company_nan_info['total_quarters']]
         print(f"Number of companies with total assets present for ALL quarters: {len(all_present_companies)}")
 
         ### histogram of the number of quarters in which the complaints were sent to each company
-        quarters_per_company = grouped.groupby('Company').size()
+        quarters_per_company = grouped.groupby('Company', observed=True).size()
         counts = quarters_per_company.value_counts().sort_index()
         plt.figure(figsize=(10, 6))
         plt.bar(counts.index, counts.values, edgecolor='black')
@@ -346,9 +348,9 @@ def explore_total_assets():
         plt.savefig(os.path.join(cPATH, 'temp', f'dist_total_assets_{company_type}.png'))
     
     # histogram of distribution of total assets - bank & bhc combined
-    grouped = df[df['Company type'].isin(['bank', 'bank holding company'])].groupby(['Quarter sent', 'Company']).agg(complaints=('Company', 'count'), assets=('Total assets', 'mean')).reset_index()
-    bank = df[df['Company type']=='bank'].groupby(['Quarter sent', 'Company']).agg(complaints=('Company', 'count'), assets=('Total assets', 'mean')).reset_index()
-    bhc = df[df['Company type']=='bank holding company'].groupby(['Quarter sent', 'Company']).agg(complaints=('Company', 'count'), assets=('Total assets', 'mean')).reset_index()
+    grouped = df[df['Company type'].isin(['bank', 'bank holding company'])].groupby(['Quarter sent', 'Company'], observed=True).agg(complaints=('Company', 'count'), assets=('Total assets', 'mean')).reset_index()
+    bank = df[df['Company type']=='bank'].groupby(['Quarter sent', 'Company'], observed=True).agg(complaints=('Company', 'count'), assets=('Total assets', 'mean')).reset_index()
+    bhc = df[df['Company type']=='bank holding company'].groupby(['Quarter sent', 'Company'], observed=True).agg(complaints=('Company', 'count'), assets=('Total assets', 'mean')).reset_index()
 
     fig, axes = plt.subplots(1, 2, figsize=(16, 6), sharey=True)
     axes[0].hist(np.log10(grouped['assets']), bins=20, color='skyblue', alpha=0.6, label='bank')
@@ -368,10 +370,10 @@ def explore_total_assets():
 def plot_real_assets(company_type):
     ### plot quarterly trend of real assets for each company 
     subset = df[df['Company type']==company_type]
-    grouped = (subset.groupby(['Company', 'Quarter sent']).agg(real_assets=('Log real total assets', 'mean')).reset_index())
+    grouped = (subset.groupby(['Company', 'Quarter sent'], observed=True).agg(real_assets=('Log real total assets', 'mean')).reset_index())
     
     plt.figure(figsize=(14, 8))
-    for company, group in grouped.groupby('Company'):
+    for company, group in grouped.groupby('Company', observed=True):
         plt.plot(group['Quarter sent'].dt.to_timestamp(), group['real_assets'], label=company, alpha=0.7)
 
     plt.title(f'Quarterly Log Real Total Assets per Company - {company_type}')
@@ -380,7 +382,7 @@ def plot_real_assets(company_type):
     plt.xticks(rotation=90)
     plt.savefig(os.path.join(cPATH, 'temp', f'quarterly_real_assets_{company_type}.png'))
 
-    company_means = subset.groupby('Company')['Log real total assets'].mean().reset_index(name='mean_log_assets').sort_values('mean_log_assets', ascending=False)
+    company_means = subset.groupby('Company', observed=True)['Log real total assets'].mean().reset_index(name='mean_log_assets').sort_values('mean_log_assets', ascending=False)
     print(f"Company order by mean log real assets ({company_type}):")
     print(company_means)
 
@@ -421,32 +423,13 @@ def check_regulation_criterion():
 
 
 if __name__ == "__main__":
-    ### load dataset
-    df = pd.read_csv(os.path.join(cPATH, 'output', 'complaints_processed.csv'), low_memory=False)
-
-    ### set dtypes
-    df['Date received'] = pd.to_datetime(df['Date received'])
-    df['Date sent to company'] = pd.to_datetime(df['Date sent to company'])
-    df['Consumer complaint narrative'] = df['Consumer complaint narrative'].astype('string')
-    df['Month received'] = pd.to_datetime(df['Month received'])
+    ### load dataset - the typed copy keeps categoricals (incl. the ordered duration/CCPA scales), compact numeric types and dates
+    df = read_cache('complaints_processed', cache_dir=os.path.join(cPATH, 'output'))
     df['Quarter received'] = pd.PeriodIndex(df['Quarter received'], freq='Q')
-    df['Year received'] = df['Year received'].astype('Int64') 
     df['Quarter sent'] = pd.PeriodIndex(df['Quarter sent'], freq='Q')
-    df['Year sent'] = df['Year sent'].astype('Int64')
-    df['State privacy law'] = pd.to_datetime(df['State privacy law'])
-
-    ### set orders of categorical variables with order 
-    duration_order = ['< 1 day', '1 day', '2 days', '3 days', '4 days', '5 days', '6 days', '7 days', 'within two weeks', 
-                      'within a month', 'within 90 days', 'within 180 days', 'within a year', 'more than a year']
-    df['Duration categorized'] = pd.Categorical(df['Duration categorized'], categories=duration_order, ordered=True)
-    group_order = ['< 1 day', 'within a week', 'within a month', 'more than a month']
-    df['Duration grouped'] = pd.Categorical(df['Duration grouped'], categories=group_order, ordered=True)
-    ccpa_order = ['Pre-CCPA', 'CCPA enacted, pre-implement', 'CCPA implemented, pre-CPRA', 'CPRA amended, pre-implementation', 'CPRA implemented']
-    df['CCPA phase at receipt'] = pd.Categorical(df['CCPA phase at receipt'], categories=ccpa_order, ordered=False)
-    df['CCPA phase at sent'] = pd.Categorical(df['CCPA phase at sent'], categories=ccpa_order, ordered=False)
 
     ### regulation variable
-    df['Regulation'] = df['Regulation'].fillna('NA')
+    df['Regulation'] = df['Regulation'].cat.add_categories(['NA']).fillna('NA')
 
     ### split data into complaints with/without narratives for exploratory analysis
     subdf = df[df['With narrative']] # with narrative
@@ -0,0 +1,42 @@
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def node_keys(rssd, quarter_keys): # one int64 per (rssd id, quarter) pair - rssd ids fit in 32 bits
+    return np.asarray(quarter_keys, dtype=np.int64) * 2**32 + np.asarray(rssd, dtype=np.int64)
+
+def ownership_closure(parents, offsprings, quarter_keys):
+    # parent -> every offspring it controls directly or through a chain of relationships, within each quarter
+    # one sparse 0/1 matrix over (rssd id, quarter) nodes - block diagonal by quarter, so all quarters are closed at once
+    src, dst = node_keys(parents, quarter_keys), node_keys(offsprings, quarter_keys)
+    nodes = np.unique(np.concatenate([src, dst]))
+    direct = sparse.csr_matrix((np.ones(len(src)), (np.searchsorted(nodes, src), np.searchsorted(nodes, dst))), shape=(len(nodes), len(nodes)))
+    direct.data[:] = 1 # repeated relationships are summed by the constructor
+    closure = direct
+    while True: # one more level of offsprings per product, until no new pair appears (also ends on ownership cycles)
+        grown = closure + closure @ direct
+        grown.data[:] = 1
+        if grown.nnz == closure.nnz:
+            break
+        closure = grown
+    pairs = closure.tocoo()
+    own = pairs.row != pairs.col # a cycle would make an institution its own offspring
+    closure = sparse.csr_matrix((pairs.data[own], (pairs.row[own], pairs.col[own])), shape=closure.shape)
+    return nodes, closure
+
+def node_vector(nodes, rssd, quarter_keys, values=1.0):
+    # values aligned with the nodes of the closure (the first one for repeated pairs), 0 for nodes without one
+    rssd = pd.to_numeric(pd.Series(rssd), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    quarter_keys = pd.to_numeric(pd.Series(quarter_keys), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    values = np.broadcast_to(np.asarray(values, dtype=float), rssd.shape)
+    known = ~np.isnan(rssd) & ~np.isnan(quarter_keys)
+    pos = pd.Index(nodes).get_indexer(node_keys(rssd[known], quarter_keys[known]))
+    found = pos >= 0
+    pos, first = np.unique(pos[found], return_index=True)
+    out = np.zeros(len(nodes))
+    out[pos] = values[known][found][first]
+    return out
+
+def node_ids(nodes): # (rssd id, quarter key) of every node
+    return nodes % 2**32, nodes // 2**32
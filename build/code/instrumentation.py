@@ -0,0 +1,75 @@
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+import pandas as pd
+
+
+cPATH = os.environ.get("CC_BUILD_DIR", os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "build"))
+
+RECORDS = [] # one dict per measured step of the current run, in execution order
+RECORDS_LOCK = threading.Lock() # steps can finish on several threads at once
+STARTED = time.strftime('%Y-%m-%d %H:%M:%S')
+START = time.perf_counter()
+
+def peak_rss_mb(who=resource.RUSAGE_SELF): # ru_maxrss is reported in bytes on macOS and in kilobytes on linux
+    peak = resource.getrusage(who).ru_maxrss
+    return peak / 2**20 if sys.platform == 'darwin' else peak / 2**10
+
+def frame_stats(obj): # row count and memory footprint of a frame (or of every frame in a tuple/list/dict of them)
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    frames = [f for f in (obj if isinstance(obj, (tuple, list)) else [obj]) if isinstance(f, (pd.DataFrame, pd.Series))]
+    if not frames:
+        return None, None
+    rows = sum(len(f) for f in frames)
+    mb = sum(f.memory_usage(index=True, deep=True).sum() if isinstance(f, pd.DataFrame) else f.memory_usage(index=True, deep=True) for f in frames) / 2**20
+    return rows, round(mb, 2)
+
+@contextmanager
+def measure(step, inputs=None):
+    # with measure('ffiec lookup', keys) as m:
+    #     keys = lookup(...)
+    #     m['output'] = keys
+    rec = {'step': step}
+    rec['rows_in'], rec['mb_in'] = frame_stats(inputs)
+    peak_before = peak_rss_mb()
+    start = time.perf_counter()
+    try:
+        yield rec
+    finally:
+        rec['seconds'] = round(time.perf_counter() - start, 3)
+        rec['peak_rss_mb'] = round(peak_rss_mb(), 1)
+        rec['peak_rss_growth_mb'] = round(rec['peak_rss_mb'] - peak_before, 1) # > 0 only when this step set a new process peak
+        rec['children_peak_rss_mb'] = round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1) # loader worker processes
+        rec['rows_out'], rec['mb_out'] = frame_stats(rec.pop('output', None))
+        add_records([rec])
+
+def add_records(records):
+    with RECORDS_LOCK:
+        RECORDS.extend(records)
+
+def call_recorded(func, **kwargs):
+    # runs func in a worker process and hands back its result with the steps measured there, to be merged into the report with add_records
+    with RECORDS_LOCK:
+        first = len(RECORDS) # a pool worker process can run several calls
+    result = func(**kwargs)
+    with RECORDS_LOCK:
+        records = [dict(rec, pid=os.getpid()) for rec in RECORDS[first:]]
+    return result, records
+
+def write_report(script, report_dir=None):
+    # machine-readable run report - one file per run, so consecutive builds can be compared step by step
+    report_dir = report_dir or os.path.join(cPATH, 'temp', 'run_reports')
+    os.makedirs(report_dir, exist_ok=True)
+    path = os.path.join(report_dir, f"{script}_{time.strftime('%Y%m%d-%H%M%S')}.json")
+    report = {'script': script, 'started': STARTED, 'finished': time.strftime('%Y-%m-%d %H:%M:%S'),
+              'total_seconds': round(time.perf_counter() - START, 3), 'peak_rss_mb': round(peak_rss_mb(), 1), 'steps': RECORDS}
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"run report saved to {path}")
+    return path
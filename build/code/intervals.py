@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+
+
+def quarter_ends(start='2010-01-01', end='2025-06-30'):
+    return pd.date_range(start=start, end=end, freq='QE')
+
+def expand_intervals(df, start_col, end_col, points, point_col='quarter'):
+    # repeat every [start, end] row once for each of the (sorted) points it covers, without building the cartesian product
+    points = pd.DatetimeIndex(points)
+    first = points.searchsorted(df[start_col].to_numpy(), side='left') # first point >= start (NaT start covers nothing)
+    last = points.searchsorted(df[end_col].to_numpy(), side='right') # one past the last point <= end
+    counts = np.clip(last - first, 0, None)
+
+    rows = np.repeat(np.arange(len(df)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts) # position of each output row within its interval
+    out = df.iloc[rows].reset_index(drop=True)
+    out[point_col] = points[np.repeat(first, counts) + offsets]
+    return out
+
+# sort key of an interval record: key code * DAY_SPAN + days since 1970-01-01 shifted by DAY_OFFSET (datetime64[ns] spans 1677-2262, about +-106,000 days)
+DAY_OFFSET = 2**17
+DAY_SPAN = 2**18
+
+def day_numbers(ser): # datetimes or date strings -> int64 days since 1970-01-01 (NaT -> -1 after the shift, i.e. never in force)
+    days = pd.to_datetime(pd.Series(ser), errors='coerce').to_numpy(dtype='datetime64[D]')
+    return np.where(np.isnat(days), -DAY_OFFSET - 1, days.astype(np.int64))
+
+def interval_index(df, key_col, start_col, end_col):
+    # records sorted by key and start date, so that the record of a key in force on a date is found with one binary search
+    # where the records of a key overlap, the one starting last among those in force wins
+    df = df[df[key_col].notna() & df[start_col].notna()]
+    ids = pd.to_numeric(df[key_col]).to_numpy(dtype=np.int64)
+    keys = np.unique(ids)
+    sort_key = np.searchsorted(keys, ids) * DAY_SPAN + day_numbers(df[start_col]) + DAY_OFFSET
+    order = np.argsort(sort_key, kind='stable')
+    ends = day_numbers(df[end_col])[order]
+    # latest end among the records of the key up to each one - a date past the end of a record but not past its reach is covered by an earlier record
+    base = sort_key[order] // DAY_SPAN * DAY_SPAN # the key code is added so the running maximum restarts at every key
+    reach = np.maximum.accumulate(base + ends + DAY_OFFSET) - base - DAY_OFFSET if len(ends) else ends
+    return {'keys': keys, 'sort_key': sort_key[order], 'ends': ends, 'reach': reach, 'records': df.iloc[order].reset_index(drop=True)}
+
+def as_of(index, keys, dates, columns):
+    # columns of the record in force for every (key, date) query - missing where the key is unknown or no record covers the date
+    out_index = keys.index if isinstance(keys, pd.Series) else None
+    keys = pd.to_numeric(pd.Series(keys), errors='coerce').to_numpy(dtype=float, na_value=np.nan)
+    days = day_numbers(dates)
+    positions = np.full(len(keys), -1)
+    if len(index['keys']):
+        known = ~np.isnan(keys)
+        codes = np.minimum(np.searchsorted(index['keys'], np.nan_to_num(keys, nan=-1).astype(np.int64)), len(index['keys']) - 1)
+        known &= index['keys'][codes] == keys
+        candidate = np.searchsorted(index['sort_key'], codes * DAY_SPAN + days + DAY_OFFSET, side='right') - 1 # last record of the key starting on or before the date
+        found = known & (candidate >= 0)
+        found[found] &= index['sort_key'][candidate[found]] // DAY_SPAN == codes[found]
+        covered = found.copy()
+        covered[found] = index['ends'][candidate[found]] >= days[found]
+        pending = found & ~covered
+        pending[pending] = index['reach'][candidate[pending]] >= days[pending]
+        while pending.any(): # overlapping records - step back to the last one starting before the date that still covers it
+            candidate[pending] -= 1
+            covered[pending] = index['ends'][candidate[pending]] >= days[pending]
+            pending &= ~covered
+        positions[covered] = candidate[covered]
+    records = index['records']
+    return pd.DataFrame({col: records[col].array.take(positions, allow_fill=True) for col in columns}, index=out_index)
@@ -5,6 +5,8 @@ import zipfile
 import pandas as pd
 from urllib.parse import quote
 
+from instrumentation import measure, write_report
+
 
 cPATH = os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "build")
 baseurl = "https://www2.census.gov/programs-surveys/acs/summary_file/"
@@ -149,6 +151,7 @@ def merging_ACS_dataset(savedir, level='zcta'):
 
         dfs = pd.concat(dfs, ignore_index=True)
         dfs.to_csv(os.path.join(savedir, "ACS5YR_combined.csv"), index=False)
+        return dfs
 
 def get_zcta520_zcta510_match(savedir):
     print("Downloading relationship file: zcta520-zcta510")
@@ -204,7 +207,9 @@ def mapping_zip_with_zcta(ACSdir, crosswalkdir):
         if crosswalk['zcta'].dtype == 'object':
             crosswalk['zcta'] = pd.to_numeric(crosswalk['zcta'], errors='coerce').astype('Int64')
 
-        acs_new = acs.merge(crosswalk[['zip', 'zcta']], how='left', left_on='zip code tabulation area', right_on='zcta')
+        with measure(f'zip-zcta mapping {year}', acs) as m:
+            acs_new = acs.merge(crosswalk[['zip', 'zcta']], how='left', left_on='zip code tabulation area', right_on='zcta')
+            m['output'] = acs_new
         acs_new.to_csv(os.path.join(ACSdir, f'ACS5YR_{str(year)}zip.csv'), index=False)
 
 
@@ -215,15 +220,21 @@ if __name__ == "__main__":
     ### for zip-zcta level matching
     ACSpath = os.path.join(cPATH, 'temp', 'ACSdataset')
     crosswalkpath = os.path.join(cPATH, 'temp', 'crosswalk')
-    get_ACS_dataset_with_url(ACSpath)
-    get_zip_zcta_crosswalk(crosswalkpath)
+    with measure('download acs'):
+        get_ACS_dataset_with_url(ACSpath)
+    with measure('download zip-zcta crosswalk'):
+        get_zip_zcta_crosswalk(crosswalkpath)
     mapping_zip_with_zcta(ACSpath, crosswalkpath)
-    merging_ACS_dataset(ACSpath)
+    with measure('merge acs years') as m:
+        m['output'] = merging_ACS_dataset(ACSpath)
     '''
 
     ### for zip-county-zcta level matching
     ACSpath = os.path.join(cPATH, 'temp', 'ACSdataset_countylvl')
-    get_ACS_dataset_with_url(ACSpath, level='county')
-    merging_ACS_dataset(ACSpath, level='county')
+    with measure('download acs (county)'):
+        get_ACS_dataset_with_url(ACSpath, level='county')
+    with measure('merge acs years (county)') as m:
+        m['output'] = merging_ACS_dataset(ACSpath, level='county')
+    write_report('merging_ACS_dataset')
 
 
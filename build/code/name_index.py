@@ -0,0 +1,50 @@
+import re
+import pandas as pd
+
+from date_features import quarter_key
+
+
+# applied to upper-cased names whose punctuation has been removed, token by token
+ABBREVIATIONS = {'FCU': 'FEDERAL CREDIT UNION', 'CU': 'CREDIT UNION', 'NATL': 'NATIONAL', 'ASSN': 'ASSOCIATION', 'BK': 'BANK', 'SVGS': 'SAVINGS', '&': 'AND'}
+LEGAL_SUFFIXES = [('NATIONAL', 'ASSOCIATION'), ('INCORPORATED',), ('INC',), ('CORPORATION',), ('CORP',), ('COMPANY',), ('CO',), ('LLC',), ('LTD',),
+                  ('LP',), ('PLC',), ('NA',)]
+SOURCE_PRIORITY = ['nic', 'ffiec', 'ncua', 'cfpb'] # when several sources know a name in a quarter, the first one wins
+
+def normalize_name(name):
+    name = re.sub(r'(?<=\b[A-Z])\.(?=[A-Z]\b)|\.$', '', name.upper()) # N.A. -> NA, F.S.B. -> FSB
+    tokens = re.sub(r'[^A-Z0-9&]+', ' ', name.replace('&', ' & ')).split()
+    tokens = ' '.join(ABBREVIATIONS.get(t, t) for t in tokens).split()
+    if tokens and tokens[0] == 'THE':
+        tokens = tokens[1:]
+    stripped = True
+    while stripped: # legal forms can be stacked, e.g. 'CO INC'
+        stripped = False
+        for suffix in LEGAL_SUFFIXES:
+            if len(tokens) > len(suffix) and tuple(tokens[-len(suffix):]) == suffix:
+                tokens, stripped = tokens[:-len(suffix)], True
+    return ' '.join(tokens)
+
+def normalize_names(ser): # vectorized over the distinct names of the column
+    uniq = ser.dropna().unique()
+    return ser.map({name: normalize_name(str(name)) for name in uniq}).astype('string')
+
+def build_name_index(tables):
+    # tables: {source: (frame, name column, rssd column, quarter column)} -> one RSSD per (normalized name, quarter)
+    entries = []
+    for source, (frame, name_col, rssd_col, quarter_col) in tables.items():
+        part = frame[[name_col, rssd_col, quarter_col]].dropna()
+        part = pd.DataFrame({'Name key': normalize_names(part[name_col]), 'Quarter key': quarter_key(part[quarter_col]),
+                             'RSSD': pd.to_numeric(part[rssd_col], errors='coerce').astype('Int64'), 'source': source})
+        entries.append(part[part['RSSD'].notna() & (part['RSSD'] > 0)].drop_duplicates())
+    entries = pd.concat(entries, ignore_index=True)
+
+    # keep the highest priority source of every name-quarter, and drop names that stay ambiguous within that source
+    entries['priority'] = entries['source'].map({source: i for i, source in enumerate(SOURCE_PRIORITY)})
+    entries = entries[entries['priority'] == entries.groupby(['Name key', 'Quarter key'])['priority'].transform('min')]
+    entries = entries.drop_duplicates(['Name key', 'Quarter key', 'RSSD']).drop_duplicates(['Name key', 'Quarter key'], keep=False)
+    return entries.drop(columns='priority').sort_values(['Name key', 'Quarter key']).reset_index(drop=True)
+
+def lookup_by_key(table, key_cols, value_cols, query):
+    # value_cols of the table row matching each row of query on key_cols (table keys are unique) - no merge, rows keep the query index
+    positions = pd.MultiIndex.from_frame(table[key_cols]).get_indexer(pd.MultiIndex.from_frame(query))
+    return pd.DataFrame({col: table[col].array.take(positions, allow_fill=True) for col in value_cols}, index=query.index)
@@ -0,0 +1,196 @@
+import glob
+import hashlib
+import inspect
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_EXCEPTION, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+from instrumentation import add_records, call_recorded, measure
+from table_cache import has_cache
+
+
+cPATH = os.environ.get("CC_BUILD_DIR", os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "build"))
+
+# a stage is a dict with
+#   name    : stage name, also used for its manifest temp/stages/{name}.json
+#   func    : loader called as func(override=..., **params)
+#   params  : keyword arguments of func (part of the fingerprint)
+#   inputs  : glob patterns of the input files (their content is part of the fingerprint)
+#   outputs : table_cache names written by func
+#   code    : functions whose source is part of the fingerprint (defaults to [func]) - with the helpers of this code directory they call and the
+#             module level constants they read (e.g. table_cache.SCHEMAS), so that a change in a helper or a schema invalidates the stage too
+#   deps    : names of upstream stages whose fingerprints are part of the fingerprint
+#   incremental : func accepts incremental=..., which is set when only the input files changed (code/params changes need a full rebuild)
+#   executor : 'process' runs func in a worker process when stages run concurrently (CPU-bound pandas/python parsing), otherwise it runs in a thread
+#              (Excel and I/O-bound loaders, and loaders that already fan their files out to a process pool)
+
+def stage_dir():
+    return os.path.join(cPATH, 'temp', 'stages')
+
+def file_digest(path, known): # content hash, recomputed only when size or mtime changed
+    stat = os.stat(path)
+    entry = known.get(path)
+    if entry and entry['size'] == stat.st_size and entry['mtime'] == stat.st_mtime:
+        return entry['sha1']
+    h = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 24), b''):
+            h.update(block)
+    known[path] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha1': h.hexdigest()}
+    return known[path]['sha1']
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def referenced_names(code): # global names read by a code object and the functions/comprehensions nested in it
+    names = set(code.co_names)
+    for const in code.co_consts:
+        if inspect.iscode(const):
+            names |= referenced_names(const)
+    return names
+
+def code_closure(funcs):
+    # sources of funcs + every function of this code directory they reach + reprs of the constants (dicts, lists, ...) on the way
+    seen, parts, todo = set(), {}, list(funcs)
+    while todo:
+        func = todo.pop()
+        key = f"{func.__module__}.{func.__qualname__}"
+        if key in seen:
+            continue
+        seen.add(key)
+        parts[key] = inspect.getsource(func)
+        for name in referenced_names(func.__code__):
+            obj = func.__globals__.get(name)
+            if inspect.isfunction(obj):
+                try:
+                    local = os.path.dirname(os.path.abspath(inspect.getsourcefile(obj))) == CODE_DIR
+                except TypeError:
+                    local = False
+                if local:
+                    todo.append(obj)
+            elif isinstance(obj, (dict, list, tuple, set, str, int, float)) and not name.startswith('__'):
+                parts[f"{func.__module__}.{name}"] = repr(obj)
+    return [parts[key] for key in sorted(parts)]
+
+def stage_fingerprint(stage, known, upstream):
+    def digest(items):
+        return hashlib.sha1('\n'.join(items).encode()).hexdigest()
+
+    files = sorted(itertools.chain.from_iterable(glob.glob(pattern) for pattern in stage.get('inputs', [])))
+    return {
+        'inputs': digest([f"{path}:{file_digest(path, known)}" for path in files]),
+        'params': digest([json.dumps(stage.get('params', {}), sort_keys=True, default=str)]),
+        'code': digest(code_closure(stage.get('code', [stage['func']]))),
+        'deps': digest([upstream[dep] for dep in stage.get('deps', [])]),
+    }
+
+def load_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path) as f:
+        return json.load(f)
+
+def save_json(obj, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(obj, f, indent=2)
+
+def stale_reasons(stage, parts, force=()):
+    manifest = load_json(os.path.join(stage_dir(), f"{stage['name']}.json"), None)
+    reasons = []
+    if stage['name'] in force:
+        reasons.append('forced')
+    if manifest is None:
+        reasons.append('no previous run')
+    else:
+        reasons.extend(f"{part} changed" for part, value in parts.items() if manifest['parts'].get(part) != value)
+    missing = [name for name in stage.get('outputs', []) if not has_cache(name)]
+    if missing:
+        reasons.append(f"missing outputs {missing}")
+    return reasons
+
+class PendingResults(dict): # stage name -> future of its result - reading a stage waits for that stage only
+    def __getitem__(self, name):
+        return dict.__getitem__(self, name).result()
+
+    def close(self): # stages not started yet never start and the pools are shut down - for callers that stop before reading every stage
+        shut_down(list(self.values()), *self.pools)
+
+def process_pool(max_workers=None):
+    # worker processes are spawned, not forked - a child forked while other threads (concurrent stages) hold a lock waits on it forever
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+
+def in_process(processes, func, **kwargs): # the steps measured in the worker process are merged into this run's report
+    result, records = processes.submit(call_recorded, func, **kwargs).result()
+    add_records(records)
+    return result
+
+def run_stage(stage, parts, fingerprint, reasons, call=None):
+    start = time.perf_counter()
+    kwargs = dict(stage.get('params', {}))
+    if stage.get('incremental'):
+        kwargs['incremental'] = reasons == ['inputs changed']
+    with measure(f"stage {stage['name']}") as m:
+        result = call(stage['func'], override=bool(reasons), **kwargs) if call else stage['func'](override=bool(reasons), **kwargs)
+        m['output'] = result
+        m['rebuilt'] = bool(reasons)
+    if reasons:
+        save_json({'parts': parts, 'fingerprint': fingerprint, 'finished': time.strftime('%Y-%m-%d %H:%M:%S')},
+                  os.path.join(stage_dir(), f"{stage['name']}.json"))
+    print(f"{stage['name']}: {'rebuilt (' + ', '.join(reasons) + ')' if reasons else 'loaded from cache'} in {time.perf_counter() - start:.1f}s")
+    return result
+
+def run_stages(stages, dry_run=False, force=(), concurrent=False, max_processes=None):
+    # run every stage, recomputing only those whose inputs, parameters, code or upstream stages changed since the last run
+    # concurrent: stages start as soon as their upstream stages finished and a PendingResults is returned right away, so that the caller
+    # can read its other inputs meanwhile and use every stage result as soon as it is ready - the first failing stage fails the stages downstream
+    # of it, cancels the work not started yet and shuts both pools down, and its exception is raised when the caller reads it - a caller that
+    # fails on its own calls close() so the stages still waiting never start
+    known_path = os.path.join(stage_dir(), 'file_hashes.json')
+    known = load_json(known_path, {})
+    fingerprints = {}
+    results = PendingResults() if concurrent else {}
+    if concurrent:
+        threads, processes = ThreadPoolExecutor(max_workers=len(stages) + 1), process_pool(max_processes)
+        results.pools = (threads, processes)
+
+    try:
+        for stage in stages: # fingerprints are computed up front, in stage order - only running the stages is concurrent
+            parts = stage_fingerprint(stage, known, fingerprints)
+            fingerprints[stage['name']] = hashlib.sha1(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+            reasons = stale_reasons(stage, parts, force)
+
+            if dry_run:
+                print(f"{stage['name']}: {'would run (' + ', '.join(reasons) + ')' if reasons else 'up to date'}")
+            elif concurrent:
+                upstream = [dict.__getitem__(results, dep) for dep in stage.get('deps', [])]
+                call = (lambda func, **kw: in_process(processes, func, **kw)) if stage.get('executor') == 'process' else None
+                def start(stage=stage, parts=parts, reasons=reasons, upstream=upstream, call=call):
+                    for future in upstream: # upstream stages write the caches this stage reads - a failed one fails this stage too
+                        future.result()
+                    return run_stage(stage, parts, fingerprints[stage['name']], reasons, call)
+                results[stage['name']] = threads.submit(start)
+            else:
+                results[stage['name']] = run_stage(stage, parts, fingerprints[stage['name']], reasons)
+        save_json(known, known_path)
+    except BaseException:
+        if concurrent:
+            results.close()
+        raise
+    if concurrent:
+        threads.submit(supervise, results)
+    return results
+
+def supervise(results): # runs next to the stages - the pools are shut down once every stage finished or one failed
+    try:
+        wait(list(results.values()), return_when=FIRST_EXCEPTION)
+    finally:
+        results.close()
+
+def shut_down(futures, threads, processes):
+    for future in futures: # stages already running finish, the others never start
+        future.cancel()
+    processes.shutdown(wait=True, cancel_futures=True)
+    threads.shutdown(wait=False, cancel_futures=True)
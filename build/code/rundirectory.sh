@@ -24,8 +24,12 @@ for ext in $EXTENSIONS; do
     cp "$SRC_DIR"/*.$ext "$DST_DIR"/
 done
 
-EXTENSIONS="csv xlsx json"
+EXTENSIONS="csv xlsx json parquet"
 
 for ext in $EXTENSIONS; do
     cp "$SRC_DIR"/*.$ext "$ANLS_DIR"/
 done
+
+# partitioned processed complaints (one parquet file per quarter sent x company type + manifest.json)
+rm -rf "$ANLS_DIR"/complaints_processed
+cp -R "$SRC_DIR"/complaints_processed "$ANLS_DIR"/
@@ -0,0 +1,427 @@
+import argparse
+import json
+import os
+import time
+import numpy as np
+import pandas as pd
+
+
+cPATH = os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "build")
+
+# synthetic stand-ins for every input of build_data.py, laid out like the real build directory (input/, temp/ACSdataset_countylvl, output/)
+# so that the build can be timed offline at any scale - see benchmark_build.py
+SCALES = {'100K': 100_000, '1M': 1_000_000, '5M': 5_000_000, '20M': 20_000_000} # number of complaints
+
+CREDIT_BUREAUS = ['EXPERIAN INFORMATION SOLUTIONS INC.', 'TRANSUNION INTERMEDIATE HOLDINGS, INC.', 'EQUIFAX, INC.']
+STATE_FIPS = {'AL': 1, 'AK': 2, 'AZ': 4, 'AR': 5, 'CA': 6, 'CO': 8, 'CT': 9, 'DE': 10, 'DC': 11, 'FL': 12, 'GA': 13, 'HI': 15, 'ID': 16, 'IL': 17,
+              'IN': 18, 'IA': 19, 'KS': 20, 'KY': 21, 'LA': 22, 'ME': 23, 'MD': 24, 'MA': 25, 'MI': 26, 'MN': 27, 'MS': 28, 'MO': 29, 'MT': 30,
+              'NE': 31, 'NV': 32, 'NH': 33, 'NJ': 34, 'NM': 35, 'NY': 36, 'NC': 37, 'ND': 38, 'OH': 39, 'OK': 40, 'OR': 41, 'PA': 42, 'RI': 44,
+              'SC': 45, 'SD': 46, 'TN': 47, 'TX': 48, 'UT': 49, 'VT': 50, 'VA': 51, 'WA': 53, 'WV': 54, 'WI': 55, 'WY': 56, 'PR': 72}
+STATE_WEIGHTS = {'CA': 12, 'TX': 9, 'FL': 9, 'NY': 6, 'GA': 5, 'IL': 4, 'PA': 4, 'NC': 3, 'OH': 3, 'NJ': 3, 'VA': 3, 'MD': 3} # others weigh 1
+NAME_WORDS = ['FIRST', 'CITIZENS', 'PEOPLES', 'FARMERS', 'COMMUNITY', 'SECURITY', 'HERITAGE', 'PIONEER', 'UNITED', 'AMERICAN', 'HOME', 'VALLEY',
+              'SUMMIT', 'LIBERTY', 'EAGLE', 'RIVER', 'LAKE', 'MOUNTAIN', 'COASTAL', 'PRAIRIE', 'CENTRAL', 'NORTHERN', 'SOUTHERN', 'WESTERN',
+              'EASTERN', 'GUARANTY', 'FIDELITY', 'MERCHANTS', 'FRONTIER', 'BRIDGE']
+CITIES = ['SPRINGFIELD', 'FRANKLIN', 'GREENVILLE', 'BRISTOL', 'CLINTON', 'FAIRVIEW', 'SALEM', 'MADISON', 'GEORGETOWN', 'ARLINGTON', 'ASHLAND',
+          'BURLINGTON', 'CLAYTON', 'DAYTON', 'DOVER', 'HUDSON', 'JACKSON', 'KINGSTON', 'LEBANON', 'MARION', 'MILTON', 'NEWPORT', 'OXFORD',
+          'RICHMOND', 'SHELBY', 'TROY', 'WINCHESTER', 'AUBURN', 'CHESTER', 'LANCASTER']
+NAME_PATTERNS = {
+    'bank': ['{a} {b} BANK, NATIONAL ASSOCIATION', '{a} {b} BANK OF {city}', '{a} {b} SAVINGS BANK'],
+    'credit union': ['{a} {b} FEDERAL CREDIT UNION', '{a} {b} CREDIT UNION'],
+    'bank holding company': ['{a} {b} BANCSHARES, INC.', '{a} {b} FINANCIAL CORPORATION', '{a} {b} BANCORP'],
+    'nic other': ['{a} {b} INSURANCE AGENCY OF {city}', '{a} {b} SECURITIES OF {city}', '{a} {b} TRUST COMPANY OF {city}'],
+    'non bank': ['{a} {b} RECOVERY SERVICES LLC', '{a} {b} MORTGAGE COMPANY', '{a} {b} AUTO FINANCE, INC.', '{a} {b} COLLECTIONS LLC'],
+    'scra': ['{a} {b} Consumer Reporting LLC', '{a} {b} Screening Services, Inc.'],
+    'data broker': ['{a} {b} Data Inc.', '{a} {b} Marketing Solutions LLC'],
+}
+# (charter type, entity type) drawn for each institution type of NIC
+NIC_CODES = {'bank': [(200, 'NAT'), (200, 'SMB'), (300, 'NMB'), (320, 'SSB')], 'credit union': [(330, 'FCU'), (330, 'SCU')],
+             'bank holding company': [(500, 'BHC'), (500, 'FHD'), (500, 'SLHC')], 'nic other': [(550, 'IHC'), (700, 'SEC'), (610, 'NTC')]}
+
+# (product, sub-product, issue, sub-issue, weight) - the first list is filed against consumer reporting companies, the second against everyone else
+REPORTING_ISSUES = [
+    ('Credit reporting, credit repair services, or other personal consumer reports', 'Credit reporting', 'Incorrect information on your report', 'Information belongs to someone else', 30),
+    ('Credit reporting, credit repair services, or other personal consumer reports', 'Credit reporting', 'Incorrect information on your report', 'Old information reappears or never goes away', 6),
+    ('Credit reporting, credit repair services, or other personal consumer reports', 'Credit reporting', 'Incorrect information on your report', 'Account status incorrect', 10),
+    ('Credit reporting, credit repair services, or other personal consumer reports', 'Credit reporting', 'Improper use of your report', 'Reporting company used your report improperly', 25),
+    ('Credit reporting, credit repair services, or other personal consumer reports', 'Credit reporting', "Problem with a credit reporting company's investigation into an existing problem", 'Their investigation did not fix an error on your report', 15),
+    ('Credit reporting, credit repair services, or other personal consumer reports', 'Other personal consumer report', 'Improper use of your report', 'Credit inquiries on your report that you don\'t recognize', 4),
+    ('Credit reporting', None, 'Incorrect information on credit report', 'Reinserted previously deleted info', 2),
+    ('Credit reporting', None, 'Incorrect information on credit report', 'Information is not mine', 5),
+    ('Credit reporting', None, "Credit reporting company's investigation", 'Problem with investigation', 3),
+]
+OTHER_ISSUES = [
+    ('Debt collection', 'I do not know', 'Attempts to collect debt not owed', 'Debt is not yours', 20),
+    ('Debt collection', 'Credit card debt', 'Written notification about debt', "Didn't receive enough information to verify debt", 8),
+    ('Mortgage', 'Conventional home mortgage', 'Trouble during payment process', None, 10),
+    ('Checking or savings account', 'Checking account', 'Managing an account', 'Deposits and withdrawals', 15),
+    ('Credit card or prepaid card', 'General-purpose credit card or charge card', 'Problem with a purchase shown on your statement', 'Credit card company isn\'t resolving a dispute about a purchase on your statement', 12),
+    ('Credit card or prepaid card', 'General-purpose credit card or charge card', 'Incorrect information on your report', 'Old information reappears or never goes away', 2),
+    ('Vehicle loan or lease', 'Loan', 'Managing the loan or lease', 'Billing problem', 5),
+    ('Student loan', 'Federal student loan servicing', 'Dealing with your lender or servicer', 'Trouble with how payments are being handled', 4),
+]
+NARRATIVE_SENTENCES = [
+    'I have disputed this account several times and it is still reporting on my credit report.',
+    'On XX/XX/XXXX I sent a letter to XXXX requesting that they verify this debt.',
+    'This account does not belong to me and I have never opened an account with this company.',
+    'The information was deleted last year but it reappeared on my report this month.',
+    'They keep calling me at work even after I asked them to stop.',
+    'My payment of {$200.00} was received on time but it was reported as late.',
+    'Under the Fair Credit Reporting Act they are required to conduct a reasonable investigation.',
+    'I am a victim of identity theft and filed a report with the police.',
+    'The company did not respond to my dispute within 30 days.',
+    'Please remove these inquiries that I did not authorize.',
+    'I requested a copy of the original contract and never received it.',
+    'This is causing me to be denied for a mortgage and an auto loan.',
+]
+
+def universe_sizes(n_complaints): # institutions, zip codes and counties grow with the square root of the number of complaints
+    f = np.sqrt(n_complaints / 1_000_000)
+    return {'bank': int(3000 * f), 'credit union': int(2500 * f), 'bank holding company': int(800 * f), 'nic other': int(20000 * f),
+            'non bank': int(4000 * f), 'scra': 40, 'data broker': 300, 'zips': min(int(12000 * f), 40000), 'counties': min(int(1500 * f), 3000)}
+
+def unique_names(rng, n, patterns):
+    # n distinct names built from the word pools (numbered once a combination repeats)
+    pattern = rng.integers(0, len(patterns), n)
+    a, b, city = (rng.integers(0, len(pool), n) for pool in (NAME_WORDS, NAME_WORDS, CITIES))
+    names = pd.Series([patterns[p].format(a=NAME_WORDS[i], b=NAME_WORDS[j], city=CITIES[k]) for p, i, j, k in zip(pattern, a, b, city)])
+    rank = names.groupby(names).cumcount()
+    return names.where(rank == 0, names + ' ' + (rank + 1).astype(str)).tolist()
+
+def random_dates(rng, n, start, end): # uniform over the days of [start, end]
+    start, end = pd.Timestamp(start), pd.Timestamp(end)
+    return start + pd.to_timedelta(rng.integers(0, (end - start).days + 1, n), unit='D')
+
+def complaint_variant(name): # how the CFPB may spell an institution differently from its legal name - resolved by the name index
+    for legal, short in [(', NATIONAL ASSOCIATION', ', N.A.'), ('FEDERAL CREDIT UNION', 'FCU'), (', INC.', ' INC')]:
+        if name.endswith(legal):
+            return name[:-len(legal)] + short
+    return 'THE ' + name
+
+def build_institutions(rng, sizes):
+    # one row per institution with its current (legal) name, NIC codes, location, lifetime and base size
+    frames = []
+    for kind in ['bank', 'credit union', 'bank holding company', 'nic other', 'non bank', 'scra', 'data broker']:
+        n = sizes[kind]
+        inst = pd.DataFrame({'kind': kind, 'name': unique_names(rng, n, NAME_PATTERNS[kind])})
+        if kind in NIC_CODES:
+            codes = [NIC_CODES[kind][i] for i in rng.integers(0, len(NIC_CODES[kind]), n)]
+            inst['CHTR_TYPE_CD'], inst['ENTITY_TYPE'] = [c for c, _ in codes], [e for _, e in codes]
+            if kind == 'bank': # national banks carry the ', NATIONAL ASSOCIATION' form
+                nat = inst['name'].str.endswith(', NATIONAL ASSOCIATION')
+                inst.loc[nat, ['CHTR_TYPE_CD', 'ENTITY_TYPE']] = [200, 'NAT']
+        frames.append(inst)
+    inst = pd.concat(frames, ignore_index=True)
+    n = len(inst)
+
+    inst['#ID_RSSD'] = rng.choice(5_000_000, n, replace=False) + 1
+    inst['CITY'] = [CITIES[i] for i in rng.integers(0, len(CITIES), n)]
+    inst['STATE_CD'] = rng.choice(list(STATE_FIPS), n)
+    new = rng.random(n) < 0.1 # chartered during the sample period
+    inst['start'] = random_dates(rng, n, '1950-01-01', '2010-12-31').where(~new, random_dates(rng, n, '2012-01-01', '2020-12-31'))
+    closed = (rng.random(n) < 0.15) & ~new
+    inst['end'] = random_dates(rng, n, '2012-06-30', '2024-12-31').where(closed, pd.NaT)
+
+    # renamed institutions keep their former name in an earlier NIC record, and some banks share a legal name with another bank
+    renamed = (rng.random(n) < 0.08) & inst['kind'].isin(['bank', 'credit union', 'bank holding company'])
+    renamed = (renamed & (inst['end'].isna() | (inst['end'] > pd.Timestamp('2023-01-01')))).to_numpy()
+    first = inst['start'].clip(lower=pd.Timestamp('2013-01-01')) + pd.Timedelta(days=90) # the former name is in use for at least a quarter
+    last = pd.Timestamp('2022-12-31')
+    inst['renamed'] = (first + (last - first) * rng.random(n)).dt.normalize().where(renamed, pd.NaT)
+    inst['former name'] = None
+    has_former = inst['renamed'].notna()
+    inst.loc[has_former, 'former name'] = [f'{name.split()[0]} {w} {name.split(" ", 2)[-1]}' for name, w in
+                                           zip(inst.loc[has_former, 'name'], rng.choice(NAME_WORDS, has_former.sum()))]
+    banks = inst.index[inst['kind'] == 'bank']
+    shared = rng.choice(banks, int(len(banks) * 0.03), replace=False)
+    inst.loc[shared, 'name'] = inst.loc[rng.choice(banks, len(shared)), 'name'].to_numpy()
+
+    # base size in thousands of dollars, grown quarter by quarter in the call reports
+    inst['assets'] = np.exp(rng.normal(12.2, 1.6, n)) * np.where(inst['kind'] == 'bank holding company', 4, 1)
+    inst['growth'] = rng.normal(0.012, 0.01, n)
+    inst['CU_NUMBER'] = np.where(inst['kind'] == 'credit union', np.arange(n) + 60000, -1)
+    return inst
+
+def nic_date(ser): # NIC writes ongoing records with the 12/31/9999 end date
+    return ser.dt.strftime('%m/%d/%Y').fillna('12/31/9999')
+
+def write_nic(inst, root, rng):
+    nic = inst[inst['kind'].isin(list(NIC_CODES))]
+    current = nic.assign(D_DT_START=nic['start'].where(nic['renamed'].isna(), nic['renamed']), D_DT_END=nic['end'], NM_LGL=nic['name'])
+    former = nic[nic['renamed'].notna()]
+    former = former.assign(D_DT_START=former['start'], D_DT_END=former['renamed'] - pd.Timedelta(days=1), NM_LGL=former['former name'])
+    records = pd.concat([current, former], ignore_index=True)
+    records['CHTR_TYPE_CD'] = records['CHTR_TYPE_CD'].astype(int)
+    records['ID_FDIC_CERT'] = rng.integers(1, 60000, len(records))
+    records['ZIP_CD'] = rng.integers(1001, 99950, len(records))
+    records['D_DT_START'], records['D_DT_END'] = nic_date(records['D_DT_START']), nic_date(records['D_DT_END'])
+    columns = ['#ID_RSSD', 'CHTR_TYPE_CD', 'ENTITY_TYPE', 'NM_LGL', 'D_DT_START', 'D_DT_END', 'CITY', 'STATE_CD', 'ID_FDIC_CERT', 'ZIP_CD']
+
+    path = os.path.join(root, 'input', 'NIC')
+    os.makedirs(path, exist_ok=True)
+    is_closed = records['#ID_RSSD'].isin(nic.loc[nic['end'].notna(), '#ID_RSSD'])
+    records.loc[~is_closed, columns].to_csv(os.path.join(path, 'CSV_ATTRIBUTES_ACTIVE.CSV'), index=False)
+    records.loc[is_closed, columns].to_csv(os.path.join(path, 'CSV_ATTRIBUTES_CLOSED.CSV'), index=False)
+    branches = records.sample(frac=0.2, random_state=int(rng.integers(1 << 31))).assign(ENTITY_TYPE='DBR')
+    branches['#ID_RSSD'] = rng.choice(np.arange(5_000_001, 9_000_000), len(branches), replace=False)
+    branches[columns].to_csv(os.path.join(path, 'CSV_ATTRIBUTES_BRANCHES.CSV'), index=False)
+
+    # banks below a holding company (level 1), banks below the parent of their holding company (level 2) and deeper levels the build ignores
+    banks, bhcs = inst[inst['kind'] == 'bank'], inst[inst['kind'] == 'bank holding company']
+    owned = banks[rng.random(len(banks)) < 0.6]
+    rel = pd.DataFrame({'#ID_RSSD_PARENT': rng.choice(bhcs['#ID_RSSD'].to_numpy(), len(owned)), 'ID_RSSD_OFFSPRING': owned['#ID_RSSD'].to_numpy(),
+                        'RELN_LVL': 1, 'D_DT_START': random_dates(rng, len(owned), '1990-01-01', '2015-12-31'), 'D_DT_END': owned['end'].to_numpy()})
+    grandparents = bhcs[rng.random(len(bhcs)) < 0.15]
+    grandparent_of = dict(zip(grandparents['#ID_RSSD'], rng.choice(bhcs['#ID_RSSD'].to_numpy(), len(grandparents))))
+    indirect = rel[rel['#ID_RSSD_PARENT'].isin(list(grandparent_of))].assign(RELN_LVL=2)
+    indirect['#ID_RSSD_PARENT'] = indirect['#ID_RSSD_PARENT'].map(grandparent_of)
+    deeper = indirect.sample(frac=0.3, random_state=int(rng.integers(1 << 31))).assign(RELN_LVL=3)
+    rel = pd.concat([rel, indirect, deeper], ignore_index=True)
+    rel['PCT_EQUITY'] = 100
+    rel['D_DT_START'], rel['D_DT_END'] = nic_date(rel['D_DT_START']), nic_date(rel['D_DT_END'])
+    rel.to_csv(os.path.join(path, 'CSV_RELATIONSHIPS.CSV'), index=False)
+
+def active_at(inst, quarter): # institutions existing at a quarter end, with the name they had then
+    alive = inst[(inst['start'] <= quarter) & (inst['end'].isna() | (inst['end'] >= quarter))].copy()
+    alive['name at'] = alive['former name'].where(alive['renamed'] > quarter, alive['name'])
+    t = (quarter.year - 2012) * 4 + quarter.quarter
+    alive['assets at'] = (alive['assets'] * np.exp(alive['growth'] * t)).round()
+    return alive
+
+def write_call_reports(inst, root, rng, quarters):
+    ffiec_path = os.path.join(root, 'input', 'FFIEC', 'CDR Call Reports')
+    ncua_path = os.path.join(root, 'input', 'NCUA')
+    bhcf_path = os.path.join(root, 'input', 'FFIEC', 'Holding Company Financial Data')
+    os.makedirs(bhcf_path, exist_ok=True)
+    large = inst['assets'] > inst['assets'].quantile(0.9)
+
+    for quarter in quarters:
+        stamp = quarter.strftime('%m%d%Y')
+
+        # FFIEC CDR bulk schedules - RC holds the total assets (RCFD2170 for consolidated filers, RCON2170 otherwise), RI lacks them and is skipped
+        banks = active_at(inst[inst['kind'] == 'bank'], quarter)
+        rc = pd.DataFrame({'Reporting Period End Date': quarter.strftime('%m/%d/%Y'), 'IDRSSD': banks['#ID_RSSD'], 'Financial Institution Name': banks['name at'],
+                           'RCFD2170': banks['assets at'].where(large[banks.index]), 'RCON2170': banks['assets at'].where(~large[banks.index]),
+                           'RCON2200': (banks['assets at'] * 0.8).round()})
+        quarter_dir = os.path.join(ffiec_path, f'FFIEC CDR Call Bulk All Schedules {stamp}')
+        os.makedirs(quarter_dir, exist_ok=True)
+        with open(os.path.join(quarter_dir, f'FFIEC CDR Call Schedule RC {stamp}.txt'), 'w') as f:
+            f.write('\t'.join(f'"{col}"' for col in rc.columns) + '\n')
+            f.write('\t'.join(['', '', '', 'TOTAL ASSETS', 'TOTAL ASSETS', 'TOTAL DEPOSITS']) + '\n') # first row holds the variable descriptions
+            rc.to_csv(f, sep='\t', index=False, header=False, float_format='%.0f')
+        rc[['IDRSSD']].assign(RIAD4340=(rc['RCON2200'] * 0.01).round()).to_csv(os.path.join(quarter_dir, f'FFIEC CDR Call Schedule RI {stamp}.txt'), sep='\t', index=False)
+        with open(os.path.join(quarter_dir, 'Readme.txt'), 'w') as f:
+            f.write('synthetic call report bulk data\n')
+
+        # NCUA 5300 call reports - the RSSD column of foicu only exists from 2014 and is sometimes blank
+        cus = active_at(inst[inst['kind'] == 'credit union'], quarter)
+        cycle_dir = os.path.join(ncua_path, f'call-report-data-{quarter.year}-{quarter.month:02d}')
+        os.makedirs(cycle_dir, exist_ok=True)
+        foicu = pd.DataFrame({'CU_NUMBER': cus['CU_NUMBER'], 'CU_NAME': cus['name at'], 'CITY': cus['CITY'], 'STATE': cus['STATE_CD']})
+        if quarter.year >= 2014:
+            foicu['RSSD'] = cus['#ID_RSSD'].where(rng.random(len(cus)) > 0.05)
+        foicu.to_csv(os.path.join(cycle_dir, 'foicu.txt'), index=False, float_format='%.0f')
+        pd.DataFrame({'CU_NUMBER': cus['CU_NUMBER'], 'CYCLE_DATE': quarter.strftime('%m/%d/%Y'), 'ACCT_010': cus['assets at'] * 1000,
+                      'ACCT_018': (cus['assets at'] * 700).round()}).to_csv(os.path.join(cycle_dir, 'fs220.txt'), index=False, float_format='%.0f')
+
+        # FR Y-9C caret files - parent only assets when no consolidated assets are filed, older releases are cp1252 and hold a few broken lines
+        bhcs = active_at(inst[inst['kind'] == 'bank holding company'], quarter)
+        consolidated = large[bhcs.index] | (rng.random(len(bhcs)) < 0.5)
+        bhcf = pd.DataFrame({'RSSD9001': bhcs['#ID_RSSD'], 'RSSD9999': quarter.strftime('%Y%m%d'), 'RSSD9017': bhcs['name at'],
+                             'BHCK2170': bhcs['assets at'].where(consolidated), 'BHCP2170': (bhcs['assets at'] * 0.6).where(~consolidated),
+                             'BHSP2170': np.nan, 'BHCK3210': (bhcs['assets at'] * 0.1).round()})
+        encoding = 'cp1252' if quarter.year < 2016 else 'utf-8'
+        if encoding == 'cp1252' and len(bhcf):
+            bhcf.iloc[0, bhcf.columns.get_loc('RSSD9017')] = 'CAISSE CENTRALE DESJARDINS DU QUÉBEC'
+        file = os.path.join(bhcf_path, f'BHCF{quarter.strftime("%Y%m%d")}.txt')
+        bhcf.to_csv(file, sep='^', index=False, encoding=encoding, float_format='%.0f')
+        if quarter.month == 12:
+            with open(file, 'a', encoding=encoding) as f:
+                f.write('^'.join(['1'] * (len(bhcf.columns) + 3)) + '\n')
+
+def write_cfpb_lists(inst, root, rng, quarters):
+    # quarterly lists of institutions supervised by the CFPB - depository institutions above the size threshold and their affiliates
+    path = os.path.join(root, 'input', 'CFPD', 'depository_institutions')
+    os.makedirs(path, exist_ok=True)
+    threshold = inst.loc[inst['kind'].isin(['bank', 'credit union']), 'assets'].quantile(0.97)
+    for quarter in quarters[2:]:
+        alive = active_at(inst, quarter)
+        depository = alive[alive['kind'].isin(['bank', 'credit union']) & (alive['assets'] >= threshold)]
+        affiliates = alive[(alive['kind'] == 'bank holding company') & (rng.random(len(alive)) < 0.05)]
+        with_id = quarter.year >= 2015 # older lists only carry names
+
+        def sheet(frame, title):
+            header = (['ID'] if with_id else []) + ['Institution', 'City', 'State']
+            rows = [[title] + [None] * (len(header) - 1), header]
+            rows += [([rssd] if with_id else []) + [name.title(), city.title(), state] for rssd, name, city, state in
+                     zip(frame['#ID_RSSD'], frame['name at'], frame['CITY'], frame['STATE_CD'])]
+            return pd.DataFrame(rows)
+        depo = sheet(depository, f"Depository Institutions as of {quarter.strftime('%m/%d/%Y')}")
+        depo = pd.concat([depo, pd.DataFrame([[None] * depo.shape[1], ['** Institutions added since the previous list'] + [None] * (depo.shape[1] - 1)])], ignore_index=True)
+        with pd.ExcelWriter(os.path.join(path, f"cfpb_depository-institutions-list_{quarter.strftime('%Y-%m')}.xlsx")) as writer:
+            depo.to_excel(writer, sheet_name='CFPB Depository Institutions', header=False, index=False)
+            sheet(affiliates, 'Depository Affiliates').to_excel(writer, sheet_name='CFPB Depository Affilliates', header=False, index=False)
+
+def write_geography(rng, root, sizes):
+    # zip x county crosswalks (one workbook per year) and the county level ACS extract of merging_ACS_dataset.py
+    states = list(STATE_FIPS)
+    weights = np.array([STATE_WEIGHTS.get(s, 1) for s in states], dtype=float)
+    county_state = rng.choice(states, sizes['counties'], p=weights / weights.sum())
+    counties = pd.DataFrame({'state': [STATE_FIPS[s] for s in county_state], 'abbr': county_state})
+    counties['county'] = counties.groupby('state').cumcount() * 2 + 1
+    counties['fips'] = counties['state'] * 1000 + counties['county']
+
+    zips = np.sort(rng.choice(np.arange(1001, 99951), sizes['zips'], replace=False))
+    first = rng.integers(0, len(counties), len(zips))
+    second = rng.integers(0, len(counties), len(zips))
+    kind = rng.random(len(zips))
+    ratio = np.where(kind < 0.7, 1.0, np.where(kind < 0.9, rng.uniform(0.91, 0.99, len(zips)), rng.uniform(0.5, 0.85, len(zips))))
+    crosswalk = pd.concat([pd.DataFrame({'ZIP': zips, 'COUNTY': counties['fips'].to_numpy()[first], 'RES_RATIO': ratio}),
+                           pd.DataFrame({'ZIP': zips, 'COUNTY': counties['fips'].to_numpy()[second], 'RES_RATIO': 1 - ratio})[ratio < 1]], ignore_index=True)
+    crosswalk = crosswalk.sort_values(['ZIP', 'RES_RATIO'], ascending=[True, False]).round({'RES_RATIO': 4})
+    crosswalk['BUS_RATIO'] = crosswalk['RES_RATIO']
+    crosswalk['TOT_RATIO'] = crosswalk['RES_RATIO']
+    path = os.path.join(root, 'input', 'zip_county_crosswalk')
+    os.makedirs(path, exist_ok=True)
+    for year in range(2013, 2024):
+        crosswalk.to_excel(os.path.join(path, f'ZIP_COUNTY_12{year}.xlsx'), index=False)
+
+    acs = []
+    base_income = rng.lognormal(np.log(55000), 0.3, len(counties))
+    population = rng.lognormal(np.log(40000), 1.0, len(counties))
+    for year in range(2013, 2024):
+        pop = (population * (1 + 0.005 * (year - 2013))).round()
+        educ = rng.dirichlet(np.ones(7) * 5, len(counties)) * pop[:, None] * 0.7
+        lang = rng.dirichlet(np.ones(2) * 5, len(counties)) * pop[:, None] * 0.95
+        frame = pd.DataFrame({'NAME': [f'County {c}, {s}' for c, s in zip(counties['county'], counties['abbr'])],
+                              'MedIncome': (base_income * (1.025 ** (year - 2013))).round(), 'EDUCpop': educ.sum(axis=1).round()})
+        for i, label in enumerate(['EDUC<9', 'EDUC9-12', 'EDUChsg', 'EDUCcll', 'EDUCassc', 'EDUCbch', 'EDUCgrad']):
+            frame[label] = educ[:, i].round()
+        frame['LANGpop'] = lang.sum(axis=1).round()
+        frame['LANGen'], frame['LANGother'] = lang[:, 0].round(), lang[:, 1].round()
+        frame['LANGless'] = (lang[:, 1] * 0.4).round()
+        frame['state'], frame['county'], frame['Year'] = counties['state'], counties['county'], year
+        acs.append(frame)
+    acs_path = os.path.join(root, 'temp', 'ACSdataset_countylvl')
+    os.makedirs(acs_path, exist_ok=True)
+    pd.concat(acs, ignore_index=True).to_csv(os.path.join(acs_path, 'ACS5YR_combined.csv'), index=False)
+    return zips
+
+def write_reference_lists(inst, root):
+    months = pd.date_range('2009-01-01', '2025-12-01', freq='MS')
+    cpi = pd.DataFrame({'observation_date': months.strftime('%Y-%m-%d'), 'CPIAUCSL': (211.1 * 1.0022 ** np.arange(len(months))).round(3)})
+    cpi.to_csv(os.path.join(root, 'input', 'CPIAUCSL.csv'), index=False)
+    inst.loc[inst['kind'] == 'scra', ['name']].rename(columns={'name': 'Company'}).to_csv(
+        os.path.join(root, 'input', 'CFPD', 'cfpb-consumer-reporting-companies_list_2025.csv'), index=False, encoding='cp1252')
+    inst.loc[inst['kind'] == 'data broker', ['name']].rename(columns={'name': 'Name'}).to_excel(
+        os.path.join(root, 'input', 'Data_Broker_Full_Registry_2025.xlsx'), index=False)
+
+def complaint_companies(rng, inst):
+    # names complaints are filed against and their share of complaints - the three bureaus dominate, institutions follow a zipf law
+    groups = [('bank', 0.4, 0.20), ('credit union', 0.3, 0.03), ('bank holding company', 0.4, 0.05), ('scra', 0.5, 0.02),
+              ('data broker', 0.1, 0.01), ('non bank', 1.0, 0.07)]
+    names, weights, reporting = list(CREDIT_BUREAUS), [0.22, 0.20, 0.20], [True] * 3
+    for kind, coverage, share in groups:
+        members = inst[inst['kind'] == kind]
+        members = members[rng.random(len(members)) < coverage]
+        spelled = [name.upper() if kind in ['scra', 'data broker'] or rng.random() < 0.6 else complaint_variant(name) for name in members['name']]
+        zipf = 1 / np.arange(1, len(spelled) + 1) ** 1.1
+        names += spelled
+        weights += list(share * zipf / zipf.sum())
+        reporting += [kind == 'scra'] * len(spelled)
+    weights = np.array(weights)
+    return np.array(names, dtype=object), weights / weights.sum(), np.array(reporting)
+
+def complaint_chunk(rng, first_id, n, companies, zips, narratives):
+    names, weights, reporting = companies
+    company = rng.choice(len(names), n, p=weights)
+
+    # issues depend on whether the company is a consumer reporting company
+    rep, other = (pd.DataFrame(issues, columns=['Product', 'Sub-product', 'Issue', 'Sub-issue', 'weight']) for issues in (REPORTING_ISSUES, OTHER_ISSUES))
+    pick_rep = rng.choice(len(rep), n, p=rep['weight'] / rep['weight'].sum())
+    pick_other = rng.choice(len(other), n, p=other['weight'] / other['weight'].sum())
+    is_rep = reporting[company]
+    fields = {col: np.where(is_rep, rep[col].to_numpy()[pick_rep], other[col].to_numpy()[pick_other]) for col in ['Product', 'Sub-product', 'Issue', 'Sub-issue']}
+
+    # complaint volume grows over time, most complaints reach the company the same day
+    start, end = pd.Timestamp('2011-12-01'), pd.Timestamp('2025-06-30')
+    received = start + pd.to_timedelta(np.floor((end - start).days * np.sqrt(rng.random(n))), unit='D')
+    u = rng.random(n)
+    delay = np.select([u < 0.7, u < 0.9, u < 0.98, u < 0.995], [0, rng.integers(1, 8, n), rng.integers(8, 61, n), rng.integers(61, 500, n)], rng.integers(-2, 0, n))
+    sent = received + pd.to_timedelta(delay, unit='D')
+
+    has_narrative = (received >= pd.Timestamp('2015-03-19')) & (rng.random(n) < 0.45)
+    zip_codes = pd.Series(zips).astype(str).str.zfill(5).to_numpy()[rng.integers(0, len(zips), n)]
+    z = rng.random(n)
+    zip_codes = np.where(z < 0.03, [code[:3] + 'XX' for code in zip_codes], zip_codes)
+    zip_codes = np.where(z > 0.99, None, np.where(z > 0.985, 'XXXXX', zip_codes))
+    states = list(STATE_FIPS)
+    state_weights = np.array([STATE_WEIGHTS.get(s, 1) for s in states], dtype=float)
+    relief = ['Closed with explanation', 'Closed with non-monetary relief', 'Closed with monetary relief', 'In progress', 'Untimely response', 'Closed']
+
+    return pd.DataFrame({
+        'Date received': received, **{col: fields[col] for col in ['Product', 'Sub-product', 'Issue', 'Sub-issue']},
+        'Consumer complaint narrative': np.where(has_narrative, np.array(narratives, dtype=object)[rng.integers(0, len(narratives), n)], None),
+        'Company public response': rng.choice(np.array(['Company has responded to the consumer and the CFPB and chooses not to provide a public response',
+                                                        'Company believes it acted appropriately as authorized by contract or law', None], dtype=object), n, p=[0.3, 0.1, 0.6]),
+        'Company': names[company], 'State': rng.choice(states, n, p=state_weights / state_weights.sum()), 'ZIP code': zip_codes,
+        'Tags': rng.choice(np.array([None, 'Older American', 'Servicemember', 'Older American, Servicemember'], dtype=object), n, p=[0.85, 0.08, 0.05, 0.02]),
+        'Consumer consent provided?': np.where(has_narrative, 'Consent provided', rng.choice(np.array(['Consent not provided', 'Other', None], dtype=object), n)),
+        'Submitted via': rng.choice(['Web', 'Referral', 'Phone', 'Postal mail', 'Fax', 'Email'], n, p=[0.85, 0.07, 0.04, 0.02, 0.01, 0.01]),
+        'Date sent to company': sent,
+        'Company response to consumer': rng.choice(relief, n, p=[0.6, 0.25, 0.05, 0.05, 0.02, 0.03]),
+        'Timely response?': rng.choice(['Yes', 'No'], n, p=[0.98, 0.02]),
+        'Consumer disputed?': np.where(received >= pd.Timestamp('2017-04-24'), 'N/A', rng.choice(['Yes', 'No'], n, p=[0.2, 0.8])),
+        'Complaint ID': first_id + np.arange(n),
+    })
+
+def write_complaints(rng, root, n_complaints, inst, zips, chunksize=1_000_000):
+    # written in chunks so that 20M complaints never have to be held in memory at once
+    path = os.path.join(root, 'input', 'CFPD', 'complaints.csv')
+    companies = complaint_companies(rng, inst)
+    narratives = [' '.join(rng.choice(NARRATIVE_SENTENCES, rng.integers(2, 20))) for _ in range(500)]
+    for first in range(0, n_complaints, chunksize):
+        chunk = complaint_chunk(rng, 1_000_000 + first, min(chunksize, n_complaints - first), companies, zips, narratives)
+        chunk.to_csv(path, index=False, mode='w' if first == 0 else 'a', header=first == 0, date_format='%Y-%m-%d')
+        print(f"complaints written: {first + len(chunk)}/{n_complaints}")
+
+def generate(root, n_complaints, seed=0):
+    # full synthetic input tree of build_data.py under root - reused as long as the scale and seed are unchanged
+    manifest_path = os.path.join(root, 'synthetic_manifest.json')
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            manifest = json.load(f)
+        if manifest['complaints'] == n_complaints and manifest['seed'] == seed:
+            print(f"synthetic inputs for {n_complaints} complaints already in {root}")
+            return manifest
+
+    start = time.perf_counter()
+    rng = np.random.default_rng(seed)
+    sizes = universe_sizes(n_complaints)
+    for sub in [os.path.join('input', 'CFPD'), 'temp', 'output']:
+        os.makedirs(os.path.join(root, sub), exist_ok=True)
+    quarters = pd.date_range('2012-03-31', '2025-03-31', freq='QE')
+
+    inst = build_institutions(rng, sizes)
+    write_nic(inst, root, rng)
+    write_call_reports(inst, root, rng, quarters)
+    write_cfpb_lists(inst, root, rng, quarters)
+    zips = write_geography(rng, root, sizes)
+    write_reference_lists(inst, root)
+    write_complaints(rng, root, n_complaints, inst, zips)
+
+    manifest = {'complaints': n_complaints, 'seed': seed, 'sizes': sizes, 'generated': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'seconds': round(time.perf_counter() - start, 1)}
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scale', default='1M', help=f"number of complaints, one of {list(SCALES)} or an integer")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--root', default=None, help='directory of the synthetic build tree (default: temp/synthetic/{scale})')
+    args = parser.parse_args()
+
+    n = SCALES.get(args.scale.upper()) or int(args.scale)
+    root = args.root or os.path.join(cPATH, 'temp', 'synthetic', args.scale)
+    print(generate(root, n, seed=args.seed))
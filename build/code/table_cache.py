@@ -0,0 +1,125 @@
+import json
+import os
+import re
+import shutil
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from date_features import DURATION_GROUP_LABELS, DURATION_LABELS
+
+
+cPATH = os.environ.get("CC_BUILD_DIR", os.path.join("/Users", "yeonsoo","Dropbox (MIT)", "Projects", "consumer_complaints", "build"))
+
+# complaint level tables shipped from build to analysis - quarters are kept as 'YYYYQn' strings as in the csv outputs
+# 'category' columns get the sorted set of their values as categories, so every year of data shares one encoding; ordered scales keep their own order
+CCPA_PHASES = ['Pre-CCPA', 'CCPA enacted, pre-implement', 'CCPA implemented, pre-CPRA', 'CPRA amended, pre-implementation', 'CPRA implemented']
+COMPLAINTS_SCHEMA = {
+    'Complaint ID': 'Int64', 'Date received': 'datetime64[ns]', 'Date sent to company': 'datetime64[ns]', 'Month received': 'datetime64[ns]',
+    'Consumer complaint narrative': 'string', 'Quarter received': 'string', 'Quarter sent': 'string', 'Year received': 'Int16', 'Year sent': 'Int16',
+    'Product': 'category', 'Sub-product': 'category', 'Issue': 'category', 'Sub-issue': 'category', 'Company public response': 'category',
+    'Company': 'category', 'State': 'category', 'ZIP code': 'category', 'Tags': 'category', 'Consumer consent provided?': 'category',
+    'Submitted via': 'category', 'Company response to consumer': 'category', 'Timely response?': 'category', 'Consumer disputed?': 'category',
+    'Company type': 'category', 'Regulation': 'category', 'NAME': 'category', 'zip': 'category',
+    'Duration sending': 'Int32', 'Duration categorized': pd.CategoricalDtype(DURATION_LABELS, ordered=True),
+    'Duration grouped': pd.CategoricalDtype(DURATION_GROUP_LABELS, ordered=True),
+    'CCPA phase at receipt': pd.CategoricalDtype(CCPA_PHASES), 'CCPA phase at sent': pd.CategoricalDtype(CCPA_PHASES),
+    'State privacy law': 'datetime64[ns]', 'Is relief': 'bool', 'Zombie data': 'Int8', 'With narrative': 'bool',
+    '#ID_RSSD': 'Int64', 'rssd_count': 'Int32', 'BankCount': 'Int32',
+    'Total assets': 'float64', 'Real total assets': 'float64', 'Lagged total assets': 'float64', # dollar amounts need the full precision
+    'Log total assets': 'float32', 'Total assets growth yoy': 'float32', 'Log real total assets': 'float32', 'AssetsRatio': 'float32',
+    'res_ratio': 'float32', 'max_ratio': 'float32', 'MedIncome': 'float32', 'RealMedIncome': 'float32',
+}
+
+# explicit column types of every intermediate table cached in temp/ (columns not listed keep the dtype they were built with)
+SCHEMAS = {
+    'nic_attributes': {'#ID_RSSD': 'Int64', 'CHTR_TYPE_CD': 'Int64', 'ENTITY_TYPE': 'string', 'NM_LGL': 'string', 'D_DT_START': 'datetime64[ns]',
+                       'D_DT_END': 'datetime64[ns]', 'CITY': 'string', 'STATE_CD': 'string'},
+    'nic_combined': {'#ID_RSSD': 'Int64', 'NM_LGL': 'string', 'quarter': 'datetime64[ns]', 'rssd_count': 'Int64', 'Company type': 'string'},
+    'ffiec_cdr_combined': {'Reporting Period End Date': 'string', 'IDRSSD': 'Int64', 'Financial Institution Name': 'string', 'Total assets': 'float64'},
+    'ncua_combined': {'CU_NUMBER': 'Int64', 'CYCLE_DATE': 'string', 'RSSD': 'Int64', 'CU_NAME': 'string', 'Total assets': 'float64'},
+    'ffiec_bhcf_combined': {'RSSD ID': 'Int64', 'bhcf report date': 'string', 'Total assets': 'float64', 'Consolidated': 'bool'},
+    'zip_county_crosswalk': {'zip': 'Int64', 'county': 'Int64', 'res_ratio': 'float64', 'year': 'Int64'},
+    'acs_zip_year': {'zip': 'Int64', 'Year': 'Int64', 'NAME': 'string', 'fips': 'Int64', 'res_ratio': 'float64', 'max_ratio': 'float64'},
+    'cfpb_depository_list': {'ID': 'float64', 'Institution': 'string', 'City': 'string', 'State': 'string', 'Regulation': 'string', 'Reporting date': 'string'},
+    'cfpb_all_depository_institutions_combined': {'Company': 'string', 'City company': 'string', 'State company': 'string', 'Regulation': 'string',
+                                                  'Reporting date': 'string', '#ID_RSSD': 'Int64'},
+    'name_rssd_index': {'Name key': 'string', 'Quarter key': 'Int64', 'RSSD': 'Int64', 'source': 'category'},
+    'complaints_processed': COMPLAINTS_SCHEMA,
+    'complaints_narratives': COMPLAINTS_SCHEMA,
+}
+
+def cache_path(name, cache_dir=None):
+    return os.path.join(cache_dir or os.path.join(cPATH, 'temp'), f'{name}.parquet')
+
+def has_cache(name, cache_dir=None):
+    return os.path.exists(cache_path(name, cache_dir))
+
+def apply_schema(df, schema):
+    for col, dtype in schema.items():
+        if col not in df.columns or (dtype != 'category' and df[col].dtype == dtype):
+            continue
+        if isinstance(dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype(dtype) # values outside the declared categories become missing
+        elif dtype == 'category':
+            values = df[col].astype('category').cat.remove_unused_categories()
+            df[col] = values.cat.reorder_categories(sorted(values.cat.categories, key=str))
+        elif dtype.startswith('datetime64'):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+        elif dtype.startswith('Int') or dtype.startswith('float'):
+            df[col] = pd.to_numeric(df[col], errors='coerce').astype(dtype)
+        elif dtype == 'string':
+            df[col] = df[col].astype(str).where(df[col].notna()).astype('string') # periods/dates are written as their display strings
+        else:
+            df[col] = df[col].astype(dtype)
+    return df
+
+def schema_spec(df): # column types of a frame as plain json - categoricals carry their categories so every reader shares one encoding
+    schema = {}
+    for col, dtype in df.dtypes.items():
+        if isinstance(dtype, pd.CategoricalDtype):
+            schema[col] = {'dtype': 'category', 'categories': [str(c) for c in dtype.categories], 'ordered': bool(dtype.ordered)}
+        else:
+            schema[col] = {'dtype': str(dtype)}
+    return schema
+
+def write_schema(df, path):
+    # column types of a table shipped as csv, so readers can restore categoricals (with their categories) and nullable/compact types
+    with open(path, 'w') as f:
+        json.dump(schema_spec(df), f, indent=2)
+
+def partition_slug(value): # file system safe name of a partition value
+    return '__null__' if pd.isna(value) else re.sub(r'[^0-9A-Za-z]+', '_', str(value)).strip('_')
+
+def write_partitions(df, root, by):
+    # one parquet file per combination of the `by` values + manifest.json listing the values, file and row count of every partition
+    # readers pick files from the manifest and never open the partitions they filter out; the directory is swapped in whole, so stale partitions never survive
+    tmp = root + '.tmp'
+    shutil.rmtree(tmp, ignore_errors=True)
+    partitions = []
+    for values, part in df.groupby(by, observed=True, dropna=False, sort=True):
+        values = values if isinstance(values, tuple) else (values,)
+        file = '/'.join(partition_slug(v) for v in values) + '.parquet'
+        os.makedirs(os.path.dirname(os.path.join(tmp, file)), exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(part, preserve_index=False), os.path.join(tmp, file))
+        partitions.append({**{col: None if pd.isna(v) else str(v) for col, v in zip(by, values)}, 'file': file, 'rows': len(part)})
+    manifest = {'partition_by': list(by), 'rows': len(df), 'columns': schema_spec(df), 'partitions': partitions}
+    with open(os.path.join(tmp, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    shutil.rmtree(root, ignore_errors=True)
+    os.replace(tmp, root)
+    return manifest
+
+def write_cache(df, name, cache_dir=None, schema=None):
+    schema = SCHEMAS.get(name, {}) if schema is None else schema
+    df = apply_schema(df.reset_index(drop=True), schema)
+    path = cache_path(name, cache_dir)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path + '.tmp')
+    os.replace(path + '.tmp', path) # never leave a half-written cache behind
+    return df
+
+def read_cache(name, columns=None, filters=None, cache_dir=None):
+    # memory-mapped read + split blocks lets arrow hand buffers to pandas without an extra consolidation copy
+    table = pq.read_table(cache_path(name, cache_dir), columns=columns, filters=filters, memory_map=True)
+    return table.to_pandas(split_blocks=True, self_destruct=True)